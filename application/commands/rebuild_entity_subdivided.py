@@ -0,0 +1,51 @@
+"""
+Rebuilds entity_subdivided and the dataset_subdivided routing table, run it
+after each data load:
+
+    python -m application.commands.rebuild_entity_subdivided
+"""
+
+import argparse
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from application.data_access.subdivision_queries import (
+    SUBDIVIDE_MAX_VERTICES,
+    SUBDIVIDE_VERTEX_THRESHOLD,
+    rebuild_entity_subdivided,
+)
+from application.settings import get_settings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Subdivide the geometries of datasets with very large geometries"
+    )
+    parser.add_argument(
+        "--vertex-threshold",
+        type=int,
+        default=SUBDIVIDE_VERTEX_THRESHOLD,
+        help="subdivide datasets with any geometry with more vertices than this",
+    )
+    parser.add_argument(
+        "--max-vertices",
+        type=int,
+        default=SUBDIVIDE_MAX_VERTICES,
+        help="the most vertices in each subdivided piece",
+    )
+    args = parser.parse_args(argv)
+
+    # the web app only reads, so this needs its own engine on the write database
+    engine = create_engine(str(get_settings().WRITE_DATABASE_URL))
+    with Session(engine) as session:
+        datasets = rebuild_entity_subdivided(
+            session,
+            vertex_threshold=args.vertex_threshold,
+            max_vertices=args.max_vertices,
+        )
+    print(f"subdivided {len(datasets)} datasets: {', '.join(datasets)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+from application.core.metrics import timed_request
 from application.core.utils import NoneToEmptyStringEncoder
 from jinja2 import pass_eval_context
 from markdown import markdown
@@ -20,6 +21,8 @@ from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+OS_TOKEN_URL = "https://api.os.uk/oauth2/token/v1"
+
 
 def to_slug(string):
     return slugify(string)
@@ -300,12 +303,13 @@ def get_os_oauth2_token():
     max_retries = 3
     for attempt in range(1, max_retries + 1):
         try:
-            result = requests.post(
-                "https://api.os.uk/oauth2/token/v1",
-                data={"grant_type": "client_credentials"},
-                headers={},
-                auth=(settings.OS_CLIENT_KEY, settings.OS_CLIENT_SECRET),
-            )
+            with timed_request(OS_TOKEN_URL):
+                result = requests.post(
+                    OS_TOKEN_URL,
+                    data={"grant_type": "client_credentials"},
+                    headers={},
+                    auth=(settings.OS_CLIENT_KEY, settings.OS_CLIENT_SECRET),
+                )
             jsonResult = result.json()
             if result.status_code == 200:
                 return jsonResult
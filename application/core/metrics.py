@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from application.core.timing import RequestTimings, timed
+
+# Under gunicorn each worker writes its metrics to files in
+# PROMETHEUS_MULTIPROC_DIR, set by gunicorn_conf.py, and /metrics adds up
+# the files of every worker.
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time taken to respond to a request, by route",
+    ["method", "route", "status"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database statements run by a request, by route",
+    ["method", "route"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200),
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections checked out of the pool",
+    ["database"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Checked out connections beyond the pool size",
+    ["database"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting to check a connection out of the pool",
+    ["database"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30),
+)
+REDIS_CACHE_HITS = Counter(
+    "redis_cache_hits", "redis_cache lookups found in redis", ["key"]
+)
+REDIS_CACHE_MISSES = Counter(
+    "redis_cache_misses", "redis_cache lookups that ran the query", ["key"]
+)
+OUTBOUND_HTTP_LATENCY = Histogram(
+    "http_client_request_duration_seconds",
+    "Time taken by requests to other services, by host",
+    ["host"],
+)
+
+
+def observe_request(scope, status_code: int, timings: RequestTimings):
+    # labelled by the route's path template, so entity ids etc. don't each
+    # become a series
+    route = getattr(scope.get("route"), "path", "unmatched")
+    method = scope["method"]
+    REQUEST_LATENCY.labels(method, route, status_code).observe(timings.total())
+    REQUEST_DB_QUERIES.labels(method, route).observe(
+        timings.phases.get("db", (0.0, 0))[1]
+    )
+
+
+def track_pool_metrics(engine: Engine, database: str):
+    """
+    database labels the engine's pool metrics, and is a name such as "read"
+    rather than the host, which /metrics shouldn't give away.
+    """
+    engine.pool.database = database
+
+    # the checkin event comes before the pool counts the connection as
+    # returned, so the connections are counted here
+    lock = threading.Lock()
+    checked_out = 0
+
+    def update(change):
+        nonlocal checked_out
+        with lock:
+            checked_out += change
+            DB_POOL_CHECKED_OUT.labels(database).set(checked_out)
+            DB_POOL_OVERFLOW.labels(database).set(
+                max(checked_out - engine.pool.size(), 0)
+            )
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        update(1)
+
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        update(-1)
+
+
+class _TimedPoolMixin:
+    """
+    Times how long each checkout waits for a connection, labelled with the
+    database track_pool_metrics names.
+    """
+
+    database = ""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.labels(self.database).observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+@contextmanager
+def timed_request(url: str):
+    """
+    Times a request to another service, both for the request being handled
+    and the service's latency histogram.
+    """
+    start = time.perf_counter()
+    try:
+        with timed("http"):
+            yield
+    finally:
+        OUTBOUND_HTTP_LATENCY.labels(urlparse(url).hostname).observe(
+            time.perf_counter() - start
+        )
+
+
+def record_http_latency(response, *args, **kwargs):
+    """A requests response hook that observes the response's latency."""
+    OUTBOUND_HTTP_LATENCY.labels(urlparse(response.url).hostname).observe(
+        response.elapsed.total_seconds()
+    )
+
+
+def generate_metrics():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
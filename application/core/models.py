@@ -1,11 +1,13 @@
 from datetime import date
-from typing import Optional, List, Dict, Any
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Tuple, Type
 
 from geoalchemy2.shape import to_shape
 from geoalchemy2.elements import WKBElement, WKTElement
 from pydantic import BaseModel, Field, field_validator, create_model
 
 from application.db.models import EntityOrm
+from application.core.timing import timed_phase
 from application.core.utils import to_snake
 
 
@@ -142,22 +144,41 @@ class DatasetPublicationCountModel(DigitalLandBaseModel):
     publisher_count: int
 
 
+# the most extended entity models kept, there is one for each set of fields
+# found in the json column so it stays small in practice
+EXTENDED_ENTITY_MODEL_CACHE_SIZE = 512
+_MISSING = object()
+
+
+@lru_cache(maxsize=EXTENDED_ENTITY_MODEL_CACHE_SIZE)
+def get_extended_entity_model(json_keys: Tuple[str, ...]) -> Type[EntityModel]:
+    """
+    Returns an EntityModel extended with a field for each of the json keys.
+    Building a model and its validator is slow so they're cached for each
+    set of keys, which are kept in order so fields are dumped in the same
+    order as the json column.
+    """
+    # TODO could add in additional validation using field informtion
+    field_definitions = {to_snake(key): (Any, None) for key in json_keys}
+    return create_model(
+        "ExtendedEntityModel", **field_definitions, __base__=EntityModel
+    )
+
+
+@timed_phase("models")
 def entity_factory(entity_orm: EntityOrm):
-    e = EntityModel.model_validate(entity_orm)
-    if entity_orm.json is not None:
-        # if values in json present then extend the pydantic model
-        # TODO could add in additional validation using field informtion
-        field_definitions = {
-            to_snake(key): (Any, None) for key in entity_orm.json.keys()
-        }
-        ExtendedEntityModel = create_model(
-            "ExtendedEntityModel", **field_definitions, __base__=EntityModel
-        )
-
-        # use new model with the added json fields
-        e = ExtendedEntityModel(**e.model_dump(by_alias=False), **entity_orm.json)
-
-    return e
+    if entity_orm.json is None:
+        return EntityModel.model_validate(entity_orm)
+
+    # if values in json present then use the extended pydantic model, the
+    # entity fields and json values are validated together in one go
+    ExtendedEntityModel = get_extended_entity_model(tuple(entity_orm.json.keys()))
+    values = {}
+    for field in EntityModel.model_fields:
+        value = getattr(entity_orm, field, _MISSING)
+        if value is not _MISSING:
+            values[field] = value
+    return ExtendedEntityModel.model_validate({**values, **entity_orm.json})
 
 
 class TaskModel(DigitalLandBaseModel):
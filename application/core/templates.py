@@ -29,6 +29,7 @@ from application.core.filters import (
     is_past_date,
 )
 
+from application.core.timing import timed
 from application.core.utils import model_dumps
 from application.settings import Settings
 
@@ -37,7 +38,14 @@ def random_int(n=1):
     return "".join([str(random.randint(0, 9)) for i in range(n)])
 
 
-templates = Jinja2Templates("application/templates")
+class TimedJinja2Templates(Jinja2Templates):
+    def TemplateResponse(self, *args, **kwargs):
+        # the template is rendered when the response is made
+        with timed("templates"):
+            return super().TemplateResponse(*args, **kwargs)
+
+
+templates = TimedJinja2Templates("application/templates")
 
 templates.env.loader = jinja2.ChoiceLoader(
     [
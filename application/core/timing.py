@@ -0,0 +1,113 @@
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# the phases of a request that are timed, with their Server-Timing descriptions
+PHASES = {
+    "db": "Database",
+    "redis": "Redis",
+    "http": "Outbound HTTP",
+    "models": "Model building",
+    "serialise": "Serialisation",
+    "templates": "Template rendering",
+}
+
+
+class RequestTimings:
+    """
+    The time a request has spent in each phase, and how many times it
+    entered it.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases: Dict[str, List] = {}
+
+    def add(self, phase: str, seconds: float):
+        entry = self.phases.setdefault(phase, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def total(self) -> float:
+        return time.perf_counter() - self.start
+
+    def as_dict(self) -> dict:
+        timings = {
+            phase: {"ms": round(seconds * 1000, 1), "count": count}
+            for phase, (seconds, count) in self.phases.items()
+        }
+        timings["total"] = {"ms": round(self.total() * 1000, 1), "count": 1}
+        return timings
+
+    def server_timing(self) -> str:
+        metrics = [
+            f'{phase};dur={seconds * 1000:.1f};desc="{PHASES.get(phase, phase)} ({count})"'
+            for phase, (seconds, count) in self.phases.items()
+        ]
+        metrics.append(f"total;dur={self.total() * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+# set by ServerTimingMiddleware for the request being handled
+request_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+@contextmanager
+def timed(phase: str):
+    timings = request_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - start)
+
+
+def timed_phase(phase: str):
+    """
+    Decorator that adds the time spent in the function to phase.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(phase):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_http_time(response, *args, **kwargs):
+    """
+    A requests response hook that adds the time until the response arrived
+    to the http phase.
+    """
+    timings = request_timings.get()
+    if timings is not None:
+        timings.add("http", response.elapsed.total_seconds())
+
+
+def track_db_time(engine: Engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def start(conn, cursor, statement, parameters, context, executemany):
+        if request_timings.get() is not None:
+            conn.info.setdefault("timing_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def finish(conn, cursor, statement, parameters, context, executemany):
+        timings = request_timings.get()
+        started = conn.info.get("timing_start")
+        if timings is not None and started:
+            timings.add("db", time.perf_counter() - started.pop())
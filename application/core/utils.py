@@ -8,11 +8,17 @@ from typing import List
 import logging
 
 import requests
+from contextlib import contextmanager
 from datetime import date
 from functools import wraps
 from pydantic import AnyUrl, BaseModel
 from starlette.responses import Response
 
+from application.core.metrics import timed_request
+from application.core.timing import timed_phase
+from application.db.slow_queries import capture_slow_queries, collect_statements
+from application.search.enum import CountOption
+
 # Set up logging
 logger = logging.getLogger(__name__)
 
@@ -70,7 +76,8 @@ def make_url(url: str, params: dict) -> str:
 
 def get(url: str) -> requests.Response:
     try:
-        response = requests.get(url)
+        with timed_request(url):
+            response = requests.get(url)
     except ConnectionRefusedError:
         raise ConnectionError("failed to connect at %s" % url)
     return response
@@ -98,18 +105,63 @@ class NoneToEmptyStringEncoder(json.JSONEncoder):
         return super().encode(data)
 
 
+@timed_phase("serialise")
+def digital_land_json_dumps(content: typing.Any) -> str:
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+        cls=NoneToEmptyStringEncoder,
+        default=date_encoder,
+    )
+
+
 class DigitalLandJSONResponse(Response):
     media_type = "application/json"
 
     def render(self, content: typing.Any) -> bytes:
-        return json.dumps(
-            content,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=None,
-            separators=(",", ":"),
-            cls=NoneToEmptyStringEncoder,
-        ).encode("utf-8")
+        return digital_land_json_dumps(content).encode("utf-8")
+
+
+def stream_feature_collection(
+    features: typing.Iterable[str], links: typing.Callable[[], dict]
+) -> typing.Iterator[str]:
+    """
+    Writes a GeoJSON FeatureCollection a feature at a time, so the response
+    can start before every feature has been read and the collection is
+    never held in memory as a whole. features are already JSON text and
+    links is only called once the last feature has been written, which lets
+    it depend on what was streamed.
+    """
+    return stream_json_list(
+        '{"type":"FeatureCollection","features":', features, lambda: {"links": links()}
+    )
+
+
+def stream_entity_list(
+    entities: typing.Iterable[str], links_and_count: typing.Callable[[], dict]
+) -> typing.Iterator[str]:
+    """
+    Writes an entity search JSON response an entity at a time, the entities
+    are already JSON text and the links and count follow them.
+    """
+    return stream_json_list('{"entities":', entities, links_and_count)
+
+
+def stream_json_list(
+    opening: str, documents: typing.Iterable[str], closing: typing.Callable[[], dict]
+) -> typing.Iterator[str]:
+    yield opening + "["
+    separator = ""
+    for document in documents:
+        yield separator + document
+        separator = ","
+    yield "]"
+    for key, value in closing().items():
+        yield f",{json.dumps(key)}:{digital_land_json_dumps(value)}"
+    yield "}"
 
 
 def make_links(scheme, netloc, path, query, data):
@@ -126,6 +178,12 @@ def make_links(scheme, netloc, path, query, data):
 
     from urllib.parse import urlunsplit
 
+    if data["params"].get("after_entity") is not None:
+        return make_cursor_links(scheme, netloc, path, query, data)
+
+    if data["params"].get("count_mode", CountOption.exact) != CountOption.exact:
+        return make_uncounted_links(scheme, netloc, path, query, data)
+
     count = data["count"]
     limit = data["params"].get("limit", 10)
     offset = data["params"].get("offset", 0)
@@ -162,14 +220,107 @@ def make_links(scheme, netloc, path, query, data):
     return pagination_links
 
 
-def make_pagination_query_str(query, limit, offset=0):
+def make_cursor_links(scheme, netloc, path, query, data):
+    """
+    Creates keyset pagination links for a search that was requested with
+    the after_entity parameter. Results are ordered by entity so the next
+    page starts after the last entity returned on this page. There is no
+    way to seek backwards or to the end, so only first and next are given.
+    Arguments:
+        scheme: str
+        netloc: str
+        path: str
+        query: query string of incoming request
+        data: dict that contains all the required data for a search query see get_entity_search
+    """
+
+    from urllib.parse import urlunsplit
+
+    count = data["count"]
+    limit = data["params"].get("limit", 10)
+    page_size, last_entity = get_page_size_and_last_entity(data)
+    first_page = not data["params"]["after_entity"]
+
+    if not limit or count == 0 or (count is not None and count <= limit):
+        # no pagination links needed
+        return {}
+
+    if first_page and page_size < limit:
+        return {}
+
+    query_str = make_pagination_query_str(query, limit, after_entity=0)
+    pagination_links = {"first": urlunsplit((scheme, netloc, path, query_str, ""))}
+
+    # a short page means there is nothing left to seek to
+    if page_size == limit:
+        query_str = make_pagination_query_str(query, limit, after_entity=last_entity)
+        pagination_links["next"] = urlunsplit((scheme, netloc, path, query_str, ""))
+
+    return pagination_links
+
+
+def make_uncounted_links(scheme, netloc, path, query, data):
+    """
+    Creates offset pagination links for a search where the count is an
+    estimate or wasn't worked out. The last page can't be known so it is
+    left out, and a next link is given whenever this page is full.
+    Arguments:
+        scheme: str
+        netloc: str
+        path: str
+        query: query string of incoming request
+        data: dict that contains all the required data for a search query see get_entity_search
+    """
+
+    from urllib.parse import urlunsplit
+
+    limit = data["params"].get("limit", 10)
+    offset = data["params"].get("offset", 0)
+    page_size, _ = get_page_size_and_last_entity(data)
+
+    if not limit or (offset == 0 and page_size < limit):
+        # no pagination links needed
+        return {}
+
+    query_str = make_pagination_query_str(query, limit)
+    pagination_links = {"first": urlunsplit((scheme, netloc, path, query_str, ""))}
+
+    if page_size == limit:
+        query_str = make_pagination_query_str(query, limit, offset=offset + limit)
+        pagination_links["next"] = urlunsplit((scheme, netloc, path, query_str, ""))
+
+    if offset != 0:
+        query_str = make_pagination_query_str(
+            query, limit, offset=max(offset - limit, 0)
+        )
+        pagination_links["prev"] = urlunsplit((scheme, netloc, path, query_str, ""))
+
+    return pagination_links
+
+
+def get_page_size_and_last_entity(data):
+    """
+    Returns the number of entities on a page of search results and the last
+    entity number. A streamed page doesn't keep its entities so records
+    these as page_size and last_entity instead.
+    """
+    if "page_size" in data:
+        return data["page_size"], data["last_entity"]
+    entities = data.get("entities") or []
+    return len(entities), entities[-1].entity if entities else None
+
+
+def make_pagination_query_str(query, limit, offset=0, after_entity=None):
     from urllib.parse import parse_qs, urlencode
 
     query_dict = parse_qs(query)
 
     query_dict["limit"] = limit
 
-    if offset != 0:
+    if after_entity is not None:
+        query_dict["after_entity"] = after_entity
+        query_dict.pop("offset", None)
+    elif offset != 0:
         query_dict["offset"] = offset
     else:
         query_dict.pop("offset", None)
@@ -208,52 +359,97 @@ def entity_attribute_sort_key(val, sort_order=ENTITY_ATTRIBUTE_ORDER):
         raise ValueError("Value provided is not a string")
 
 
-def log_slow_execution(threshold_seconds=1.0):
+class SlowExecutionTimer:
+    """
+    Times work that may be done in several steps, such as a generator being
+    read by a streamed response, from when the timer is made until finish.
+    Slow work is logged, and an error in a step is logged and re-raised, as
+    log_slow_execution does.
+    """
+
+    def __init__(self, name: str, threshold_seconds=1.0, explain=False):
+        self.name = name
+        self.threshold_seconds = threshold_seconds
+        self.explain = explain
+        self.statements = []
+        self.start_time = time.time()
+
+    @contextmanager
+    def step(self):
+        try:
+            if self.explain:
+                # collected step by step, as each step of a streamed
+                # response may run in a different context
+                with collect_statements(self.statements):
+                    yield
+            else:
+                yield
+        except Exception as e:
+            elapsed_time = time.time() - self.start_time
+            logger.error(
+                f"Error in {self.name}: {str(e)}",
+                extra={
+                    "elapsed_seconds": round(elapsed_time, 2),
+                    "function": self.name,
+                },
+                exc_info=True,
+            )
+
+            sentry_sdk.metrics.count(
+                "function.exception",
+                1,
+                attributes={
+                    "function": self.name,
+                    "exception_type": type(e).__name__,
+                },
+            )
+            raise
+
+    def finish(self):
+        elapsed_time = time.time() - self.start_time
+        if elapsed_time > self.threshold_seconds:
+            # Log slow executions
+            logger.info(
+                f"{self.name} SLOW execution",
+                extra={
+                    "elapsed_seconds": round(elapsed_time, 2),
+                    "function": self.name,
+                },
+            )
+            capture_slow_queries(self.name, elapsed_time, self.statements)
+
+    def iterate(self, iterable: typing.Iterable) -> typing.Iterator:
+        """Yields from iterable, timing each item, and finishes at the end."""
+        iterator = iter(iterable)
+        while True:
+            with self.step():
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+            yield item
+        self.finish()
+
+
+def log_slow_execution(threshold_seconds=1.0, explain=False):
     """
     Decorator that logs when a function's execution time exceeds `threshold_seconds`
     (default: 1.0s). Exceptions raised by the wrapped function are logged at error
     level (with `exc_info`) and re-raised.
+
+    With `explain` the statements the function runs are timed, and for a
+    sample of slow calls the plan of the slowest is kept, see
+    application.db.slow_queries.
     """
 
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            start_time = time.time()
-
-            try:
+            timer = SlowExecutionTimer(func.__name__, threshold_seconds, explain)
+            with timer.step():
                 result = func(*args, **kwargs)
-                elapsed_time = time.time() - start_time
-
-                if elapsed_time > threshold_seconds:
-                    # Log slow executions
-                    logger.info(
-                        f"{func.__name__} SLOW execution",
-                        extra={
-                            "elapsed_seconds": round(elapsed_time, 2),
-                            "function": func.__name__,
-                        },
-                    )
-                return result
-            except Exception as e:
-                elapsed_time = time.time() - start_time
-                logger.error(
-                    f"Error in {func.__name__}: {str(e)}",
-                    extra={
-                        "elapsed_seconds": round(elapsed_time, 2),
-                        "function": func.__name__,
-                    },
-                    exc_info=True,
-                )
-
-                sentry_sdk.metrics.count(
-                    "function.exception",
-                    1,
-                    attributes={
-                        "function": func.__name__,
-                        "exception_type": type(e).__name__,
-                    },
-                )
-                raise
+            timer.finish()
+            return result
 
         return wrapper
 
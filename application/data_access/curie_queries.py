@@ -1,5 +1,7 @@
 import logging
 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from application.db.models import LookupOrm, EntityOrm
@@ -21,16 +23,29 @@ def get_lookup_by_curie(session: Session, prefix: str, reference: str):
         list: A list of entity IDs sourced from matching lookup rows
               for the given CURIE prefix and reference. May contain up to 2 results.
     """
-    statement = (
-        session.query(LookupOrm.entity.label("entity"))
-        .filter(LookupOrm.prefix == prefix, LookupOrm.reference == reference)
+    lookup_ids = session.execute(_lookup_by_curie(prefix, reference)).scalars().all()
+    return _log_lookup_duplicates(lookup_ids, prefix, reference)
+
+
+async def get_lookup_by_curie_async(session: AsyncSession, prefix: str, reference: str):
+    """
+    The same as get_lookup_by_curie, for async routes.
+    """
+    result = await session.execute(_lookup_by_curie(prefix, reference))
+    return _log_lookup_duplicates(result.scalars().all(), prefix, reference)
+
+
+def _lookup_by_curie(prefix: str, reference: str):
+    return (
+        select(LookupOrm.entity.label("entity"))
+        .where(LookupOrm.prefix == prefix, LookupOrm.reference == reference)
         .limit(2)
     )
-    lookup_ids = session.execute(statement).scalars().all()
 
+
+def _log_lookup_duplicates(lookup_ids, prefix: str, reference: str):
     if len(lookup_ids) > 1:
         logger.info(f"Lookup with CURIE {repr(f'{prefix}:{reference}')} is a duplicate")
-
     return lookup_ids
 
 
@@ -48,16 +63,29 @@ def get_entity_by_curie(session: Session, prefix: str, reference: str):
         list: A list of entity IDs matching the given CURIE prefix
               and reference. May contain up to 2 results.
     """
+    entity_ids = session.execute(_entity_by_curie(prefix, reference)).scalars().all()
+    return _log_entity_duplicates(entity_ids, prefix, reference)
+
+
+async def get_entity_by_curie_async(session: AsyncSession, prefix: str, reference: str):
+    """
+    The same as get_entity_by_curie, for async routes.
+    """
+    result = await session.execute(_entity_by_curie(prefix, reference))
+    return _log_entity_duplicates(result.scalars().all(), prefix, reference)
+
+
+def _entity_by_curie(prefix: str, reference: str):
     # To check if there are any duplicate entities we just need to
     # see if 2 rows exist, so we `limit` to 2
-    statement = (
-        session.query(EntityOrm.entity.label("entity"))
-        .filter(EntityOrm.prefix == prefix, EntityOrm.reference == reference)
+    return (
+        select(EntityOrm.entity.label("entity"))
+        .where(EntityOrm.prefix == prefix, EntityOrm.reference == reference)
         .limit(2)
     )
-    entity_ids = session.execute(statement).scalars().all()
 
+
+def _log_entity_duplicates(entity_ids, prefix: str, reference: str):
     if len(entity_ids) > 1:
         logger.info(f"Entity with CURIE {repr(f'{prefix}:{reference}')} is a duplicate")
-
     return entity_ids
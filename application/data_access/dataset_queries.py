@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 
-from application.db.models import DatasetOrm
+from application.db.models import DatasetOrm, DatasetSubdividedOrm
+from application.db.session import session_cache
 
 
 def get_dataset_names(session: Session):
@@ -11,3 +12,14 @@ def get_dataset_names(session: Session):
         .all()
     ]
     return dataset_names
+
+
+# short lived so searches follow a rebuild of entity_subdivided soon after it
+@session_cache("subdivided_datasets", ttl_seconds=5 * 60)
+def get_subdivided_datasets(session: Session):
+    return [
+        result[0]
+        for result in session.query(DatasetSubdividedOrm.dataset)
+        .order_by(DatasetSubdividedOrm.dataset)
+        .all()
+    ]
@@ -3,6 +3,9 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from application.core.metrics import record_http_latency
+from application.core.timing import record_http_time
+
 
 def get_datasette_http():
     """
@@ -18,5 +21,6 @@ def get_datasette_http():
     http = requests.Session()
     http.mount("https://", adapter)
     http.mount("http://", adapter)
+    http.hooks["response"].extend([record_http_time, record_http_latency])
 
     return http
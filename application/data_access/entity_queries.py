@@ -1,51 +1,151 @@
+import json
 import logging
 
-from typing import Optional, List, Tuple
-from sqlalchemy import select, func, or_, and_, tuple_, union_all
-from sqlalchemy.orm import Session
-
-from application.core.models import EntityModel, entity_factory
-from application.core.utils import log_slow_execution
+from collections import defaultdict
+from functools import lru_cache
+from itertools import chain
+
+from typing import Dict, Iterator, Optional, List, Set, Tuple
+import shapely
+from geoalchemy2.shape import to_shape
+from sqlalchemy import (
+    BIGINT,
+    Float,
+    Integer,
+    Text,
+    and_,
+    case,
+    column,
+    func,
+    literal,
+    literal_column,
+    or_,
+    select,
+    true,
+    tuple_,
+    union,
+    union_all,
+    values,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session, defer
+from sqlalchemy.orm.attributes import set_committed_value
+
+from application.core.models import EntityModel, entity_factory, to_kebab
+from application.core.utils import (
+    NoneToEmptyStringEncoder,
+    SlowExecutionTimer,
+    log_slow_execution,
+)
+from application.data_access.dataset_queries import get_subdivided_datasets
+from application.data_access.point_cell_cache import (
+    get_cached_point_cell,
+    get_data_release,
+    get_point_cell,
+    get_point_cell_envelope,
+    get_point_cell_key,
+)
 from application.data_access.entity_query_helpers import (
     get_date_field_to_filter,
     get_date_to_filter,
+    get_geojson_expressions,
+    get_geometry,
+    get_geometry_geojson,
+    get_geometry_text,
     get_operator,
+    get_bbox,
     get_point,
     get_spatial_function_for_relation,
     normalised_params,
 )
 from application.db.models import EntityOrm, OldEntityOrm, EntitySubdividedOrm
-from application.search.enum import GeometryRelation, PeriodOption, SuffixEntity
-from application.db.session import redis_cache, DbSession, get_context_session
+from application.search.enum import (
+    CountOption,
+    GeometryRelation,
+    PeriodOption,
+    SuffixEntity,
+)
+from application.db.replicas import set_query_type
+from application.db.session import (
+    redis_cache,
+    DbSession,
+    get_context_session,
+    set_statement_timeout,
+)
 from sqlalchemy.types import Date
-from sqlalchemy.sql.expression import cast
+from sqlalchemy.sql.expression import ClauseElement, Executable, cast
 from sqlalchemy.orm import aliased
 
+import redis
+
 logger = logging.getLogger(__name__)
-complex_datasets = ["flood-risk-zone"]
 
 
 def get_entity_query(
-    id: int,
+    id: int, params: Optional[dict] = None
 ) -> Tuple[Optional[EntityModel], Optional[int], Optional[int]]:
+    """
+    params can hold simplify and precision to apply to the entity geojson.
+    """
     with get_context_session() as session:
-        old_entity = (
-            session.query(OldEntityOrm)
-            .filter(OldEntityOrm.old_entity_id == id)
-            .one_or_none()
+        set_statement_timeout(session, "entity")
+        return _get_entity(session, id, params)
+
+
+async def get_entity_query_async(
+    session: AsyncSession, id: int, params: Optional[dict] = None
+) -> Tuple[Optional[EntityModel], Optional[int], Optional[int]]:
+    """
+    The same as get_entity_query, for async routes, using the session given.
+    """
+    return await session.run_sync(_get_entity_with_timeout, id, params)
+
+
+def _get_entity_with_timeout(session: Session, id: int, params: Optional[dict] = None):
+    set_statement_timeout(session, "entity")
+    return _get_entity(session, id, params)
+
+
+def _get_entity(session: Session, id: int, params: Optional[dict] = None):
+    old_entity = (
+        session.query(OldEntityOrm)
+        .filter(OldEntityOrm.old_entity_id == id)
+        .one_or_none()
+    )
+    if old_entity:
+        return (
+            None,
+            old_entity.status,
+            old_entity.new_entity_id,
         )
-        if old_entity:
-            return (
-                None,
-                old_entity.status,
-                old_entity.new_entity_id,
-            )
 
+    params = params or {}
+    options = get_geojson_expressions(params)
+    if not options:
         entity = session.get(EntityOrm, id)
         if not entity:
             return None, None, None
-        else:
-            return entity_factory(entity), None, None
+        return entity_factory(entity), None, None
+
+    # the WKT is simplified and rounded the same as the geojson, in the
+    # same query, in place of the full geometry
+    row = (
+        session.query(
+            EntityOrm,
+            get_geometry_text(EntityOrm.geometry, params).label("geometry"),
+            get_geometry_text(EntityOrm.point, params).label("point"),
+        )
+        .options(*options, defer(EntityOrm.geometry), defer(EntityOrm.point))
+        .filter(EntityOrm.entity == id)
+        .one_or_none()
+    )
+    if not row:
+        return None, None, None
+    set_committed_value(row.EntityOrm, "geometry", row.geometry)
+    set_committed_value(row.EntityOrm, "point", row.point)
+    return entity_factory(row.EntityOrm), None, None
 
 
 def get_entity_count(session: Session, dataset: Optional[str] = None):
@@ -67,8 +167,8 @@ def get_entities(session, dataset: str, limit: int) -> List[EntityModel]:
     return [entity_factory(e) for e in entities]
 
 
-# TODO: this function will be moved in the next PR into a performance
-# test folder and use it as a comparison helper/benchmark
+# Kept as the baseline for tests/performance/test_entity_search_benchmark.py,
+# it runs a separate count query before fetching the page
 def get_entity_search_OLD_VERSION(
     session: Session, parameters: dict, extension: Optional[SuffixEntity] = None
 ):
@@ -100,36 +200,522 @@ def get_entity_search_OLD_VERSION(
     return {"params": params, "count": count, "entities": entities}
 
 
-@log_slow_execution(threshold_seconds=1)
+@log_slow_execution(threshold_seconds=1, explain=True)
 def get_entity_search(
-    session: Session, parameters: dict, extension: Optional[SuffixEntity] = None
+    session: Session,
+    parameters: dict,
+    extension: Optional[SuffixEntity] = None,
+    cache: Optional[redis.Redis] = None,
 ):
     params = normalised_params(parameters)
 
     # Build filtered query once
-    basequery = session.query(EntityOrm)
-    basequery = _apply_base_filters(basequery, params)
-    basequery = _apply_date_filters(basequery, params)
-    basequery = _apply_location_filters(session, basequery, params)
-    basequery = _apply_period_option_filter(basequery, params)
+    basequery = _build_entity_search_query(session, params, cache)
+
+    # Pagination and field filters
+    query = _apply_limit_and_pagination_filters(basequery, params)
+    query = _apply_field_filters(query, params, extension)
+    query = _apply_geojson_expressions(query, params)
+
+    # Database 1st call, which also brings back the total when it can
+    entity_orms, count = _get_page_and_count(query, params)
+    entities = [entity_factory(entity_orm) for entity_orm in entity_orms]
+
+    # Database 2nd call, only needed when the page couldn't carry the total
+    if count is None:
+        count = _get_entity_search_count(session, basequery, params, len(entities))
+    return {"params": params, "count": count, "entities": entities}
+
+
+async def get_entity_search_async(
+    session: AsyncSession,
+    parameters: dict,
+    extension: Optional[SuffixEntity] = None,
+    cache: Optional[redis.Redis] = None,
+):
+    """
+    The same as get_entity_search, for async routes. The search is built and
+    run by the same code, which AsyncSession.run_sync drives on the async
+    connection, so only waiting on the database is done asynchronously.
+    """
+    return await session.run_sync(get_entity_search, parameters, extension, cache)
+
+
+def stream_entity_search(
+    session: Session, parameters: dict, yield_per: int = 1000
+) -> Iterator[EntityModel]:
+    """
+    Yields every entity matching the search parameters in entity order.
+
+    Rows are read through a server side cursor in batches of `yield_per`,
+    so memory use stays flat however many entities match. limit and offset
+    are ignored but after_entity can be used to resume an export.
+    """
+    params = normalised_params(parameters)
+    params.pop("limit", None)
+    params.pop("offset", None)
+
+    query = _build_entity_search_query(session, params)
+    query = _apply_limit_and_pagination_filters(query, params)
+    query = _apply_field_filters(query, params, SuffixEntity.json)
+
+    for entity_orm in query.yield_per(yield_per):
+        yield entity_factory(entity_orm)
+
+
+SPATIAL_SEARCH_PARAMS = [
+    "longitude",
+    "latitude",
+    "bbox",
+    "geometry",
+    "geometry_entity",
+    "geometry_reference",
+    "geometry_curie",
+]
+
+
+def _build_entity_search_query(session, params, cache=None):
+    if any(params.get(param) for param in SPATIAL_SEARCH_PARAMS):
+        set_query_type(session, "spatial")
+
+    query = session.query(EntityOrm)
+    query = _apply_base_filters(query, params)
+    query = _apply_date_filters(query, params)
+    query = _apply_location_filters(session, query, params, cache)
+    query = _apply_period_option_filter(query, params)
+    return query
+
+
+def _get_page_and_count(query, params):
+    """
+    Fetches a page of search results, along with the total when it can be
+    worked out in the same query.
+
+    Returns the rows and the total, or None if the total still needs counting.
+    """
+    query, counted = _add_window_count(query, params)
+    if not counted:
+        return query.all(), None
+
+    rows = query.all()
+    if not rows:
+        # an offset past the end of the results, the total is still unknown
+        return [], None
+    return [_counted_row_entity(row) for row in rows], rows[0].search_count
+
+
+def _add_window_count(query, params):
+    """
+    Adds the exact total to each row with a window function when one is
+    needed. The window is worked out over every matching row before the
+    limit so the filters are only evaluated once, instead of again in a
+    separate count query.
+
+    Returns the query and whether the count was added.
+    """
+    count_mode = params.get("count_mode", CountOption.exact)
+    if count_mode != CountOption.exact or params.get("after_entity"):
+        # rows before a cursor are filtered out so they'd be missing from
+        # the window count
+        return query, False
+    return query.add_columns(func.count().over().label("search_count")), True
+
+
+def _counted_row_entity(row):
+    if isinstance(row[0], EntityOrm):
+        return row[0]
+    # rows selected by column carry search_count along, which the entity
+    # model ignores as it isn't one of its fields
+    return row
+
+
+def stream_entity_search_documents(
+    session: Session,
+    parameters: dict,
+    extension: SuffixEntity,
+    include: Optional[Set] = None,
+    exclude: Optional[Set] = None,
+    yield_per: int = 100,
+    cache: Optional[redis.Redis] = None,
+) -> Tuple[dict, Iterator[str]]:
+    """
+    Returns the same page of results as get_entity_search, but Postgres
+    renders each entity as its final JSON (or GeoJSON feature) text so the
+    rows can be written straight to the response without building models.
+    include and exclude are the field names asked for, as snake case.
+
+    Also returns a summary dict which is filled in with the params, count,
+    page_size and last_entity once every entity has been read, ready to be
+    passed to make_links.
+
+    The query is run and its first rows read before returning, so an error
+    in the query is raised here rather than part way through the response.
+    The search is timed like get_entity_search, until the last entity is
+    read.
+    """
+    timer = SlowExecutionTimer(
+        "stream_entity_search_documents", threshold_seconds=1, explain=True
+    )
+    params = normalised_params(parameters)
+    basequery = _build_entity_search_query(session, params, cache)
+    query = _apply_limit_and_pagination_filters(basequery, params)
+    columns, geometry_fields = _entity_document_columns(
+        params, extension, include, exclude
+    )
+    query = query.with_entities(EntityOrm.entity, *columns)
+    query, counted = _add_window_count(query, params)
+    summary = {"params": params, "count": None, "page_size": 0, "last_entity": None}
+
+    with timer.step():
+        rows = iter(query.yield_per(yield_per))
+        first_row = next(rows, None)
+
+    def documents():
+        if first_row is not None:
+            rows_read = chain([first_row], rows)
+        else:
+            rows_read = []
+        for row in rows_read:
+            if counted:
+                summary["count"] = row.search_count
+            summary["page_size"] += 1
+            summary["last_entity"] = row.entity
+            document = _entity_document(row, geometry_fields, params.get("precision"))
+            # features can't be written for entities without a geometry
+            if document is not None:
+                yield document
+
+        if summary["count"] is None:
+            summary["count"] = _get_entity_search_count(
+                session, basequery, params, summary["page_size"]
+            )
+
+    return summary, timer.iterate(documents())
+
+
+def stream_entities_by_id(
+    session: Session,
+    entities: List[int],
+    include: Optional[Set] = None,
+    exclude: Optional[Set] = None,
+    yield_per: int = 100,
+) -> Tuple[dict, Iterator[str]]:
+    """
+    Streams the JSON of many entities, rendered by Postgres, in the order
+    their ids were given. Entities which have moved are replaced by the
+    entity they moved to. Moves are resolved in one query and the entities
+    fetched in another, however many ids there are.
+
+    Also returns a summary dict which is filled in with the ids that moved,
+    were removed or don't exist once every entity has been read.
+    """
+    old_entities = (
+        session.query(
+            OldEntityOrm.old_entity_id, OldEntityOrm.status, OldEntityOrm.new_entity_id
+        )
+        .filter(OldEntityOrm.old_entity_id.in_(set(entities)))
+        .all()
+    )
+    moved = {
+        old.old_entity_id: old.new_entity_id
+        for old in old_entities
+        if old.status == 301 and old.new_entity_id is not None
+    }
+    gone = {old.old_entity_id for old in old_entities if old.status == 410}
+    # any other status is treated as not found, as it is for a single entity
+    unavailable = {old.old_entity_id for old in old_entities} - set(moved)
+    requested = [moved.get(e, e) for e in entities if e not in unavailable]
+
+    summary = {
+        "moved": moved,
+        "gone": sorted(gone),
+        "not_found": sorted(unavailable - gone),
+    }
+
+    ids = (
+        func.unnest(literal(requested, ARRAY(BIGINT)))
+        .table_valued("entity", with_ordinality="position")
+        .render_derived("requested")
+    )
+    columns, geometry_fields = _entity_document_columns(
+        {}, SuffixEntity.json, include, exclude
+    )
+    query = (
+        session.query(EntityOrm.entity)
+        .join(ids, ids.c.entity == EntityOrm.entity)
+        .add_columns(*columns)
+        .order_by(ids.c.position)
+    )
+
+    def documents():
+        found = set()
+        for row in query.yield_per(yield_per):
+            found.add(row.entity)
+            yield _entity_document(row, geometry_fields)
+        summary["not_found"] = sorted(
+            set(summary["not_found"]) | (set(requested) - found)
+        )
+
+    return summary, documents()
+
+
+# the fields of an entity in the order EntityModel writes them, less the
+# geometries which _entity_document writes as WKT
+ENTITY_DOCUMENT_FIELDS = [
+    field
+    for field in EntityModel.model_fields.keys()
+    if field not in ["geojson", "geometry", "point"]
+]
+ENTITY_GEOMETRY_FIELDS = ["geometry", "point"]
+EMPTY_JSON_STRING = literal_column("'\"\"'::jsonb", JSONB)
+EMPTY_JSON_OBJECT = literal_column("'{}'::jsonb", JSONB)
+# nulls anywhere below the top level of the json column
+NESTED_NULLS_PATH = literal_column("'$.*.**{1 to last} ? (@ == null)'::jsonpath")
+entity_json_each = func.jsonb_each(EntityOrm.json).table_valued("key", "value")
+entity_json_key = func.replace(entity_json_each.c.key, "_", "-")
+
+
+# the document expressions only depend on these params and the fields asked
+# for, so are built once for each and reused by every request that matches
+DOCUMENT_PARAMS = ["simplify", "precision"]
+DOCUMENT_CACHE_SIZE = 256
+
+
+def _document_key(params: dict, *fields: Optional[Set]):
+    return (
+        tuple((key, params.get(key)) for key in DOCUMENT_PARAMS),
+        *(frozenset(f) if f is not None else None for f in fields),
+    )
+
+
+def _entity_document_columns(
+    params: dict,
+    extension: SuffixEntity,
+    include: Optional[Set] = None,
+    exclude: Optional[Set] = None,
+) -> Tuple[list, List[str]]:
+    """
+    Returns the columns to select for each entity's document, which
+    _entity_document reads, and the geometry fields it writes as WKT.
+    """
+    if extension == SuffixEntity.geojson:
+        document = _entity_geojson_document(params, exclude)
+    else:
+        document = _entity_json_document(params, include, exclude)
+    columns = [
+        document.label("document"),
+        func.jsonb_path_exists(EntityOrm.json, NESTED_NULLS_PATH).label("nested_nulls"),
+    ]
+    if extension == SuffixEntity.geojson:
+        return columns, []
+
+    geometry_fields = [
+        field
+        for field in ENTITY_GEOMETRY_FIELDS
+        if (include is None or field in include) and field not in (exclude or [])
+    ]
+    for field in geometry_fields:
+        columns += [
+            get_geometry(getattr(EntityOrm, field), params).label(field),
+            # a json field of the same name is written in its place
+            func.coalesce(EntityOrm.json.has_key(field), False).label(f"json_{field}"),
+        ]
+    return columns, geometry_fields
+
+
+def _entity_document(
+    row, geometry_fields: List[str], precision: Optional[int] = None
+) -> Optional[str]:
+    """
+    Finishes the document Postgres rendered for a row, as the entity models
+    would write it. Documents with nulls nested in their json are written
+    again with the nulls as empty strings, and the geometries are added as
+    WKT by shapely.
+    """
+    document = row.document
+    if document is None:
+        return None
+    if row.nested_nulls:
+        document = json.dumps(
+            json.loads(document), cls=NoneToEmptyStringEncoder, ensure_ascii=False
+        )
+
+    geometries = [
+        f'"{field}": {json.dumps(_geometry_wkt(getattr(row, field), precision))}'
+        for field in geometry_fields
+        if not getattr(row, f"json_{field}")
+    ]
+    if not geometries:
+        return document
+    separator = ", " if document != "{}" else ""
+    return document[:-1] + separator + ", ".join(geometries) + "}"
+
+
+def _geometry_wkt(geometry, precision: Optional[int] = None) -> str:
+    if geometry is None:
+        return ""
+    # the same WKT as EntityModel, rounded to the precision if given
+    return shapely.to_wkt(to_shape(geometry), rounding_precision=precision or -1)
+
+
+def _entity_json_document(
+    params: dict, include: Optional[Set] = None, exclude: Optional[Set] = None
+):
+    """
+    Builds an entity in the shape of the entity JSON contract as text, apart
+    from the geometries. Fields are written by their kebab case alias, dates
+    as ISO strings and nulls as empty strings, as NoneToEmptyStringEncoder
+    does.
+    """
+    return _cached_entity_json_document(*_document_key(params, include, exclude))
+
+
+@lru_cache(maxsize=DOCUMENT_CACHE_SIZE)
+def _cached_entity_json_document(params, include, exclude):
+    params = dict(params)
+    if include is not None:
+        return cast(_entity_fields(params, include=include | {"entity"}), Text)
+    return cast(_entity_fields(params, exclude=exclude), Text)
+
+
+def _entity_geojson_document(params: dict, exclude: Optional[Set] = None):
+    """
+    Builds an entity in the shape of the entity GeoJSON contract as text, the
+    geometry falls back to the point and entities with neither give null.
+    """
+    return _cached_entity_geojson_document(*_document_key(params, exclude))
+
+
+@lru_cache(maxsize=DOCUMENT_CACHE_SIZE)
+def _cached_entity_geojson_document(params, exclude):
+    params = dict(params)
+    exclude = set(exclude) if exclude else set()
+    # always remove the geospatial fields as we're only after non-gespatial prroperties
+    exclude.update(ENTITY_GEOMETRY_FIELDS)
+    geometry = func.coalesce(
+        get_geometry_geojson(EntityOrm.geometry, params),
+        get_geometry_geojson(EntityOrm.point, params),
+    )
+    feature = func.jsonb_build_object(
+        "geometry",
+        cast(geometry, JSONB),
+        "type",
+        "Feature",
+        "properties",
+        _entity_fields(params, exclude=exclude),
+    )
+    return case((geometry.is_(None), None), else_=cast(feature, Text))
+
+
+def _entity_fields(
+    params: dict, include: Optional[Set] = None, exclude: Optional[Set] = None
+):
+    """
+    Builds a jsonb object of the entity columns merged with the fields from
+    its json column. A json field replaces a column of the same name, as it
+    does in entity_factory, and json keys are written in kebab case.
+    """
+    if include is not None:
+        keys = sorted(to_kebab(field) for field in include)
+        fields = [f for f in ENTITY_DOCUMENT_FIELDS if to_kebab(f) in keys]
+        json_keys_filter = entity_json_key.in_(keys)
+    elif exclude:
+        keys = sorted(to_kebab(field) for field in exclude)
+        fields = [f for f in ENTITY_DOCUMENT_FIELDS if to_kebab(f) not in keys]
+        json_keys_filter = entity_json_key.not_in(keys)
+    else:
+        fields = ENTITY_DOCUMENT_FIELDS
+        json_keys_filter = None
+
+    columns = []
+    for field in fields:
+        columns += [
+            to_kebab(field),
+            func.coalesce(func.to_jsonb(getattr(EntityOrm, field)), EMPTY_JSON_STRING),
+        ]
+
+    value = case(
+        (func.jsonb_typeof(entity_json_each.c.value) == "null", EMPTY_JSON_STRING),
+        else_=entity_json_each.c.value,
+    )
+    json_fields = select(func.jsonb_object_agg(entity_json_key, value))
+    if json_keys_filter is not None:
+        json_fields = json_fields.where(json_keys_filter)
+    json_fields = func.coalesce(json_fields.scalar_subquery(), EMPTY_JSON_OBJECT)
+
+    return func.jsonb_build_object(*columns, type_=JSONB).op("||")(json_fields)
+
+
+def _apply_geojson_expressions(query, params):
+    # a query cut down to columns by the field filters doesn't load geojson
+    if query.column_descriptions[0]["expr"] is not EntityOrm:
+        return query
+    return query.options(*get_geojson_expressions(params))
+
+
+def _get_entity_search_count(session, basequery, params, page_size):
+    """
+    Works out the total for a search in the way asked for by count_mode.
+    A short page means the end of the results has been reached, so the
+    total is known without going back to the database. Pages after a
+    cursor are never counted.
+    """
+    limit = params.get("limit")
+    if params.get("after_entity") is not None:
+        # rows before a cursor can't be counted from the page, unless the
+        # cursor is the start of the results
+        offset = 0 if not params["after_entity"] else None
+    else:
+        offset = params.get("offset") or 0
+
+    short_page = limit is None or page_size < limit
+    if short_page and offset is not None and (page_size or not offset):
+        return offset + page_size
+
+    count_mode = params.get("count_mode", CountOption.exact)
+    if count_mode == CountOption.none or offset is None:
+        # cursor pages are paged without a total, counting every matching
+        # row again on each page would cost more than the page itself
+        return None
 
     # Create a `subquery()` that selects only the "entity" column from the
     # existing query (basequery)
     #
     # `with_entities()` modifies the SELECT clause fo the query to return
     # only the "entity" column from the "EntityOrm" model
-    count_subquery = basequery.with_entities(EntityOrm.entity).subquery()
+    count_query = basequery.with_entities(EntityOrm.entity)
+    if count_mode == CountOption.estimated:
+        # the estimate can't be lower than the rows we've already seen
+        return max(_estimate_count(session, count_query), offset + page_size)
 
-    # Database 1st call
-    count = session.query(func.count()).select_from(count_subquery).scalar()
+    count_subquery = count_query.subquery()
+    return session.query(func.count()).select_from(count_subquery).scalar()
 
-    # Pagination and field filters
-    query = _apply_limit_and_pagination_filters(basequery, params)
-    query = _apply_field_filters(query, params, extension)
 
-    # Database 2nd call
-    entities = [entity_factory(entity_orm) for entity_orm in query.all()]
-    return {"params": params, "count": count, "entities": entities}
+def _estimate_count(session, query) -> int:
+    """
+    Returns the number of rows the query planner expects the query to return,
+    this is read from EXPLAIN so the query itself is never run.
+    """
+    plan = session.execute(_Explain(query.statement)).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class _Explain(Executable, ClauseElement):
+    """
+    EXPLAIN of a statement, compiled by SQLAlchemy along with the statement
+    so its parameters are bound in the style of whichever driver runs it.
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain)
+def _compile_explain(element, compiler, **kwargs):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kwargs)
 
 
 def get_entity_map_lpa(session: Session, parameters: dict):
@@ -222,23 +808,76 @@ def lookup_entity_link(
     This function takes an entity and a list of fields that are entity links.
     any entity link fields are then replaced with the entity object.
     """
-    search_params = {"reference": [reference], "dataset": [dataset]}
+    return lookup_entity_links(session, {dataset: reference}, organisation_entity).get(
+        dataset
+    )
+
+
+# Normally we filter by dataset, reference, and organisation.
+# For 'listed-building', we exclude organisation to match Historic England data.
+UNSCOPED_LINK_DATASETS = {"listed-building"}
+
+
+def lookup_entity_links(
+    session: Session, links: Dict[str, str], organisation_entity: int = None
+) -> Dict[str, dict]:
+    """
+    Looks up every entity in links, a dict of dataset to reference, in one
+    query. Returns the entities by dataset, leaving out any link that doesn't
+    match exactly one entity.
+    """
+    scoped = []
+    unscoped = []
+    for dataset, reference in links.items():
+        if dataset in UNSCOPED_LINK_DATASETS or organisation_entity is None:
+            unscoped.append((dataset, reference))
+        else:
+            scoped.append((dataset, reference, organisation_entity))
+
+    conditions = []
+    if scoped:
+        conditions.append(
+            tuple_(
+                EntityOrm.dataset, EntityOrm.reference, EntityOrm.organisation_entity
+            ).in_(scoped)
+        )
+    if unscoped:
+        conditions.append(tuple_(EntityOrm.dataset, EntityOrm.reference).in_(unscoped))
+    if not conditions:
+        return {}
+
+    found = defaultdict(list)
+    for entity in session.query(EntityOrm).filter(or_(*conditions)):
+        found[entity.dataset].append(entity)
+
+    # a link matching several entities is ambiguous, so isn't shown
+    return {
+        dataset: entity_factory(entities[0]).model_dump(
+            by_alias=True, exclude={"geojson"}
+        )
+        for dataset, entities in found.items()
+        if len(entities) == 1
+    }
 
-    # Normally we filter by dataset, reference, and organisation.
-    # For 'listed-building', we exclude organisation to match Historic England data.
-    if dataset != "listed-building" and organisation_entity is not None:
-        search_params["organisation_entity"] = [organisation_entity]
 
-    found_entities = get_entity_search(session, search_params)
-    if found_entities["count"] == 1:
-        found_entity = found_entities["entities"][0]
-        return found_entity.model_dump(by_alias=True, exclude={"geojson"})
-    # elif found_entities["count"] > 1:
-    # Log that multiple entities were found
-    # set the entity to -1 so the page not found page is shown
-    # elif found_entities["count"] == 0:
-    # Log that no entity was found
-    # set the entity to -1 so the page not found page is shown
+def get_organisation_entity(
+    session: Session, organisation_entity: int
+) -> Optional[EntityModel]:
+    """
+    The organisation of an entity, looked up in the session the entity
+    came from. Like get_entity_query, an organisation that has been
+    replaced isn't found, but this is checked in the same query.
+    """
+    replaced = select(OldEntityOrm.old_entity_id).where(
+        OldEntityOrm.old_entity_id == EntityOrm.entity
+    )
+    entity = (
+        session.query(EntityOrm)
+        .filter(EntityOrm.entity == organisation_entity)
+        .filter(~replaced.exists())
+        .one_or_none()
+    )
+    return entity_factory(entity) if entity else None
 
 
 def _apply_base_filters(query, params):
@@ -286,25 +925,34 @@ def _apply_date_filters(query, params):
     return query
 
 
-def _dataset_filters(params, subdivided_alias):
+def _dataset_filters(session, params, subdivided_alias):
     """
     Build the dataset restriction for each branch of the spatial subqueries.
+    Datasets listed in dataset_subdivided are searched in entity_subdivided,
+    every other dataset in entity.
 
     Returns (subdivided_filter, entity_filter). Either may be None, meaning that
     branch cannot contribute any rows and should be skipped entirely.
     """
+    subdivided_datasets = get_subdivided_datasets(session)
     requested = params.get("dataset") or []
     if not requested:
         # No dataset filter, so both branches keep their original scope.
+        if not subdivided_datasets:
+            return None, true()
         return (
-            subdivided_alias.dataset.in_(complex_datasets),
-            EntityOrm.dataset.notin_(complex_datasets),
+            subdivided_alias.dataset.in_(subdivided_datasets),
+            EntityOrm.dataset.notin_(subdivided_datasets),
         )
 
-    complex_requested = [d for d in requested if d in complex_datasets]
-    simple_requested = [d for d in requested if d not in complex_datasets]
+    subdivided_requested = [d for d in requested if d in subdivided_datasets]
+    simple_requested = [d for d in requested if d not in subdivided_datasets]
     return (
-        subdivided_alias.dataset.in_(complex_requested) if complex_requested else None,
+        (
+            subdivided_alias.dataset.in_(subdivided_requested)
+            if subdivided_requested
+            else None
+        ),
         EntityOrm.dataset.in_(simple_requested) if simple_requested else None,
     )
 
@@ -315,46 +963,229 @@ def _union_of(branches):
     return union_all(*branches)
 
 
-def _apply_location_filters(session, query, params):
+def _point_branches(point, subdivided_filter, entity_filter, subdivided_alias):
+    branches = []
+
+    # Pre-filter EntitySubdividedOrm table
+    if subdivided_filter is not None:
+        branches.append(
+            select(subdivided_alias.entity).where(
+                subdivided_filter,
+                subdivided_alias.geometry_valid,
+                func.ST_Contains(
+                    subdivided_alias.geometry_subdivided,
+                    func.ST_GeomFromText(point, 4326),
+                ),
+            )
+        )
+
+    #  Pre-filter EntityOrm table
+    if entity_filter is not None:
+        branches.append(
+            select(EntityOrm.entity).where(
+                entity_filter,
+                EntityOrm.geometry_valid,
+                func.ST_Contains(EntityOrm.geometry, func.ST_GeomFromText(point, 4326)),
+            )
+        )
+    return branches
+
+
+def get_point_lookup(
+    session: Session, points: List[Tuple[float, float]], datasets: Optional[list] = None
+) -> List[List[EntityModel]]:
+    """
+    Finds the entities at each of a list of (longitude, latitude) points in a
+    single statement, by joining the points as a VALUES list against entity
+    and entity_subdivided. An entity matches when its geometry intersects the
+    point, so points on a boundary match both sides.
+
+    Returns a list of matching entities, in entity order, for each point.
+    """
+    points_table = values(
+        column("point", Integer),
+        column("longitude", Float),
+        column("latitude", Float),
+        name="points",
+    ).data([(i, longitude, latitude) for i, (longitude, latitude) in enumerate(points)])
+    point_geometry = func.ST_SetSRID(
+        func.ST_MakePoint(points_table.c.longitude, points_table.c.latitude), 4326
+    )
+
+    subdivided_alias = aliased(EntitySubdividedOrm)
+    subdivided_filter, entity_filter = _dataset_filters(
+        session, {"dataset": datasets}, subdivided_alias
+    )
+    branches = []
+    if subdivided_filter is not None:
+        branches.append(
+            select(points_table.c.point, subdivided_alias.entity)
+            .join(
+                subdivided_alias,
+                func.ST_Intersects(
+                    subdivided_alias.geometry_subdivided, point_geometry
+                ),
+            )
+            .where(subdivided_filter, subdivided_alias.geometry_valid)
+        )
+    if entity_filter is not None:
+        branches.append(
+            select(points_table.c.point, EntityOrm.entity)
+            .join(EntityOrm, func.ST_Intersects(EntityOrm.geometry, point_geometry))
+            .where(entity_filter, EntityOrm.geometry_valid)
+        )
+    # a point can be in more than one piece of a subdivided entity
+    matches = (
+        branches[0].distinct() if len(branches) == 1 else union(*branches)
+    ).subquery()
+
+    rows = session.execute(
+        select(matches.c.point, EntityOrm)
+        .join(EntityOrm, EntityOrm.entity == matches.c.entity)
+        .order_by(matches.c.point, EntityOrm.entity)
+    ).all()
+
+    results = [[] for _ in points]
+    for point, entity in rows:
+        results[point].append(entity_factory(entity))
+    return results
+
+
+def _get_point_cell_candidates(
+    session, cell, subdivided_filter, entity_filter, subdivided_alias
+):
+    """
+    Finds the entities with a geometry in a grid cell. Those whose geometry
+    holds the whole cell are covered, so contain any point in it, the rest
+    straddle a boundary and have to be checked against the point itself.
+    """
+    envelope = get_point_cell_envelope(cell)
+    branches = []
+    if subdivided_filter is not None:
+        geometry = subdivided_alias.geometry_subdivided
+        branches.append(
+            select(
+                subdivided_alias.entity,
+                func.ST_ContainsProperly(geometry, envelope).label("covered"),
+            ).where(
+                subdivided_filter,
+                subdivided_alias.geometry_valid,
+                func.ST_Intersects(geometry, envelope),
+            )
+        )
+    if entity_filter is not None:
+        branches.append(
+            select(
+                EntityOrm.entity,
+                func.ST_ContainsProperly(EntityOrm.geometry, envelope).label("covered"),
+            ).where(
+                entity_filter,
+                EntityOrm.geometry_valid,
+                func.ST_Intersects(EntityOrm.geometry, envelope),
+            )
+        )
+
+    rows = session.execute(_union_of(branches)).all()
+    covered = {row.entity for row in rows if row.covered}
+    straddling = {row.entity for row in rows} - covered
+    return {"covered": sorted(covered), "straddling": sorted(straddling)}
+
+
+def _get_point_entities(
+    session, cache, params, subdivided_filter, entity_filter, subdivided_alias
+):
+    """
+    Returns the entities containing the longitude and latitude, using the
+    cached candidates for the grid cell the point falls in. Cells are cached
+    per data release and dataset filter, so a new release misses the cache.
+    """
+    cell = get_point_cell(params["longitude"], params["latitude"])
+    key = get_point_cell_key(
+        get_data_release(session), params.get("dataset") or [], cell
+    )
+    candidates = get_cached_point_cell(
+        cache,
+        key,
+        lambda: _get_point_cell_candidates(
+            session, cell, subdivided_filter, entity_filter, subdivided_alias
+        ),
+    )
+
+    entities = set(candidates["covered"])
+    straddling = candidates["straddling"]
+    if straddling:
+        branches = [
+            branch.where(branch.selected_columns[0].in_(straddling))
+            for branch in _point_branches(
+                get_point(params), subdivided_filter, entity_filter, subdivided_alias
+            )
+        ]
+        entities.update(session.scalars(_union_of(branches)))
+    return sorted(entities)
+
+
+def _apply_location_filters(session, query, params, cache=None):
     point = get_point(params)
     entity_subdivided_alias = aliased(EntitySubdividedOrm)
-    subdivided_filter, entity_filter = _dataset_filters(params, entity_subdivided_alias)
+    subdivided_filter, entity_filter = _dataset_filters(
+        session, params, entity_subdivided_alias
+    )
 
-    if point is not None:
-        branches = []
+    if point is not None and cache is not None:
+        point_entities = _get_point_entities(
+            session,
+            cache,
+            params,
+            subdivided_filter,
+            entity_filter,
+            entity_subdivided_alias,
+        )
+        query = query.filter(EntityOrm.entity.in_(point_entities))
+    elif point is not None:
+        branches = _point_branches(
+            point, subdivided_filter, entity_filter, entity_subdivided_alias
+        )
+
+        # Combine using union_all
+        union_ids = _union_of(branches).subquery()
+
+        # Step 2: Get full EntityOrm rows matching those IDs
+        query = query.filter(EntityOrm.entity.in_(select(union_ids.c.entity)))
+
+    bbox = get_bbox(params)
+    if bbox is not None:
+        # && only compares bounding boxes so is answered by the GiST indexes
+        # alone, bbox_exact adds an exact test for rows near the box edges
+        envelope = func.ST_MakeEnvelope(*bbox, 4326)
 
-        # Pre-filter EntitySubdividedOrm table
+        def overlaps_bbox(column):
+            if params.get("bbox_exact"):
+                return and_(
+                    column.op("&&")(envelope), func.ST_Intersects(column, envelope)
+                )
+            return column.op("&&")(envelope)
+
+        branches = []
         if subdivided_filter is not None:
             branches.append(
                 select(entity_subdivided_alias.entity).where(
                     subdivided_filter,
-                    entity_subdivided_alias.geometry_subdivided.isnot(None),
-                    func.ST_IsValid(entity_subdivided_alias.geometry_subdivided),
-                    func.ST_Contains(
-                        entity_subdivided_alias.geometry_subdivided,
-                        func.ST_GeomFromText(point, 4326),
-                    ),
+                    overlaps_bbox(entity_subdivided_alias.geometry_subdivided),
                 )
             )
-
-        #  Pre-filter EntityOrm table
         if entity_filter is not None:
             branches.append(
                 select(EntityOrm.entity).where(
                     entity_filter,
-                    EntityOrm.geometry.isnot(None),
-                    func.ST_IsValid(EntityOrm.geometry),
-                    func.ST_Contains(
-                        EntityOrm.geometry, func.ST_GeomFromText(point, 4326)
+                    or_(
+                        overlaps_bbox(EntityOrm.geometry),
+                        overlaps_bbox(EntityOrm.point),
                     ),
                 )
             )
 
-        # Combine using union_all
-        union_ids = _union_of(branches).subquery()
-
-        # Step 2: Get full EntityOrm rows matching those IDs
-        query = query.filter(EntityOrm.entity.in_(select(union_ids.c.entity)))
+        bbox_entities = _union_of(branches).subquery()
+        query = query.filter(EntityOrm.entity.in_(select(bbox_entities.c.entity)))
 
     spatial_function = get_spatial_function_for_relation(
         params.get("geometry_relation", GeometryRelation.within)
@@ -365,13 +1196,12 @@ def _apply_location_filters(session, query, params):
         geom = func.ST_GeomFromText(geometry, 4326)
         branches = []
 
-        # Entities from entity_subdivided (for complex datasets)
+        # Entities from entity_subdivided (for subdivided datasets)
         if subdivided_filter is not None:
             branches.append(
                 select(entity_subdivided_alias.entity).where(
                     subdivided_filter,
-                    entity_subdivided_alias.geometry_subdivided.isnot(None),
-                    func.ST_IsValid(entity_subdivided_alias.geometry_subdivided),
+                    entity_subdivided_alias.geometry_valid,
                     spatial_function(entity_subdivided_alias.geometry_subdivided, geom),
                 )
             )
@@ -383,13 +1213,11 @@ def _apply_location_filters(session, query, params):
                     entity_filter,
                     or_(
                         and_(
-                            EntityOrm.geometry.is_not(None),
-                            func.ST_IsValid(EntityOrm.geometry),
+                            EntityOrm.geometry_valid,
                             spatial_function(EntityOrm.geometry, geom),
                         ),
                         and_(
                             EntityOrm.point.is_not(None),
-                            func.ST_IsValid(EntityOrm.point),
                             spatial_function(EntityOrm.point, geom),
                         ),
                     ),
@@ -411,6 +1239,7 @@ def _apply_location_filters(session, query, params):
         intersecting_entities_query = (
             session.query(EntityOrm.geometry)
             .filter(EntityOrm.entity.in_(intersecting_entities))
+            .filter(EntityOrm.geometry_valid)
             .group_by(EntityOrm.entity)
             .subquery()
         )
@@ -419,9 +1248,7 @@ def _apply_location_filters(session, query, params):
             intersecting_entities_query,
             or_(
                 and_(
-                    EntityOrm.geometry.is_not(None),
-                    func.ST_IsValid(EntityOrm.geometry),
-                    func.ST_IsValid(intersecting_entities_query.c.geometry),
+                    EntityOrm.geometry_valid,
                     spatial_function(
                         EntityOrm.geometry,
                         intersecting_entities_query.c.geometry,
@@ -429,7 +1256,6 @@ def _apply_location_filters(session, query, params):
                 ),
                 and_(
                     EntityOrm.point.is_not(None),
-                    func.ST_IsValid(intersecting_entities_query.c.geometry),
                     spatial_function(
                         EntityOrm.point, intersecting_entities_query.c.geometry
                     ),
@@ -442,6 +1268,7 @@ def _apply_location_filters(session, query, params):
         reference_query = (
             session.query(EntityOrm.geometry)
             .filter(EntityOrm.reference.in_(references))
+            .filter(EntityOrm.geometry_valid)
             .group_by(EntityOrm)
             .subquery()
         )
@@ -449,14 +1276,11 @@ def _apply_location_filters(session, query, params):
             reference_query,
             or_(
                 and_(
-                    EntityOrm.geometry.is_not(None),
-                    func.ST_IsValid(EntityOrm.geometry),
-                    func.ST_IsValid(reference_query.c.geometry),
+                    EntityOrm.geometry_valid,
                     spatial_function(EntityOrm.geometry, reference_query.c.geometry),
                 ),
                 and_(
                     EntityOrm.point.is_not(None),
-                    func.ST_IsValid(reference_query.c.geometry),
                     spatial_function(EntityOrm.point, reference_query.c.geometry),
                 ),
             ),
@@ -468,6 +1292,7 @@ def _apply_location_filters(session, query, params):
         curie_query = (
             session.query(EntityOrm.geometry)
             .filter(tuple_(EntityOrm.prefix, EntityOrm.reference).in_(split_curies))
+            .filter(EntityOrm.geometry_valid)
             .group_by(EntityOrm)
             .subquery()
         )
@@ -475,14 +1300,11 @@ def _apply_location_filters(session, query, params):
             curie_query,
             or_(
                 and_(
-                    EntityOrm.geometry.is_not(None),
-                    func.ST_IsValid(EntityOrm.geometry),
-                    func.ST_IsValid(curie_query.c.geometry),
+                    EntityOrm.geometry_valid,
                     spatial_function(EntityOrm.geometry, curie_query.c.geometry),
                 ),
                 and_(
                     EntityOrm.point.is_not(None),
-                    func.ST_IsValid(curie_query.c.geometry),
                     spatial_function(EntityOrm.point, curie_query.c.geometry),
                 ),
             ),
@@ -515,10 +1337,14 @@ def _apply_period_option_filter(query, params):
 
 
 def _apply_limit_and_pagination_filters(query, params):
+    if params.get("after_entity") is not None:
+        # keyset pagination seeks straight to the next page using the primary
+        # key index rather than scanning and discarding `offset` rows
+        query = query.filter(EntityOrm.entity > params["after_entity"])
     query = query.order_by(EntityOrm.entity)
     if params.get("limit") is not None:
         query = query.limit(params["limit"])
-    if params.get("offset") is not None:
+    if params.get("offset") is not None and params.get("after_entity") is None:
         query = query.offset(params["offset"])
     return query
 
@@ -526,17 +1352,40 @@ def _apply_limit_and_pagination_filters(query, params):
 def get_linked_entities(
     session: Session, dataset: str, reference: str, linked_dataset: str = None
 ) -> List[EntityModel]:
+    return get_linked_entities_by_dataset(
+        session, [dataset], reference, linked_dataset
+    )[dataset]
+
+
+# datasets whose linked entities are listed latest event first
+EVENT_DATE_ORDERED_DATASETS = ["local-plan-timetable"]
+
+
+def get_linked_entities_by_dataset(
+    session: Session, datasets: List[str], reference: str, linked_dataset: str = None
+) -> Dict[str, List[EntityModel]]:
+    """
+    Fetches the entities of each of datasets that link to reference in
+    linked_dataset, in one query. Returns them by dataset, with an empty
+    list for a dataset with none.
+    """
+    event_date = case(
+        (
+            EntityOrm.dataset.in_(EVENT_DATE_ORDERED_DATASETS),
+            cast(EntityOrm.json["event-date"].astext, Date),
+        )
+    )
     query = (
         session.query(EntityOrm)
-        .filter(EntityOrm.dataset == dataset)
+        .filter(EntityOrm.dataset.in_(datasets))
         .filter(EntityOrm.json.contains({linked_dataset: reference}))
+        .order_by(EntityOrm.dataset, event_date.desc())
     )
 
-    if dataset in ["local-plan-timetable"]:
-        query = query.order_by(cast(EntityOrm.json["event-date"].astext, Date).desc())
-
-    entities = query.all()
-    return [entity_factory(e) for e in entities]
+    linked_entities = {dataset: [] for dataset in datasets}
+    for entity in query:
+        linked_entities[entity.dataset].append(entity_factory(entity))
+    return linked_entities
 
 
 def fetchEntityFromReference(
@@ -553,6 +1402,27 @@ def fetchEntityFromReference(
     return None
 
 
+def fetch_entities_by_reference(
+    session: Session, dataset: str, references: Set[str]
+) -> Dict[str, EntityModel]:
+    """
+    Fetches the entities of dataset with any of references in one query,
+    by reference. A reference used more than once gives the first entity.
+    """
+    if not references:
+        return {}
+    entities = (
+        session.query(EntityOrm)
+        .filter(EntityOrm.dataset == dataset)
+        .filter(EntityOrm.reference.in_(references))
+        .order_by(EntityOrm.entity)
+    )
+    found = {}
+    for entity in entities:
+        found.setdefault(entity.reference, entity_factory(entity))
+    return found
+
+
 @redis_cache("organisations", model_class=EntityModel)
 def get_organisations(session: DbSession) -> List[EntityModel]:
     organisations = (
@@ -45,6 +45,12 @@ def get_point(params):
     return None
 
 
+def get_bbox(params):
+    if params.get("bbox"):
+        return tuple(float(value) for value in params["bbox"].split(","))
+    return None
+
+
 def get_spatial_function_for_relation(relation):
     from sqlalchemy import func
 
@@ -70,6 +76,56 @@ def get_spatial_function_for_relation(relation):
     return func.ST_Within
 
 
+def get_geometry(column, params):
+    """
+    Simplifies the geometry in column when a simplify tolerance is given,
+    the topology is preserved so polygons stay valid.
+    """
+    from sqlalchemy import func
+
+    if params.get("simplify"):
+        return func.ST_SimplifyPreserveTopology(column, params["simplify"])
+    return column
+
+
+def get_geometry_geojson(column, params):
+    from sqlalchemy import func
+
+    geometry = get_geometry(column, params)
+    if params.get("precision"):
+        return func.ST_AsGeoJSON(geometry, params["precision"])
+    return func.ST_AsGeoJSON(geometry)
+
+
+def get_geometry_text(column, params):
+    from sqlalchemy import func
+
+    geometry = get_geometry(column, params)
+    if params.get("precision"):
+        return func.ST_AsText(geometry, params["precision"])
+    return func.ST_AsText(geometry)
+
+
+def get_geojson_expressions(params):
+    """
+    Returns loader options that simplify and round the entity geojson as
+    asked for in params, or an empty list to load it at full resolution.
+    """
+    from sqlalchemy.orm import with_expression
+
+    if not params.get("simplify") and not params.get("precision"):
+        return []
+    return [
+        with_expression(
+            EntityOrm._geometry_geojson,
+            get_geometry_geojson(EntityOrm.geometry, params),
+        ),
+        with_expression(
+            EntityOrm._point_geojson, get_geometry_geojson(EntityOrm.point, params)
+        ),
+    ]
+
+
 def normalised_params(params):
     lists = [
         "typology",
@@ -80,7 +136,10 @@ def normalised_params(params):
         "organisation_entity",
     ]
 
-    params = {k: v for k, v in params.items() if v}
+    # after_entity=0 is a valid cursor for the first page so keep it
+    params = {
+        k: v for k, v in params.items() if v or (k == "after_entity" and v is not None)
+    }
 
     for lst in lists:
         if lst in params:
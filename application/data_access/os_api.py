@@ -5,6 +5,7 @@ import requests
 
 from typing import List, Dict
 
+from application.core.metrics import timed_request
 from application.core.utils import log_slow_execution
 from application.data_access.entity_queries import get_entity_map_lpa
 from application.db.session import get_context_session
@@ -36,7 +37,8 @@ def search_postcode(query: str):
             **base_search_params(),
             "postcode": query,
         }
-        response = requests.get(url, params=params)
+        with timed_request(url):
+            response = requests.get(url, params=params)
         return response.json()
     except Exception:
         logger.exception("search_postcode failed", extra={"query": query})
@@ -51,7 +53,8 @@ def search_uprn(query: str):
             **base_search_params(),
             "uprn": query,
         }
-        response = requests.get(url, params=params)
+        with timed_request(url):
+            response = requests.get(url, params=params)
         return response.json()
     except Exception:
         logger.exception("search_uprn failed", extra={"query": query})
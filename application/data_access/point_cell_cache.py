@@ -0,0 +1,89 @@
+import json
+import logging
+import math
+
+from typing import Callable, Optional, Tuple
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm import Session
+
+from application.db.models import DatasetCollectionOrm
+from application.db.session import session_cache
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# roughly 55m north to south and 35m east to west across England
+POINT_CELL_SIZE = 0.0005
+POINT_CELL_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+@session_cache("data_release", ttl_seconds=5 * 60)
+def get_data_release(session: Session) -> str:
+    """
+    Returns a fingerprint of the resources loaded for every dataset, it
+    changes whenever new data is loaded so can be used to version caches.
+    """
+    resources = func.string_agg(
+        func.concat(
+            DatasetCollectionOrm.dataset_collection, ":", DatasetCollectionOrm.resource
+        ),
+        aggregate_order_by(
+            literal_column("','"), DatasetCollectionOrm.dataset_collection
+        ),
+    )
+    release = session.execute(select(func.md5(resources))).scalar()
+    return release or "none"
+
+
+def get_point_cell(longitude: float, latitude: float) -> Tuple[int, int]:
+    return (
+        math.floor(float(longitude) / POINT_CELL_SIZE),
+        math.floor(float(latitude) / POINT_CELL_SIZE),
+    )
+
+
+def get_point_cell_envelope(cell: Tuple[int, int]):
+    x, y = cell
+    return func.ST_MakeEnvelope(
+        x * POINT_CELL_SIZE,
+        y * POINT_CELL_SIZE,
+        (x + 1) * POINT_CELL_SIZE,
+        (y + 1) * POINT_CELL_SIZE,
+        4326,
+    )
+
+
+def get_point_cell_key(release: str, datasets: list, cell: Tuple[int, int]) -> str:
+    dataset_key = ",".join(datasets) if datasets else "all"
+    return f"point-cell:{release}:{dataset_key}:{cell[0]}/{cell[1]}"
+
+
+def get_cached_point_cell(
+    cache: Optional[redis.Redis], key: str, build_candidates: Callable[[], dict]
+) -> dict:
+    """
+    Returns the candidate entities for a grid cell, building and caching
+    them on a miss. Redis being unavailable only costs the cache.
+    """
+    if cache is not None:
+        try:
+            cached = cache.get(key)
+            if cached is not None:
+                return json.loads(cached)
+        except redis.exceptions.ConnectionError as redis_ex:
+            logger.warning(
+                f"get_cached_point_cell(): redis connection error: {redis_ex}"
+            )
+
+    candidates = build_candidates()
+
+    if cache is not None:
+        try:
+            cache.setex(key, POINT_CELL_CACHE_TTL_SECONDS, json.dumps(candidates))
+        except redis.exceptions.ConnectionError as redis_ex:
+            logger.warning(
+                f"get_cached_point_cell(): redis connection error: {redis_ex}"
+            )
+    return candidates
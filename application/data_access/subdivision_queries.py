@@ -0,0 +1,71 @@
+import logging
+
+from typing import List
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from application.db.models import DatasetSubdividedOrm, EntityOrm, EntitySubdividedOrm
+
+logger = logging.getLogger(__name__)
+
+# a dataset is subdivided when any of its geometries has more vertices than this
+SUBDIVIDE_VERTEX_THRESHOLD = 10000
+# the most vertices in each piece, this is the ST_Subdivide default
+SUBDIVIDE_MAX_VERTICES = 256
+
+
+def get_datasets_to_subdivide(
+    session: Session, vertex_threshold: int = SUBDIVIDE_VERTEX_THRESHOLD
+) -> List[str]:
+    return list(
+        session.scalars(
+            select(EntityOrm.dataset)
+            .where(EntityOrm.geometry_valid)
+            .where(func.ST_NPoints(EntityOrm.geometry) > vertex_threshold)
+            .distinct()
+            .order_by(EntityOrm.dataset)
+        )
+    )
+
+
+def rebuild_entity_subdivided(
+    session: Session,
+    vertex_threshold: int = SUBDIVIDE_VERTEX_THRESHOLD,
+    max_vertices: int = SUBDIVIDE_MAX_VERTICES,
+) -> List[str]:
+    """
+    Refills entity_subdivided from the geometries now in entity. Every entity
+    in a dataset with a geometry above the vertex threshold is cut into
+    pieces of at most max_vertices, so a point or polygon search tests a few
+    small pieces instead of one enormous geometry. dataset_subdivided is
+    rewritten with those datasets, which routes searches of them to
+    entity_subdivided. Everything is replaced in one transaction so searches
+    keep using the previous pieces until it commits.
+    """
+    datasets = get_datasets_to_subdivide(session, vertex_threshold)
+
+    session.execute(delete(EntitySubdividedOrm))
+    session.execute(delete(DatasetSubdividedOrm))
+
+    if datasets:
+        pieces = select(
+            EntityOrm.entity,
+            EntityOrm.dataset,
+            func.ST_Multi(func.ST_Subdivide(EntityOrm.geometry, max_vertices)),
+        ).where(EntityOrm.dataset.in_(datasets), EntityOrm.geometry_valid)
+        session.execute(
+            insert(EntitySubdividedOrm).from_select(
+                ["entity", "dataset", "geometry_subdivided"], pieces
+            )
+        )
+        session.execute(
+            insert(DatasetSubdividedOrm),
+            [
+                {"dataset": dataset, "max_vertices": max_vertices}
+                for dataset in datasets
+            ],
+        )
+
+    session.commit()
+    logger.info(f"rebuilt entity_subdivided for datasets: {', '.join(datasets)}")
+    return datasets
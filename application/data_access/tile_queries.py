@@ -0,0 +1,97 @@
+import logging
+
+from typing import Dict, List, Optional
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from application.data_access.dataset_queries import (
+    get_dataset_names,
+    get_subdivided_datasets,
+)
+from application.db.models import DatasetCollectionOrm, EntityOrm, EntitySubdividedOrm
+from application.db.session import session_cache
+
+logger = logging.getLogger(__name__)
+
+# the most features drawn in a single tile, this keeps the cost of a tile
+# bounded when a low zoom tile covers a whole national dataset
+TILE_FEATURE_LIMIT = 20000
+TILE_EXTENT = 4096
+
+
+# short lived so a new dataset's tiles can be drawn soon after it is added
+@session_cache("tile_dataset_names", ttl_seconds=5 * 60)
+def get_tile_dataset_names(session: Session) -> List[str]:
+    """
+    The datasets tiles can be drawn for, held for a while as every tile of
+    a map asks for them.
+    """
+    return get_dataset_names(session)
+
+
+# short lived so tiles follow a data load soon after it
+@session_cache("dataset_data_versions", ttl_seconds=5 * 60)
+def get_dataset_data_versions(session: Session) -> Dict[str, Optional[str]]:
+    """
+    Returns the latest resource collected for each dataset, which changes
+    each time new data is loaded. Datasets that haven't been collected are
+    left out.
+    """
+    return dict(
+        session.query(
+            DatasetCollectionOrm.dataset_collection, DatasetCollectionOrm.resource
+        ).all()
+    )
+
+
+def get_entity_tile(session: Session, dataset: str, z: int, x: int, y: int) -> bytes:
+    """
+    Builds a Mapbox Vector Tile of the entities in a dataset, with a single
+    layer named after the dataset. Subdivided datasets are drawn from their
+    subdivided geometries, which are far cheaper to clip.
+    """
+    envelope = func.ST_TileEnvelope(z, x, y)
+    bounds = func.ST_Transform(envelope, 4326)
+
+    if dataset in get_subdivided_datasets(session):
+        geometry = EntitySubdividedOrm.geometry_subdivided
+        query = (
+            select(EntityOrm)
+            .join(EntitySubdividedOrm, EntitySubdividedOrm.entity == EntityOrm.entity)
+            .where(EntitySubdividedOrm.dataset == dataset)
+            .where(geometry.op("&&")(bounds))
+        )
+    else:
+        geometry = func.coalesce(EntityOrm.geometry, EntityOrm.point)
+        # the two bounding box checks can each use their spatial index
+        query = (
+            select(EntityOrm)
+            .where(EntityOrm.dataset == dataset)
+            .where(
+                or_(
+                    EntityOrm.geometry.op("&&")(bounds),
+                    EntityOrm.point.op("&&")(bounds),
+                )
+            )
+        )
+
+    features = (
+        query.with_only_columns(
+            func.ST_AsMVTGeom(
+                func.ST_Transform(geometry, 3857), envelope, TILE_EXTENT
+            ).label("geometry"),
+            EntityOrm.entity,
+            EntityOrm.name,
+            EntityOrm.dataset,
+            EntityOrm.reference,
+            EntityOrm.prefix,
+            EntityOrm.organisation_entity.label("organisation-entity"),
+        )
+        .limit(TILE_FEATURE_LIMIT)
+        .subquery("features")
+    )
+
+    tile = session.execute(
+        select(func.ST_AsMVT(features.table_valued(), dataset, TILE_EXTENT, "geometry"))
+    ).scalar()
+    return bytes(tile) if tile is not None else b""
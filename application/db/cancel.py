@@ -0,0 +1,79 @@
+import logging
+
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional, Set, Tuple
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
+# the (database url, backend pid) of each connection the current request
+# has checked out, set by CancelQueriesOnDisconnectMiddleware
+request_backends: ContextVar[Optional[Set[Tuple[str, int]]]] = ContextVar(
+    "request_backends", default=None
+)
+
+
+def track_request_backends(engine: Engine):
+    """
+    Records which database backends each request is using, so their queries
+    can be cancelled if the client goes away.
+    """
+    # cancelled through psycopg2, which doesn't take asyncpg's options
+    url = (
+        engine.url.set(drivername="postgresql")
+        .difference_update_query(["prepared_statement_cache_size"])
+        .render_as_string(hide_password=False)
+    )
+
+    @event.listens_for(engine, "connect")
+    def record_backend_pid(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT pg_backend_pid()")
+            connection_record.info["backend_pid"] = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+    @event.listens_for(engine, "checkout")
+    def add_request_backend(dbapi_connection, connection_record, connection_proxy):
+        backends = request_backends.get()
+        pid = connection_record.info.get("backend_pid")
+        if backends is not None and pid is not None:
+            backend = (url, pid)
+            backends.add(backend)
+            connection_record.info["request_backend"] = (backends, backend)
+
+    @event.listens_for(engine, "checkin")
+    def remove_request_backend(dbapi_connection, connection_record):
+        # a connection back in the pool may be given to another request, so
+        # must stop being cancelled for this one
+        owner = connection_record.info.pop("request_backend", None)
+        if owner is not None:
+            backends, backend = owner
+            backends.discard(backend)
+
+
+@lru_cache(maxsize=None)
+def _get_cancel_engine(url: str) -> Engine:
+    # cancelling shouldn't wait on the pools the abandoned queries are holding
+    return create_engine(url, poolclass=NullPool)
+
+
+def cancel_backends(backends: Set[Tuple[str, int]]):
+    """
+    Cancels the query running on each backend with pg_cancel_backend, a
+    backend that's idle is left alone.
+    """
+    request_backends.set(None)
+    for url, pid in backends:
+        try:
+            with _get_cancel_engine(url).connect() as connection:
+                connection.execute(select(func.pg_cancel_backend(pid)))
+            logger.info(f"cancelled query on backend {pid}, client disconnected")
+        except SQLAlchemyError as e:
+            logger.warning(f"failed to cancel query on backend {pid}: {e}")
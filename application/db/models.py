@@ -3,6 +3,7 @@ from datetime import datetime
 from geoalchemy2 import Geometry
 from sqlalchemy import (
     Column,
+    Computed,
     Date,
     BIGINT,
     Boolean,
@@ -20,7 +21,7 @@ from sqlalchemy.orm import (
     relationship,
     foreign,
     remote,
-    column_property,
+    query_expression,
 )
 
 Base = declarative_base()
@@ -42,14 +43,21 @@ class EntityOrm(Base):
     typology = Column(Text, nullable=True)
     geometry = Column(Geometry(geometry_type="MULTIPOLYGON", srid=4326), nullable=True)
     point = Column(Geometry(geometry_type="POINT", srid=4326), nullable=True)
+    # worked out by postgres whenever geometry is written so spatial searches
+    # don't need to call ST_IsValid, null when there is no geometry
+    geometry_valid = Column(
+        Boolean, Computed("ST_IsValid(geometry)", persisted=True), nullable=True
+    )
 
     # TODO: We need to create a model for `QualityOrm` and map it to `quality`
     # so that we can access other quality attributes and remove the
     # `map_entity_quality_to_description()` function
     quality = Column(Text, nullable=True)
     geojson_col = Column(JSONB, name="geojson", nullable=True)
-    _geometry_geojson = column_property(func.ST_AsGeoJSON(geometry))
-    _point_geojson = column_property(func.ST_AsGeoJSON(point))
+    # queries can replace these with with_expression to simplify the geometry
+    # or round its coordinates, see get_geojson_expressions
+    _geometry_geojson = query_expression(func.ST_AsGeoJSON(geometry))
+    _point_geojson = query_expression(func.ST_AsGeoJSON(point))
 
     @hybrid_property
     def geojson(self):
@@ -75,6 +83,14 @@ idx_entity_prefix = Index("idx_entity_prefix", EntityOrm.prefix)
 idx_entity_reference = Index("idx_entity_reference", EntityOrm.reference)
 idx_entity_typology = Index("idx_entity_typology", EntityOrm.typology)
 
+# spatial searches only look at valid geometries so use these smaller indexes
+idx_entity_geometry_valid = Index(
+    "idx_entity_geometry_valid",
+    EntityOrm.geometry,
+    postgresql_using="gist",
+    postgresql_where=EntityOrm.geometry_valid,
+)
+
 # add another index which is in the db. this was created initionally before the above was added
 # might want to examine if it's needed or not
 idx_entity_columns = Index(
@@ -101,6 +117,11 @@ class EntitySubdividedOrm(Base):
     geometry_subdivided = Column(
         Geometry(geometry_type="MULTIPOLYGON", srid=4326), nullable=False
     )
+    geometry_valid = Column(
+        Boolean,
+        Computed("ST_IsValid(geometry_subdivided)", persisted=True),
+        nullable=True,
+    )
 
 
 # Indexes for entity Subdivided
@@ -109,6 +130,24 @@ idx_entity_subdivided_columns = Index(
     EntitySubdividedOrm.entity,
     EntitySubdividedOrm.dataset,
 )
+idx_entity_subdivided_geometry_valid = Index(
+    "idx_entity_subdivided_geometry_valid",
+    EntitySubdividedOrm.geometry_subdivided,
+    postgresql_using="gist",
+    postgresql_where=EntitySubdividedOrm.geometry_valid,
+)
+
+
+class DatasetSubdividedOrm(Base):
+    """
+    The datasets whose geometries are searched in entity_subdivided rather
+    than entity, see application.data_access.subdivision_queries
+    """
+
+    __tablename__ = "dataset_subdivided"
+
+    dataset = Column(Text, primary_key=True)
+    max_vertices = Column(Integer, nullable=True)
 
 
 class OldEntityOrm(Base):
@@ -0,0 +1,148 @@
+import logging
+import random
+import time
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReadReplica:
+    url: str
+    weight: int
+    engine: Engine
+    failed_at: Optional[float] = None
+
+    @property
+    def name(self):
+        return make_url(self.url).render_as_string(hide_password=True)
+
+
+class ReadReplicaRouter:
+    """
+    Chooses which read database a session uses, weighted by the share of
+    reads each should take. A replica that fails to connect or drops its
+    connection is taken out of rotation for retry_seconds, after which it's
+    tried again and returns to rotation once a connection succeeds.
+
+    routes maps a query type, such as "spatial", to the replica it should
+    stick to while that replica is healthy.
+    """
+
+    def __init__(
+        self,
+        replicas: List[ReadReplica],
+        routes: Optional[Dict[str, ReadReplica]] = None,
+        retry_seconds: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+        choices: Callable = random.choices,
+    ):
+        self.replicas = replicas
+        self.routes = routes or {}
+        self.retry_seconds = retry_seconds
+        self._clock = clock
+        self._choices = choices
+
+        for replica in replicas:
+            self._watch(replica)
+
+    def healthy(self) -> List[ReadReplica]:
+        now = self._clock()
+        return [
+            replica
+            for replica in self.replicas
+            if replica.failed_at is None
+            or now - replica.failed_at >= self.retry_seconds
+        ]
+
+    def choose(self, query_type: Optional[str] = None) -> ReadReplica:
+        # with every replica failing, keep trying them rather than failing
+        # every request until one is retried
+        healthy = self.healthy() or self.replicas
+
+        sticky = self.routes.get(query_type)
+        if sticky is not None and sticky in healthy:
+            return sticky
+
+        return self._choices(healthy, weights=[r.weight for r in healthy])[0]
+
+    def mark_failed(self, replica: ReadReplica):
+        if replica.failed_at is None:
+            logger.warning(f"read replica {replica.name} taken out of rotation")
+        replica.failed_at = self._clock()
+
+    def mark_healthy(self, replica: ReadReplica):
+        if replica.failed_at is not None:
+            logger.info(f"read replica {replica.name} back in rotation")
+            replica.failed_at = None
+
+    def _watch(self, replica: ReadReplica):
+        @event.listens_for(replica.engine, "engine_connect")
+        def connected(connection):
+            self.mark_healthy(replica)
+
+        @event.listens_for(replica.engine, "handle_error")
+        def errored(context):
+            # no connection means connecting failed, pool_pre_ping reports a
+            # dead connection as a disconnect
+            if context.connection is None or context.is_disconnect:
+                self.mark_failed(replica)
+
+
+def create_read_replica_router(
+    settings, create_engine: Callable[[str, str], Engine]
+) -> ReadReplicaRouter:
+    """
+    create_engine is given each database's url and a label for its metrics,
+    "read" for READ_DATABASE_URL and "replica-1" on for the replicas.
+    """
+    urls = [str(settings.READ_DATABASE_URL), *settings.READ_REPLICA_URLS]
+    labels = ["read", *[f"replica-{i}" for i in range(1, len(urls))]]
+    weights = settings.READ_DATABASE_WEIGHTS or [1] * len(urls)
+    replicas = [
+        ReadReplica(url=url, weight=weight, engine=create_engine(url, label))
+        for url, label, weight in zip(urls, labels, weights)
+    ]
+    routes = {
+        query_type: replicas[index]
+        for query_type, index in settings.READ_DATABASE_ROUTES.items()
+    }
+    return ReadReplicaRouter(
+        replicas, routes, retry_seconds=settings.READ_REPLICA_RETRY_SECONDS
+    )
+
+
+class ReadSession(Session):
+    """
+    A session bound to the read databases. The first query of each query
+    type picks a replica from read_replicas, and later queries of that type
+    in the session use it too so they see the same data.
+    """
+
+    def __init__(self, *args, read_replicas: ReadReplicaRouter = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.read_replicas = read_replicas
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.read_replicas is None:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+
+        query_type = self.info.get("query_type")
+        binds = self.info.setdefault("read_binds", {})
+        if query_type not in binds:
+            binds[query_type] = self.read_replicas.choose(query_type).engine
+        return binds[query_type]
+
+
+def set_query_type(session: Session, query_type: str):
+    """
+    Routes the session's following queries as query_type, see
+    READ_DATABASE_ROUTES.
+    """
+    session.info["query_type"] = query_type
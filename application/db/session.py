@@ -1,8 +1,23 @@
-from sqlalchemy import create_engine
+from fastapi import Depends
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Iterator, Optional
+from typing import AsyncIterator, Iterator, Optional
 import logging
 import json
+from application.db.cancel import track_request_backends
+from application.core.metrics import (
+    REDIS_CACHE_HITS,
+    REDIS_CACHE_MISSES,
+    TimedAsyncAdaptedQueuePool,
+    TimedQueuePool,
+    track_pool_metrics,
+)
+from application.core.timing import timed, track_db_time
+from application.db.slow_queries import track_statement_times
+from application.db.statement_counts import count_statements
+from application.db.replicas import ReadSession, create_read_replica_router
 from application.settings import get_settings, Settings
 from contextlib import contextmanager
 from functools import wraps, lru_cache
@@ -18,15 +33,23 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def _create_engine():
+def _create_engine(url: str, label: str = "read"):
     settings = get_settings()
     engine = create_engine(
-        str(settings.READ_DATABASE_URL),
+        url,
         pool_size=settings.DB_POOL_SIZE,
         max_overflow=settings.DB_POOL_MAX_OVERFLOW,
         pool_pre_ping=True,
+        query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+        poolclass=TimedQueuePool,
     )
 
+    track_request_backends(engine)
+    track_pool_metrics(engine, label)
+    track_statement_times(engine)
+    track_db_time(engine)
+    count_statements(engine)
+
     logger.info(
         f"Engine created with pool_size={engine.pool.size()}, "
         f"max_overflow={engine.pool._max_overflow} "
@@ -35,6 +58,11 @@ def _create_engine():
     return engine
 
 
+@lru_cache(maxsize=1)
+def _get_read_replicas():
+    return create_read_replica_router(get_settings(), _create_engine)
+
+
 @lru_cache(maxsize=1)
 def _get_session_local():
     # Lazily initialised on first request rather than at import time.
@@ -45,8 +73,13 @@ def _get_session_local():
     #
     # Use _get_session_local.cache_clear() to force re-initialisation
     # (e.g. in tests that need a fresh engine).
-    engine = _create_engine()
-    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return sessionmaker(
+        class_=ReadSession,
+        autocommit=False,
+        autoflush=False,
+        read_replicas=_get_read_replicas(),
+        info={"statement_timeouts": _get_statement_timeouts(get_settings())},
+    )
 
 
 def get_session() -> Iterator[Session]:
@@ -57,6 +90,118 @@ def get_session() -> Iterator[Session]:
         db.close()
 
 
+def _create_async_engine(url: str, label: str = "read"):
+    settings = get_settings()
+    url = make_url(url).set(drivername="postgresql+asyncpg")
+    # asyncpg prepares each statement on the server, and reuses it for the
+    # same compiled SQL on that connection
+    url = url.update_query_dict(
+        {
+            "prepared_statement_cache_size": str(
+                settings.DB_PREPARED_STATEMENT_CACHE_SIZE
+            )
+        }
+    )
+    engine = create_async_engine(
+        url,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_POOL_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+        poolclass=TimedAsyncAdaptedQueuePool,
+    )
+
+    track_request_backends(engine.sync_engine)
+    track_pool_metrics(engine.sync_engine, f"async-{label}")
+    track_db_time(engine.sync_engine)
+    count_statements(engine.sync_engine)
+
+    logger.info(
+        f"Async engine created with pool_size={engine.pool.size()}, "
+        f"max_overflow={engine.pool._max_overflow} "
+    )
+
+    return engine
+
+
+@lru_cache(maxsize=1)
+def _get_async_read_replicas():
+    # async sessions bind to the sync face of the async engines
+    return create_read_replica_router(
+        get_settings(), lambda url, label: _create_async_engine(url, label).sync_engine
+    )
+
+
+@lru_cache(maxsize=1)
+def _get_async_session_local():
+    # Lazily initialised for the same reasons as _get_session_local, and
+    # cleared the same way.
+    return async_sessionmaker(
+        sync_session_class=ReadSession,
+        autoflush=False,
+        expire_on_commit=False,
+        read_replicas=_get_async_read_replicas(),
+        info={"statement_timeouts": _get_statement_timeouts(get_settings())},
+    )
+
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    """
+    Used by async routes, so a worker can wait on many queries at once
+    rather than holding a threadpool thread for each one.
+    """
+    async with _get_async_session_local()() as session:
+        yield session
+
+
+def _get_statement_timeouts(settings: Settings):
+    return {
+        "search": settings.SEARCH_STATEMENT_TIMEOUT_MS,
+        "entity": settings.ENTITY_STATEMENT_TIMEOUT_MS,
+        "dataset-list": settings.DATASET_LIST_STATEMENT_TIMEOUT_MS,
+    }
+
+
+def set_statement_timeout(session: Session, budget: str):
+    """
+    Has postgres cancel any of the session's queries that run for longer
+    than the statement timeout budget, one of "search", "entity" or
+    "dataset-list". Applies to transactions the session begins after this.
+    """
+    session.info["statement_timeout"] = budget
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    timeout_ms = session.info.get("statement_timeouts", {}).get(
+        session.info.get("statement_timeout")
+    )
+    if timeout_ms:
+        # set_config as SET can't take a bound parameter, local to the
+        # transaction so it doesn't outlive the session's use of the connection
+        connection.execute(
+            select(func.set_config("statement_timeout", str(timeout_ms), True))
+        )
+
+
+def get_timed_session(budget: str):
+    """
+    Returns a get_session dependency for routes with their own statement
+    timeout budget, see set_statement_timeout.
+    """
+
+    def get_session_with_timeout(session: Session = Depends(get_session)) -> Session:
+        set_statement_timeout(session, budget)
+        return session
+
+    return get_session_with_timeout
+
+
+get_search_session = get_timed_session("search")
+get_entity_session = get_timed_session("entity")
+get_dataset_list_session = get_timed_session("dataset-list")
+
+
 @contextmanager
 def get_context_session() -> Iterator[Session]:
     session = _get_session_local()()
@@ -109,21 +254,37 @@ class DbSession:
     redis: Optional[redis.Redis]
 
 
+class TimedRedis(redis.Redis):
+    """Adds the time spent on each command to the request's redis phase."""
+
+    def execute_command(self, *args, **options):
+        with timed("redis"):
+            return super().execute_command(*args, **options)
+
+
 _redis = None
+_redis_binary = None
 
 
 def init_redis(settings: Settings):
     """Initialise Redis instance."""
-    global _redis
+    global _redis, _redis_binary
 
     try:
-        _redis = redis.Redis(
+        _redis = TimedRedis(
             host=settings.REDIS_HOST,
             port=settings.REDIS_PORT,
             ssl=settings.REDIS_SECURE,
             decode_responses=True,
             socket_timeout=2,
         )
+        # binary values such as map tiles can't be decoded as strings
+        _redis_binary = TimedRedis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            ssl=settings.REDIS_SECURE,
+            socket_timeout=2,
+        )
         _redis.ping()
         logger.info("get_redis(): connected")
     except redis.exceptions.ConnectionError as redis_ex:
@@ -136,6 +297,10 @@ def get_redis() -> Iterator[redis.Redis]:
     return _redis
 
 
+def get_redis_binary() -> Optional[redis.Redis]:
+    return _redis_binary
+
+
 def redis_cache(key, model_class, ttl_seconds=60 * 60 * 6):
     def make_key(session):
         return f"cache:{key}"
@@ -153,6 +318,7 @@ def redis_cache(key, model_class, ttl_seconds=60 * 60 * 6):
                 if cached is not None:
                     items = json.loads(cached)  # TODO: try without "decode" option
                     val = [model_class.parse_obj(obj) for obj in items]
+                    REDIS_CACHE_HITS.labels(key).inc()
             except redis.exceptions.ConnectionError as redis_ex:
                 logger.warning(f"redis_cache(): redis connection error: {redis_ex}")
             except Exception as ex:
@@ -162,6 +328,7 @@ def redis_cache(key, model_class, ttl_seconds=60 * 60 * 6):
 
             if val is None:
                 val = user_func(session)
+                REDIS_CACHE_MISSES.labels(key).inc()
                 logger.info(f"redis_cache(): session cache miss for key='{key}'")
                 try:
                     serialised = json.dumps(
@@ -0,0 +1,175 @@
+import json
+import logging
+import random
+import threading
+import time
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ExecutedStatement:
+    engine: Engine
+    statement: str
+    parameters: Any
+    seconds: float
+    # the SQL with its parameters bound, when the driver keeps it
+    query: Optional[str] = None
+
+
+# the statements run by the function log_slow_execution is timing
+_statements: ContextVar[Optional[List[ExecutedStatement]]] = ContextVar(
+    "slow_query_statements", default=None
+)
+
+
+@contextmanager
+def collect_statements(statements: Optional[List[ExecutedStatement]] = None):
+    """
+    Collects the statements run inside the block, adding them to statements
+    when it's given.
+    """
+    if statements is None:
+        statements = []
+    token = _statements.set(statements)
+    try:
+        yield statements
+    finally:
+        _statements.reset(token)
+
+
+def track_statement_times(engine: Engine):
+    """
+    Times each statement engine runs while statements are being collected.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start(conn, cursor, statement, parameters, context, executemany):
+        if _statements.get() is not None:
+            conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def finish(conn, cursor, statement, parameters, context, executemany):
+        statements = _statements.get()
+        started = conn.info.get("slow_query_start")
+        if statements is None or not started:
+            return
+        query = getattr(cursor, "query", None)
+        statements.append(
+            ExecutedStatement(
+                engine=conn.engine,
+                statement=statement,
+                parameters=parameters,
+                seconds=time.perf_counter() - started.pop(),
+                query=query.decode() if isinstance(query, bytes) else query,
+            )
+        )
+
+
+class SlowQueryCapture:
+    """
+    Keeps the plans of the slowest statements run by slow functions, in a
+    ring buffer of the latest size records. Slow calls are sampled at
+    sample_rate and at most one is explained every interval_seconds, so a
+    burst of slow requests doesn't add a burst of EXPLAINs.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        interval_seconds: float = 60,
+        size: int = 50,
+        clock: Callable[[], float] = time.monotonic,
+        sample: Callable[[], float] = random.random,
+    ):
+        self.sample_rate = sample_rate
+        self.interval_seconds = interval_seconds
+        self.records = deque(maxlen=size)
+        self._clock = clock
+        self._sample = sample
+        self._lock = threading.Lock()
+        self._last_captured = None
+
+    def should_capture(self) -> bool:
+        if not self.sample_rate or self._sample() >= self.sample_rate:
+            return False
+        with self._lock:
+            now = self._clock()
+            if (
+                self._last_captured is not None
+                and now - self._last_captured < self.interval_seconds
+            ):
+                return False
+            self._last_captured = now
+            return True
+
+    def capture(
+        self, function: str, elapsed: float, statements: List[ExecutedStatement]
+    ):
+        if not statements:
+            return
+        slowest = max(statements, key=lambda s: s.seconds)
+        record = {
+            "function": function,
+            "captured_at": datetime.now(timezone.utc).isoformat(),
+            "elapsed_seconds": round(elapsed, 3),
+            "statement_seconds": round(slowest.seconds, 3),
+            "statements": len(statements),
+            "sql": slowest.query or slowest.statement,
+            "parameters": json.loads(json.dumps(slowest.parameters, default=str)),
+            "plan": _explain(slowest),
+        }
+        self.records.append(record)
+        logger.warning(f"{function} slow query plan", extra={"slow_query": record})
+
+
+def _explain(statement: ExecutedStatement):
+    try:
+        with statement.engine.connect() as connection:
+            return connection.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement.statement}", statement.parameters
+            ).scalar()
+    except SQLAlchemyError as e:
+        logger.warning(f"failed to explain slow query: {e}")
+        return None
+
+
+_capture = SlowQueryCapture()
+
+
+def init_slow_query_capture(settings):
+    global _capture
+    _capture = SlowQueryCapture(
+        sample_rate=settings.SLOW_QUERY_SAMPLE_RATE,
+        interval_seconds=settings.SLOW_QUERY_INTERVAL_SECONDS,
+        size=settings.SLOW_QUERY_RECORDS,
+    )
+
+
+def get_slow_query_capture() -> SlowQueryCapture:
+    return _capture
+
+
+def capture_slow_queries(
+    function: str, elapsed: float, statements: List[ExecutedStatement]
+):
+    """
+    Explains the slowest of statements if this slow call is sampled. The
+    EXPLAIN runs on another thread so the slow request isn't made slower.
+    """
+    capture = get_slow_query_capture()
+    if statements and capture.should_capture():
+        threading.Thread(
+            target=capture.capture, args=(function, elapsed, statements), daemon=True
+        ).start()
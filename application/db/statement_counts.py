@@ -0,0 +1,83 @@
+import logging
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+class StatementCounter:
+    """
+    Counts the statements run, by their SQL with placeholders for the
+    parameters, so the same query run for each of a list of things shows up
+    as one statement run many times.
+    """
+
+    def __init__(self):
+        self.statements = Counter()
+
+    def add(self, statement: str):
+        self.statements[statement] += 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.statements.values())
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        return {
+            statement: count
+            for statement, count in self.statements.most_common()
+            if count > threshold
+        }
+
+    def summary(self) -> str:
+        return "\n".join(
+            f"{count} x {' '.join(statement.split())[:200]}"
+            for statement, count in self.statements.most_common()
+        )
+
+
+# set by StatementCountMiddleware for the request being handled
+request_statements: ContextVar[Optional[StatementCounter]] = ContextVar(
+    "request_statements", default=None
+)
+
+
+@contextmanager
+def counting_statements():
+    counter = StatementCounter()
+    token = request_statements.set(counter)
+    try:
+        yield counter
+    finally:
+        request_statements.reset(token)
+
+
+def count_statements(engine: Engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        counter = request_statements.get()
+        if counter is not None:
+            counter.add(statement)
+
+
+def warn_repeated_statements(counter: StatementCounter, threshold: int, path: str):
+    repeated = counter.repeated(threshold)
+    if repeated:
+        logger.warning(
+            f"{path} ran {len(repeated)} statement(s) more than {threshold} times, "
+            f"{counter.total} statements in all",
+            extra={
+                "path": path,
+                "statements": counter.total,
+                "repeated_statements": [
+                    {"statement": statement, "count": count}
+                    for statement, count in repeated.items()
+                ],
+            },
+        )
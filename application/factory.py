@@ -1,11 +1,15 @@
+import anyio
+import asyncio
 import logging
 import sentry_sdk
 import os
+import secrets
 
 from datetime import timedelta
+from typing import Optional
 
 from sqlalchemy.orm import Session
-from fastapi import FastAPI, Request, status, Depends
+from fastapi import FastAPI, Header, HTTPException, Request, status, Depends
 from fastapi.encoders import jsonable_encoder
 from fastapi.exception_handlers import http_exception_handler
 from fastapi.exceptions import RequestValidationError
@@ -17,11 +21,24 @@ from sentry_sdk.integrations.asgi import SentryAsgiMiddleware
 from sentry_sdk.integrations.logging import LoggingIntegration
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.datastructures import MutableHeaders
 from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from http import HTTPStatus
 
+from application.db.cancel import cancel_backends, request_backends
 from application.db.session import get_session, init_redis
+from application.db.statement_counts import (
+    counting_statements,
+    warn_repeated_statements,
+)
+from application.db.slow_queries import (
+    get_slow_query_capture,
+    init_slow_query_capture,
+)
 from application.core.templates import templates, init_templates
+from application.core.metrics import generate_metrics, observe_request
+from application.core.timing import RequestTimings, request_timings
 from application.db.models import EntityOrm
 from application.exceptions import DigitalLandValidationError
 from application.routers import (
@@ -37,10 +54,12 @@ from application.routers import (
     map_,
     guidance_,
     about_,
+    tiles,
 )
-from application.settings import get_settings
+from application.settings import get_settings, Settings
 
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("application.access")
 
 # TODO: We should get the logging levels from environment variables so that
 # if we need to change them for testing reasons, or if we want to have
@@ -83,6 +102,7 @@ def create_app():
     settings = get_settings()
     init_redis(settings)
     init_templates(settings)
+    init_slow_query_capture(settings)
     app = FastAPI(
         title="planning.data.gov.uk API",
         description=description,
@@ -138,8 +158,6 @@ def add_base_routes(app):
     def invalid_geometries(session: Session = Depends(get_session)):
         from application.core.models import entity_factory
         from sqlalchemy import func
-        from sqlalchemy import and_
-        from sqlalchemy import not_
 
         try:
             query_args = [
@@ -147,12 +165,7 @@ def add_base_routes(app):
                 func.ST_IsValidReason(EntityOrm.geometry).label("invalid_reason"),
             ]
             query = session.query(*query_args)
-            query = query.filter(
-                and_(
-                    EntityOrm.geometry.is_not(None),
-                    not_(func.ST_IsValid(EntityOrm.geometry)),
-                )
-            )
+            query = query.filter(EntityOrm.geometry_valid.is_(False))
             entities = query.all()
             return [
                 {
@@ -165,6 +178,17 @@ def add_base_routes(app):
             logger.exception(e)
             return {"message": "There was an error checking for invalid geometries"}
 
+    @app.get(
+        "/admin/slow-queries", response_class=JSONResponse, include_in_schema=False
+    )
+    def slow_queries(_: None = Depends(require_admin_token)):
+        return {"slow_queries": list(reversed(get_slow_query_capture().records))}
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics(_: None = Depends(require_admin_token)):
+        content, media_type = generate_metrics()
+        return Response(content=content, media_type=media_type)
+
     @app.get("/cookies", response_class=HTMLResponse, include_in_schema=False)
     def cookies(request: Request):
         return templates.TemplateResponse(request, "pages/cookies.html")
@@ -234,11 +258,7 @@ def add_base_routes(app):
             isinstance(e.get("ctx", {}).get("error"), DigitalLandValidationError)
             for e in exc.errors()
         ):
-            try:
-                extension_path_param = request.path_params["extension"]
-            except KeyError:
-                extension_path_param = None
-            if extension_path_param in ["json", "geojson"]:
+            if _is_api_request(request):
                 return JSONResponse(
                     status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                     content=jsonable_encoder({"detail": exc.errors()}),
@@ -253,12 +273,7 @@ def add_base_routes(app):
 
     @app.exception_handler(RequestValidationError)
     async def custom_request_validation_error_handler(request, exc):
-        try:
-            extension_path_param = request.path_params["extension"]
-        except KeyError:
-            extension_path_param = None
-
-        if extension_path_param in ["json", "geojson"]:
+        if _is_api_request(request):
             return JSONResponse(
                 status_code=422,
                 content=jsonable_encoder({"detail": exc.errors()}),
@@ -272,6 +287,42 @@ def add_base_routes(app):
         return templates.TemplateResponse(request, "500.html", status_code=500)
 
 
+def require_admin_token(
+    authorization: Optional[str] = Header(None),
+    settings: Settings = Depends(get_settings),
+):
+    # hidden rather than forbidden, so the route isn't discoverable
+    if not settings.ADMIN_TOKEN or not secrets.compare_digest(
+        authorization or "", f"Bearer {settings.ADMIN_TOKEN}"
+    ):
+        raise HTTPException(status_code=404)
+
+
+def _is_api_request(request: Request) -> bool:
+    """
+    Whether an error should be given as JSON rather than a page: the request
+    asked for json, geojson or ndjson, or went to a route without an
+    extension that declares it returns data, like POST /entity/batch. Routes
+    left with the default response class, such as the about and guidance
+    pages, are treated as pages.
+    """
+    try:
+        extension_path_param = request.path_params["extension"]
+    except KeyError:
+        extension_path_param = None
+    if request.url.path.endswith(".ndjson"):
+        extension_path_param = "ndjson"
+    if extension_path_param is not None:
+        return extension_path_param in ["json", "geojson", "ndjson"]
+
+    route = request.scope.get("route")
+    response_class = getattr(route, "response_class", None)
+    # an unset response class is a DefaultPlaceholder rather than a class
+    return isinstance(response_class, type) and not issubclass(
+        response_class, HTMLResponse
+    )
+
+
 def add_routers(app):
     app.include_router(entity.router, prefix="/entity")
     app.include_router(dataset.router, prefix="/dataset")
@@ -287,6 +338,7 @@ def add_routers(app):
     app.include_router(map_.router, prefix="/map", include_in_schema=False)
     app.include_router(guidance_.router, prefix="/guidance", include_in_schema=False)
     app.include_router(about_.router, prefix="/about", include_in_schema=False)
+    app.include_router(tiles.router, prefix="/tiles", include_in_schema=False)
 
 
 def add_static(app):
@@ -328,6 +380,11 @@ def add_middleware(app, settings):
 
     # this has to registered after the first middleware but before sentry?
     app.add_middleware(SuppressClientDisconnectNoResponseReturnedMiddleware)
+    app.add_middleware(CancelQueriesOnDisconnectMiddleware)
+    app.add_middleware(ServerTimingMiddleware)
+    app.add_middleware(
+        StatementCountMiddleware, threshold=settings.REPEATED_STATEMENT_THRESHOLD
+    )
 
     if settings.SENTRY_DSN:
         sentry_sdk.init(
@@ -361,3 +418,127 @@ class SuppressClientDisconnectNoResponseReturnedMiddleware(BaseHTTPMiddleware):
             else:
                 raise
         return response
+
+
+class CancelQueriesOnDisconnectMiddleware:
+    """
+    Cancels the database queries a request is running when its client
+    disconnects, so an abandoned search doesn't keep holding a connection
+    until it finishes.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        backends = set()
+        token = request_backends.set(backends)
+        response_sent = False
+        # only the reader calls the server's receive, so it never races the
+        # app for a message, the app's messages are handed on through a queue
+        messages = asyncio.Queue()
+
+        async def app_receive() -> Message:
+            message = await messages.get()
+            if message["type"] == "http.disconnect":
+                # stays disconnected for any later receive
+                messages.put_nowait(message)
+            return message
+
+        async def app_send(message: Message):
+            nonlocal response_sent
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                response_sent = True
+            await send(message)
+
+        async def cancel_on_disconnect():
+            message = await receive()
+            while message["type"] != "http.disconnect":
+                messages.put_nowait(message)
+                message = await receive()
+            if not response_sent and backends:
+                await anyio.to_thread.run_sync(cancel_backends, set(backends))
+            messages.put_nowait(message)
+
+        # a plain task rather than a task group, which would wrap the app's
+        # errors in an ExceptionGroup
+        watcher = asyncio.create_task(cancel_on_disconnect())
+        try:
+            await self.app(scope, app_receive, app_send)
+        finally:
+            watcher.cancel()
+            request_backends.reset(token)
+
+
+class ServerTimingMiddleware:
+    """
+    Times the phases of each request, see application.core.timing. The
+    phases so far go out in a Server-Timing header, and every phase in an
+    access log line once the response is finished. A streamed body is
+    still being written after the header is sent, so only the log line
+    covers it. The finished request is also added to the /metrics latency
+    histograms.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = request_timings.set(timings)
+        status_code = None
+
+        async def timed_send(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.server_timing())
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                observe_request(scope, status_code, timings)
+                access_logger.info(
+                    f"{scope['method']} {scope['path']} {status_code} "
+                    f"{timings.total() * 1000:.1f}ms",
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status_code": status_code,
+                        "timings": timings.as_dict(),
+                    },
+                )
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            request_timings.reset(token)
+
+
+class StatementCountMiddleware:
+    """
+    Counts the statements each request runs, and logs a warning when it
+    runs the same one more than threshold times.
+    """
+
+    def __init__(self, app: ASGIApp, threshold: int = 5):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with counting_statements() as counter:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                warn_repeated_statements(counter, self.threshold, scope["path"])
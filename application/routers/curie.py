@@ -4,32 +4,32 @@ from typing import Optional
 from fastapi import APIRouter, HTTPException, Depends
 from starlette.requests import Request
 from starlette.responses import HTMLResponse, RedirectResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from application.core.utils import (
     DigitalLandJSONResponse,
 )
 from application.search.enum import SuffixEntity
 from application.data_access.curie_queries import (
-    get_lookup_by_curie,
-    get_entity_by_curie,
+    get_lookup_by_curie_async,
+    get_entity_by_curie_async,
 )
-from application.db.session import get_session
+from application.db.session import get_async_session
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-def get_entity_redirect_by_curie(
+async def get_entity_redirect_by_curie(
     request: Request,
     prefix: str,
     reference: str,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     extension: Optional[SuffixEntity] = None,
 ):
-    lookup = get_lookup_by_curie(session, prefix, reference)
+    lookup = await get_lookup_by_curie_async(session, prefix, reference)
     if len(lookup) == 0:
-        lookup = get_entity_by_curie(session, prefix, reference)
+        lookup = await get_entity_by_curie_async(session, prefix, reference)
 
     if len(lookup) == 0:
         raise HTTPException(status_code=404)
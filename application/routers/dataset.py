@@ -23,7 +23,12 @@ from application.core.templates import templates
 from application.core.utils import DigitalLandJSONResponse, to_snake
 from application.search.enum import SuffixDataset
 from application.settings import get_settings, Settings
-from application.db.session import get_session, get_redis, DbSession
+from application.db.session import (
+    get_session,
+    get_dataset_list_session,
+    get_redis,
+    DbSession,
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -60,7 +65,7 @@ def list_datasets(
     request: Request,
     extension: Optional[SuffixDataset] = None,
     query_filters: DatasetQueryFilters = Depends(),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_dataset_list_session),
     redis: Redis = Depends(get_redis),
 ):
     datasets = get_all_datasets(DbSession(session=session, redis=redis))
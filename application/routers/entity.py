@@ -3,17 +3,18 @@ import sentry_sdk
 from urllib.parse import urlencode
 
 from dataclasses import asdict
-from typing import Optional, List, Set, Dict, Union, Tuple
+from typing import Annotated, Optional, List, Set, Dict, Union, Tuple
 
 from shapely import wkt as shapely_wkt
 
 from fastapi import APIRouter, Depends, HTTPException, Request, Path, Query
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from pydantic import ValidationError
 from pydantic_core import InitErrorDetails, PydanticCustomError
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 import redis
 from application.core.models import GeoJSON, EntityModel
@@ -27,32 +28,59 @@ from application.data_access.digital_land_queries import (
 )
 from application.data_access.entity_queries import (
     get_entity_query,
+    get_entity_query_async,
     get_entity_search,
+    get_organisation_entity,
     get_organisations,
-    lookup_entity_link,
-    get_linked_entities,
+    get_point_lookup,
+    lookup_entity_links,
+    get_linked_entities_by_dataset,
     fetchEntityFromReference,
+    fetch_entities_by_reference,
+    stream_entities_by_id,
+    stream_entity_search,
+    stream_entity_search_documents,
 )
+from application.data_access.entity_query_helpers import normalised_params
 from application.data_access.dataset_queries import get_dataset_names
 from application.data_access.find_an_area_helpers import find_an_area
 
 from application.search.enum import SuffixEntity
-from application.search.filters import QueryFilters
+from application.search.filters import (
+    EntityBatchRequest,
+    PointLookupRequest,
+    QueryFilters,
+)
 from application.core.templates import templates
+from application.core.timing import timed_phase
 from application.core.utils import (
     DigitalLandJSONResponse,
+    digital_land_json_dumps,
     to_snake,
     entity_attribute_sort_key,
     map_entity_quality_to_description,
     make_links,
+    stream_entity_list,
+    stream_feature_collection,
+)
+from application.db.session import (
+    get_async_session,
+    get_session,
+    get_entity_session,
+    get_search_session,
+    get_redis,
+    DbSession,
 )
-from application.db.session import get_session, get_redis, DbSession
 from application.db.models import EntityOrm
 from application.search.validators import validate_dataset
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# decimal places of the geometry drawn on the entity page map, which is
+# around 10cm and finer than the map can show
+ENTITY_MAP_PRECISION = 6
+
 
 @router.get(
     "/dataset-name-search.json",
@@ -114,6 +142,7 @@ def _get_geojson(
     return {"type": "FeatureCollection", "features": features}
 
 
+@timed_phase("serialise")
 def _get_entity_json(
     data: List[EntityModel],
     include: Optional[Set] = None,
@@ -133,6 +162,27 @@ def _get_entity_json(
     return entities
 
 
+def _get_exclude_fields(params) -> Optional[Set]:
+    if params.get("exclude_field") is None:
+        return None
+    return set(
+        [
+            to_snake(field.strip())
+            for field in ",".join(params.get("exclude_field")).split(",")
+        ]
+    )
+
+
+def _get_entity_json_fields(params) -> Tuple[Optional[Set], Optional[Set]]:
+    """
+    Returns the (include, exclude) fields asked for in the field and
+    exclude_field params, field takes over if both are given.
+    """
+    if params.get("field") is not None:
+        return set([to_snake(field) for field in params.get("field")]), None
+    return None, _get_exclude_fields(params)
+
+
 def handle_gone_entity(
     request: Request, entity: int, extension: Optional[SuffixEntity]
 ):
@@ -204,7 +254,7 @@ def handle_entity_response(
     organisation = None
     organisation_curie = None
     if e.organisation_entity is not None:
-        organisation, _, _ = get_entity_query(e.organisation_entity)
+        organisation = get_organisation_entity(session, e.organisation_entity)
         if organisation:
             organisation_curie = f"{organisation.prefix}:{organisation.reference}"
             e_dict["organisation-entity"] = str(organisation.organisation_entity)
@@ -242,19 +292,19 @@ def handle_entity_response(
         "listed-building",
     ]
 
-    linked_entities = {}
     # for each entityLinkField, if that key exists in the entity dict, then
     # lookup the entity and add it to the linked_entities dict
-    for field in entityLinkFields:
-        if field in e_dict_sorted:
-            linked_entity = lookup_entity_link(
-                session,
-                e_dict_sorted[field],
-                field,
-                e_dict_sorted["organisation-entity"],
-            )
-            if linked_entity is not None:
-                linked_entities[field] = linked_entity
+    links = {
+        field: e_dict_sorted[field]
+        for field in entityLinkFields
+        if e_dict_sorted.get(field) is not None
+    }
+    found_entities = lookup_entity_links(
+        session, links, e_dict_sorted["organisation-entity"]
+    )
+    linked_entities = {
+        field: found_entities[field] for field in links if field in found_entities
+    }
 
     # Fetch linked local plans/document/timetable
     local_plans, local_plan_boundary_geojson = fetch_linked_local_plans(
@@ -308,41 +358,116 @@ def fetch_linked_local_plans(session: Session, e_dict_sorted: Dict = None):
     reference = e_dict_sorted["reference"]
     if dataset in linked_datasets:
         linked_dataset_value = linked_datasets[dataset]
-        for linked_dataset in linked_dataset_value:
-            if dataset == "local-plan" and linked_dataset == "local-plan-boundary":
-                if linked_dataset in e_dict_sorted:
-                    local_plan_boundary_geojson = fetchEntityFromReference(
-                        session, linked_dataset, e_dict_sorted[linked_dataset]
-                    )
-            linked_entities = get_linked_entities(
-                session, linked_dataset, reference, linked_dataset=dataset
+        if dataset == "local-plan" and "local-plan-boundary" in linked_dataset_value:
+            if "local-plan-boundary" in e_dict_sorted:
+                local_plan_boundary_geojson = fetchEntityFromReference(
+                    session, "local-plan-boundary", e_dict_sorted["local-plan-boundary"]
+                )
+        results = get_linked_entities_by_dataset(
+            session, linked_dataset_value, reference, linked_dataset=dataset
+        )
+
+        # Handle special case for "local-plan-timetable", its events are
+        # fetched together however long the timetable is
+        if dataset == "local-plan" and "local-plan-timetable" in results:
+            timetable = results["local-plan-timetable"]
+            event_references = {
+                entity.local_plan_event
+                for entity in timetable
+                if _is_recorded_event(entity)
+            }
+            events = fetch_entities_by_reference(
+                session, "local-plan-event", event_references
             )
-            results[linked_dataset] = linked_entities
-
-            # Handle special case for "local-plan-timetable"
-            if dataset == "local-plan" and linked_dataset == "local-plan-timetable":
-                for entity in linked_entities:
-                    if (
-                        hasattr(entity, "local_plan_event")
-                        and entity.local_plan_event
-                        and not entity.local_plan_event.startswith("estimated")
-                    ):
-                        entity.local_plan_event = fetchEntityFromReference(
-                            session, "local-plan-event", entity.local_plan_event
-                        )
-                    else:
-                        entity.local_plan_event = None
+            for entity in timetable:
+                if _is_recorded_event(entity):
+                    entity.local_plan_event = events.get(entity.local_plan_event)
+                else:
+                    entity.local_plan_event = None
 
     return results, local_plan_boundary_geojson
 
 
+def _is_recorded_event(entity) -> bool:
+    return (
+        hasattr(entity, "local_plan_event")
+        and bool(entity.local_plan_event)
+        and not entity.local_plan_event.startswith("estimated")
+    )
+
+
+SimplifyQuery = Annotated[
+    Optional[float],
+    Query(gt=0, description="Simplify the geometry to this tolerance, in degrees"),
+]
+PrecisionQuery = Annotated[
+    Optional[int],
+    Query(
+        ge=1,
+        le=15,
+        description="Number of decimal places to give geometry coordinates to",
+    ),
+]
+
+
 def get_entity(
     request: Request,
     entity: int = Path(description="Entity id"),
     extension: Optional[SuffixEntity] = None,
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_entity_session),
+    simplify: SimplifyQuery = None,
+    precision: PrecisionQuery = None,
+):
+    if extension is None and precision is None:
+        # the page map doesn't need more than it can draw
+        precision = ENTITY_MAP_PRECISION
+    found = get_entity_query(entity, {"simplify": simplify, "precision": precision})
+    return _entity_lookup_response(request, entity, extension, found, session)
+
+
+async def get_entity_data(
+    request: Request,
+    entity: int = Path(description="Entity id"),
+    extension: SuffixEntity = Path(description="Format of the entity data"),
+    session: AsyncSession = Depends(get_async_session),
+    simplify: SimplifyQuery = None,
+    precision: PrecisionQuery = None,
+):
+    """
+    The json or geojson of an entity, read on the async engine so a worker
+    can serve many of these lookups at once. The entity page still renders
+    with get_entity, as its related lookups take a sync Session, including
+    when it's asked for as .html, see get_entity_html.
+    """
+    found = await get_entity_query_async(
+        session, entity, {"simplify": simplify, "precision": precision}
+    )
+    # data responses are made from the entity alone, without the page lookups
+    return _entity_lookup_response(request, entity, extension, found, None)
+
+
+def get_entity_html(
+    request: Request,
+    entity: int = Path(description="Entity id"),
+    session: Session = Depends(get_entity_session),
+    simplify: SimplifyQuery = None,
+    precision: PrecisionQuery = None,
 ):
-    e, old_entity_status, new_entity_id = get_entity_query(entity)
+    """
+    The entity page asked for with a .html extension, which renders with
+    the page's sync lookups rather than through get_entity_data.
+    """
+    return get_entity(request, entity, SuffixEntity.html, session, simplify, precision)
+
+
+def _entity_lookup_response(
+    request: Request,
+    entity: int,
+    extension: Optional[SuffixEntity],
+    found: Tuple[Optional[EntityModel], Optional[int], Optional[int]],
+    session: Optional[Session],
+):
+    e, old_entity_status, new_entity_id = found
 
     if old_entity_status == 410:
         sentry_sdk.metrics.count(
@@ -397,12 +522,91 @@ def validate_typologies(typologies, typology_names):
     return
 
 
+def _log_entity_search_error(
+    e: SQLAlchemyError, query_params: Dict, extension: Optional[SuffixEntity]
+):
+    extension_tag = extension.value if extension is not None else "html"
+    dataset_filters = query_params.get("dataset") or []
+    dataset_tag = ",".join(dataset_filters) if dataset_filters else "all"
+    error_tag = (
+        "ssl_syscall_eof" if "SSL SYSCALL error: EOF detected" in str(e) else "db_error"
+    )
+    sentry_sdk.metrics.count(
+        "entity.search.error",
+        1,
+        attributes={
+            "error": error_tag,
+            "extension": extension_tag,
+            "dataset": dataset_tag,
+        },
+    )
+
+    logger.exception(
+        "Error in get_entity_search",
+        extra={
+            "extension": extension_tag,
+            "dataset_filters": dataset_filters,
+        },
+    )
+
+
+def _stream_entity_search_documents(
+    request: Request,
+    session: Session,
+    query_params: Dict,
+    extension: SuffixEntity,
+    cache: Optional[redis.Redis] = None,
+):
+    """
+    Streams a page of search results as JSON or a GeoJSON FeatureCollection.
+    Each entity is rendered by the database and written as it's read, the
+    pagination links and count follow once the page is finished.
+    """
+    if extension.value == "geojson":
+        include, exclude = None, _get_exclude_fields(normalised_params(query_params))
+    else:
+        include, exclude = _get_entity_json_fields(normalised_params(query_params))
+    # the query runs here, so a failed search gets an error response rather
+    # than a 200 with the body cut short
+    try:
+        summary, documents = stream_entity_search_documents(
+            session,
+            query_params,
+            SuffixEntity(extension.value),
+            include,
+            exclude,
+            cache=cache,
+        )
+    except SQLAlchemyError as e:
+        _log_entity_search_error(e, query_params, extension)
+        raise
+
+    def entities():
+        try:
+            yield from documents
+        except SQLAlchemyError as e:
+            _log_entity_search_error(e, query_params, extension)
+            raise
+
+    def links():
+        url = request.url
+        return make_links(url.scheme, url.netloc, url.path, url.query, summary)
+
+    if extension.value == "geojson":
+        content = stream_feature_collection(entities(), links)
+    else:
+        content = stream_entity_list(
+            entities(), lambda: {"links": links(), "count": summary["count"]}
+        )
+    return StreamingResponse(content, media_type=DigitalLandJSONResponse.media_type)
+
+
 def search_entities(
     request: Request,
     search_query: str = Query("", alias="q"),
     query_filters: QueryFilters = Depends(),
     extension: Optional[SuffixEntity] = None,
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_search_session),
     redis: redis.Redis = Depends(get_redis),
 ):
     # Determine if the URL path includes an extension
@@ -444,35 +648,16 @@ def search_entities(
     validate_typologies(query_params.get("typology", None), typology_names)
     validate_dataset(query_params.get("dataset", None), dataset_names)
 
+    if extension is not None and extension.value in ["json", "geojson"]:
+        return _stream_entity_search_documents(
+            request, session, query_params, extension, redis
+        )
+
     # Run entity query
     try:
-        data = get_entity_search(session, query_params, extension)
+        data = get_entity_search(session, query_params, extension, redis)
     except SQLAlchemyError as e:
-        extension_tag = extension.value if extension is not None else "html"
-        dataset_filters = query_params.get("dataset") or []
-        dataset_tag = ",".join(dataset_filters) if dataset_filters else "all"
-        error_tag = (
-            "ssl_syscall_eof"
-            if "SSL SYSCALL error: EOF detected" in str(e)
-            else "db_error"
-        )
-        sentry_sdk.metrics.count(
-            "entity.search.error",
-            1,
-            attributes={
-                "error": error_tag,
-                "extension": extension_tag,
-                "dataset": dataset_tag,
-            },
-        )
-
-        logger.exception(
-            "Error in get_entity_search",
-            extra={
-                "extension": extension_tag,
-                "dataset_filters": dataset_filters,
-            },
-        )
+        _log_entity_search_error(e, query_params, extension)
         raise
 
     # the query does some normalisation to remove empty
@@ -484,36 +669,6 @@ def search_entities(
     query = request.url.query
     links = make_links(scheme, netloc, path, query, data)
 
-    if extension is not None and extension.value == "json":
-        if params.get("field") is not None:
-            include = set([to_snake(field) for field in params.get("field")])
-            entities = _get_entity_json(data["entities"], include=include)
-        elif params.get("exclude_field") is not None:
-            exclude_fields = set(
-                [
-                    to_snake(field.strip())
-                    for field in ",".join(params.get("exclude_field")).split(",")
-                ]
-            )
-            entities = _get_entity_json(data["entities"], exclude=exclude_fields)
-        else:
-            entities = _get_entity_json(data["entities"])
-        return {"entities": entities, "links": links, "count": data["count"]}
-
-    if extension is not None and extension.value == "geojson":
-        if params.get("exclude_field") is not None:
-            exclude_fields = set(
-                [
-                    to_snake(field.strip())
-                    for field in ",".join(params.get("exclude_field")).split(",")
-                ]
-            )
-            geojson = _get_geojson(data["entities"], exclude=exclude_fields)
-        else:
-            geojson = _get_geojson(data["entities"])
-        geojson["links"] = links
-        return geojson
-
     db_session = DbSession(session=session, redis=redis)
     typologies = get_typologies_with_entities(db_session)
     typologies = [t.model_dump() for t in typologies]
@@ -581,7 +736,125 @@ def search_entities(
     )
 
 
+def export_entities(
+    query_filters: QueryFilters = Depends(),
+    session: Session = Depends(get_search_session),
+):
+    """
+    Streams every entity matching the search as newline delimited JSON, one
+    entity per line. Unlike the paged search there is no limit, so a whole
+    dataset can be downloaded in one request.
+    """
+    query_params = asdict(query_filters)
+    validate_typologies(query_params.get("typology", None), get_typology_names(session))
+    validate_dataset(query_params.get("dataset", None), get_dataset_names(session))
+
+    include, exclude = _get_entity_json_fields(normalised_params(query_params))
+
+    def entity_lines():
+        for entity in stream_entity_search(session, query_params):
+            e = _get_entity_json([entity], include=include, exclude=exclude)[0]
+            yield digital_land_json_dumps(e) + "\n"
+
+    return StreamingResponse(entity_lines(), media_type="application/x-ndjson")
+
+
+def point_lookup(
+    lookup: PointLookupRequest,
+    session: Session = Depends(get_session),
+):
+    """
+    Finds the entities at each of many points in one query, so address
+    matching doesn't need a search request per point. Results are in the
+    same order as the points.
+    """
+    validate_dataset(lookup.dataset, get_dataset_names(session))
+    params = normalised_params(
+        {"field": lookup.field, "exclude_field": lookup.exclude_field}
+    )
+    include, exclude = _get_entity_json_fields(params)
+
+    points = [(point.longitude, point.latitude) for point in lookup.points]
+    try:
+        matches = get_point_lookup(session, points, lookup.dataset)
+    except SQLAlchemyError as e:
+        _log_entity_search_error(e, {"dataset": lookup.dataset}, SuffixEntity.json)
+        raise
+
+    return {
+        "results": [
+            {
+                "longitude": longitude,
+                "latitude": latitude,
+                "entities": _get_entity_json(
+                    entities,
+                    include=set(include) if include is not None else None,
+                    exclude=exclude,
+                ),
+            }
+            for (longitude, latitude), entities in zip(points, matches)
+        ]
+    }
+
+
+def get_entities_batch(
+    batch: EntityBatchRequest,
+    session: Session = Depends(get_session),
+):
+    """
+    Streams the JSON of many entities in the order they were asked for, in
+    place of a request for each entity. Moved entities are replaced by the
+    entity they moved to, and the ids that moved, are gone or weren't found
+    are listed after the entities.
+    """
+    params = normalised_params(
+        {"field": batch.field, "exclude_field": batch.exclude_field}
+    )
+    include, exclude = _get_entity_json_fields(params)
+    summary, documents = stream_entities_by_id(session, batch.entity, include, exclude)
+
+    def entities():
+        try:
+            yield from documents
+        except SQLAlchemyError as e:
+            _log_entity_search_error(e, {}, SuffixEntity.json)
+            raise
+
+    content = stream_entity_list(
+        entities(),
+        lambda: {
+            "moved": summary["moved"],
+            "gone": summary["gone"],
+            "not-found": summary["not_found"],
+        },
+    )
+    return StreamingResponse(content, media_type=DigitalLandJSONResponse.media_type)
+
+
 # Route ordering in important. Match routes with extensions first
+router.add_api_route(
+    ".ndjson",
+    endpoint=export_entities,
+    response_class=StreamingResponse,
+    tags=["Search entity"],
+    summary="This endpoint streams every entity matching the specified parameters as newline delimited JSON.",
+)
+router.add_api_route(
+    "/point-lookup",
+    endpoint=point_lookup,
+    methods=["POST"],
+    response_class=DigitalLandJSONResponse,
+    tags=["Search entity"],
+    summary="This endpoint finds the entities at each of a list of points in a single request.",
+)
+router.add_api_route(
+    "/batch",
+    endpoint=get_entities_batch,
+    methods=["POST"],
+    response_class=StreamingResponse,
+    tags=["Get entity"],
+    summary="This endpoint returns many entities, in the order their entity numbers are given.",
+)
 router.add_api_route(
     ".{extension}",
     endpoint=search_entities,
@@ -606,9 +879,16 @@ router.add_api_route(
     include_in_schema=False,
 )
 
+router.add_api_route(
+    "/{entity}.html",
+    endpoint=get_entity_html,
+    response_class=HTMLResponse,
+    include_in_schema=False,
+)
 router.add_api_route(
     "/{entity}.{extension}",
-    get_entity,
+    get_entity_data,
+    name="get_entity",
     response_class=DigitalLandJSONResponse,
     tags=["Get entity"],
     summary="This endpoint returns data on one specific entity matching the specified ID in the format requested.",
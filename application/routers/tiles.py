@@ -0,0 +1,84 @@
+import logging
+
+import redis
+from fastapi import APIRouter, Depends, HTTPException, Path
+from starlette.responses import Response
+from sqlalchemy.orm import Session
+
+from application.data_access.tile_queries import (
+    get_dataset_data_versions,
+    get_entity_tile,
+    get_tile_dataset_names,
+)
+from application.db.session import get_redis_binary, get_session
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+# tiles are keyed by the data version so only expire to free up space
+TILE_CACHE_TTL_SECONDS = 60 * 60 * 24 * 7
+
+
+def get_cached_tile(cache: redis.Redis, key: str, build_tile) -> bytes:
+    if cache is None:
+        return build_tile()
+
+    try:
+        tile = cache.get(key)
+        if tile is not None:
+            return tile
+    except redis.exceptions.ConnectionError as redis_ex:
+        logger.warning(f"get_cached_tile(): redis connection error: {redis_ex}")
+
+    tile = build_tile()
+    try:
+        cache.setex(key, time=TILE_CACHE_TTL_SECONDS, value=tile)
+    except redis.exceptions.ConnectionError as redis_ex:
+        logger.warning(
+            f"get_cached_tile(): redis connection error, key='{key}': {redis_ex}"
+        )
+    return tile
+
+
+def get_tile(
+    dataset: str,
+    z: int = Path(ge=0, le=22, description="Zoom level"),
+    x: int = Path(ge=0, description="Tile column"),
+    y: int = Path(ge=0, description="Tile row"),
+    session: Session = Depends(get_session),
+    cache: redis.Redis = Depends(get_redis_binary),
+):
+    """
+    Returns a Mapbox Vector Tile of a dataset's entities, built by PostGIS and
+    cached for each version of the dataset's data. Tiles of a dataset that
+    hasn't been collected aren't cached.
+    """
+    if x >= 2**z or y >= 2**z:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    if dataset not in get_tile_dataset_names(session):
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    version = get_dataset_data_versions(session).get(dataset)
+    if version is None:
+        # a tile cached without a version wouldn't be replaced once data loads
+        tile = get_entity_tile(session, dataset, z, x, y)
+    else:
+        tile = get_cached_tile(
+            cache,
+            f"tile:{dataset}:{version}:{z}/{x}/{y}",
+            lambda: get_entity_tile(session, dataset, z, x, y),
+        )
+    return Response(
+        content=tile,
+        media_type=MVT_MEDIA_TYPE,
+        headers={"Cache-Control": "public, max-age=3600"},
+    )
+
+
+router.add_api_route(
+    "/{dataset}/{z}/{x}/{y}.mvt",
+    endpoint=get_tile,
+    response_class=Response,
+    summary="This endpoint returns a vector tile of the entities in a dataset.",
+)
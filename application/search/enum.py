@@ -54,6 +54,12 @@ class PeriodOption(str, Enum):
     historical = "historical"
 
 
+class CountOption(str, Enum):
+    exact = "exact"  # our default
+    estimated = "estimated"
+    none = "none"
+
+
 class DateOption(str, Enum):
     match = "match"
     before = "before"
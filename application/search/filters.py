@@ -2,13 +2,14 @@ import datetime
 
 from typing import Annotated, Optional, List
 from fastapi import Query, Header
-from pydantic import field_validator
+from pydantic import BaseModel, Field, field_validator
 from pydantic.dataclasses import dataclass
 
 from application.exceptions import (
     InvalidGeometry,
 )
 from application.search.enum import (
+    CountOption,
     PeriodOption,
     DateOption,
     GeometryRelation,
@@ -20,6 +21,7 @@ from application.search.validators import (
     validate_month_integer,
     validate_year_integer,
     validate_curies,
+    validate_bbox,
 )
 from shapely import wkt
 from shapely.geometry.base import BaseGeometry
@@ -227,6 +229,20 @@ class QueryFilters:
         Optional[GeometryRelation],
         Query(description="DE-9IM spatial relationship, default is 'within'"),
     ] = None
+    bbox: Annotated[
+        Optional[str],
+        Query(description="""
+        Search for entities with geometries or points whose bounding box overlaps the box
+        given as minx,miny,maxx,maxy in WGS84 longitude and latitude.
+        """),
+    ] = None
+    bbox_exact: Annotated[
+        Optional[bool],
+        Query(description="""
+        Only return entities whose geometry or point actually intersects the bbox,
+        rather than only its bounding box.
+        """),
+    ] = None
     q: Annotated[
         Optional[str],
         Query(description="""
@@ -242,6 +258,24 @@ class QueryFilters:
     offset: Annotated[
         Optional[int], Query(description="paginate results from this entity")
     ] = None
+    after_entity: Annotated[
+        Optional[int],
+        Query(
+            description="""
+        Return results with an entity number greater than this one. Use the next link
+        to page through large result sets, offset is ignored when this is provided.
+        """,
+            ge=0,
+        ),
+    ] = None
+
+    count_mode: Annotated[
+        Optional[CountOption],
+        Query(description="""
+        How the total count is worked out, either exact (the default), estimated
+        from the query plan, or none to skip counting altogether
+        """),
+    ] = None
 
     # response format filters
     accept: Annotated[
@@ -264,6 +298,24 @@ class QueryFilters:
             description="field parameter will take over any fields specified in the exclude_field parameter"
         ),
     ] = None
+    simplify: Annotated[
+        Optional[float],
+        Query(
+            description="""
+        Simplify geometries in the response to this tolerance, in degrees,
+        keeping their topology. Useful for drawing entities on a map.
+        """,
+            gt=0,
+        ),
+    ] = None
+    precision: Annotated[
+        Optional[int],
+        Query(
+            description="Number of decimal places to give geometry coordinates to",
+            ge=1,
+            le=15,
+        ),
+    ] = None
 
     quality: Annotated[
         Optional[List[str]],
@@ -291,6 +343,11 @@ class QueryFilters:
     def _validate_curies(cls, v):
         return validate_curies(v)
 
+    @field_validator("bbox")
+    @classmethod
+    def _validate_bbox(cls, v):
+        return validate_bbox(v)
+
     @field_validator("geometry", mode="before")
     @classmethod
     def validate_geometry(cls, geometry_values_list: Optional[list]):
@@ -313,6 +370,52 @@ class QueryFilters:
         return geometry_values_list
 
 
+# keeps a single point lookup statement to a sensible size
+POINT_LOOKUP_MAX_POINTS = 1000
+
+
+class PointLookupPoint(BaseModel):
+    longitude: float = Field(ge=-180, le=180)
+    latitude: float = Field(ge=-90, le=90)
+
+
+class PointLookupRequest(BaseModel):
+    points: List[PointLookupPoint] = Field(
+        min_length=1,
+        max_length=POINT_LOOKUP_MAX_POINTS,
+        description="Points to find the entities at, in WGS84 longitude and latitude",
+    )
+    dataset: Optional[List[str]] = Field(
+        None, description="Only find entities in these datasets"
+    )
+    field: Optional[List[str]] = Field(
+        None, description="fields to be included in response"
+    )
+    exclude_field: Optional[List[str]] = Field(
+        None,
+        description="field parameter will take over any fields specified in the exclude_field parameter",
+    )
+
+
+# far more than a search page, but a bound on a single request
+ENTITY_BATCH_MAX_ENTITIES = 10000
+
+
+class EntityBatchRequest(BaseModel):
+    entity: List[Annotated[int, Field(ge=1)]] = Field(
+        min_length=1,
+        max_length=ENTITY_BATCH_MAX_ENTITIES,
+        description="Entity numbers to fetch, entities are returned in this order",
+    )
+    field: Optional[List[str]] = Field(
+        None, description="fields to be included in response"
+    )
+    exclude_field: Optional[List[str]] = Field(
+        None,
+        description="field parameter will take over any fields specified in the exclude_field parameter",
+    )
+
+
 @dataclass
 class TaskQueryFilters:
     dataset: Annotated[
@@ -1,3 +1,4 @@
+import math
 import re
 from typing import Optional, List
 
@@ -65,6 +66,22 @@ def validate_curies(curies: Optional[List[str]]):
     return curies
 
 
+def validate_bbox(bbox: Optional[str]):
+    if not bbox:
+        return bbox
+    try:
+        minx, miny, maxx, maxy = [float(value) for value in bbox.split(",")]
+    except ValueError:
+        raise DigitalLandValidationError("bbox must be in form 'minx,miny,maxx,maxy'")
+    if not all(math.isfinite(value) for value in (minx, miny, maxx, maxy)):
+        raise DigitalLandValidationError("bbox coordinates must be finite numbers")
+    if minx > maxx or miny > maxy:
+        raise DigitalLandValidationError(
+            "bbox minimum coordinates must not be greater than the maximum coordinates"
+        )
+    return bbox
+
+
 def validate_dataset(dataset: Optional[List[str]], datasets: list):
     """
     Given a dataset and a set of datasets will check if dataset is a valid one
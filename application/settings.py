@@ -1,6 +1,6 @@
 import os
 from functools import lru_cache
-from typing import Optional
+from typing import Dict, List, Optional
 
 from dotenv import load_dotenv
 from pydantic import model_validator
@@ -14,6 +14,12 @@ load_dotenv()
 class Settings(BaseSettings):
     WRITE_DATABASE_URL: str
     READ_DATABASE_URL: str
+    # further read databases, READ_DATABASE_WEIGHTS and READ_DATABASE_ROUTES
+    # list READ_DATABASE_URL first then these in order
+    READ_REPLICA_URLS: List[str] = []
+    READ_DATABASE_WEIGHTS: List[int] = []
+    READ_DATABASE_ROUTES: Dict[str, int] = {}
+    READ_REPLICA_RETRY_SECONDS: int = 30
     SENTRY_DSN: Optional[str] = None
     SENTRY_TRACE_SAMPLE_RATE: Optional[float] = 0.01
     RELEASE_TAG: Optional[str] = None
@@ -28,6 +34,23 @@ class Settings(BaseSettings):
     OS_CLIENT_SECRET: Optional[str] = None
     DB_POOL_SIZE: Optional[int] = 5
     DB_POOL_MAX_OVERFLOW: Optional[int] = 10
+    # compiled statements kept by each engine, one for each search shape
+    DB_QUERY_CACHE_SIZE: int = 1200
+    # statements asyncpg prepares on the server for each connection
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 500
+    SEARCH_STATEMENT_TIMEOUT_MS: int = 30000
+    ENTITY_STATEMENT_TIMEOUT_MS: int = 10000
+    DATASET_LIST_STATEMENT_TIMEOUT_MS: int = 10000
+    # share of slow calls whose slowest query is explained, at most one every
+    # SLOW_QUERY_INTERVAL_SECONDS, the latest SLOW_QUERY_RECORDS are kept
+    SLOW_QUERY_SAMPLE_RATE: float = 0.0
+    SLOW_QUERY_INTERVAL_SECONDS: int = 60
+    SLOW_QUERY_RECORDS: int = 50
+    # a request running one statement more often than this is logged, as
+    # it's probably running a query per item of a list
+    REPEATED_STATEMENT_THRESHOLD: int = 5
+    # the bearer token for /admin routes, which are hidden without one
+    ADMIN_TOKEN: Optional[str] = None
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_SECURE: bool = True
@@ -42,6 +65,23 @@ class Settings(BaseSettings):
             values["REDIS_PORT"] = int(p)
         return values
 
+    @model_validator(mode="after")
+    def check_read_databases(self):
+        read_databases = 1 + len(self.READ_REPLICA_URLS)
+        if self.READ_DATABASE_WEIGHTS:
+            if len(self.READ_DATABASE_WEIGHTS) != read_databases:
+                raise ValueError(
+                    f"READ_DATABASE_WEIGHTS needs a weight for each of the {read_databases} read databases"
+                )
+            if min(self.READ_DATABASE_WEIGHTS) < 1:
+                raise ValueError("READ_DATABASE_WEIGHTS must be positive")
+        for query_type, index in self.READ_DATABASE_ROUTES.items():
+            if not 0 <= index < read_databases:
+                raise ValueError(
+                    f"READ_DATABASE_ROUTES {query_type} is not one of the {read_databases} read databases"
+                )
+        return self
+
 
 @lru_cache()
 def get_settings() -> Settings:
@@ -0,0 +1,66 @@
+"""add geometry valid columns
+
+Revision ID: 5c1e7d2a9b34
+Revises: befd8e0ddca9
+Create Date: 2026-10-18 10:12:41.208337
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "5c1e7d2a9b34"
+down_revision = "befd8e0ddca9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # stored generated columns are filled in for existing rows here and kept
+    # up to date by postgres for any geometry loaded afterwards
+    op.add_column(
+        "entity",
+        sa.Column(
+            "geometry_valid",
+            sa.Boolean(),
+            sa.Computed("ST_IsValid(geometry)", persisted=True),
+            nullable=True,
+        ),
+    )
+    op.add_column(
+        "entity_subdivided",
+        sa.Column(
+            "geometry_valid",
+            sa.Boolean(),
+            sa.Computed("ST_IsValid(geometry_subdivided)", persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "idx_entity_geometry_valid",
+        "entity",
+        ["geometry"],
+        postgresql_using="gist",
+        postgresql_where=sa.text("geometry_valid"),
+    )
+    op.create_index(
+        "idx_entity_subdivided_geometry_valid",
+        "entity_subdivided",
+        ["geometry_subdivided"],
+        postgresql_using="gist",
+        postgresql_where=sa.text("geometry_valid"),
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "idx_entity_subdivided_geometry_valid",
+        table_name="entity_subdivided",
+        postgresql_using="gist",
+    )
+    op.drop_index(
+        "idx_entity_geometry_valid", table_name="entity", postgresql_using="gist"
+    )
+    op.drop_column("entity_subdivided", "geometry_valid")
+    op.drop_column("entity", "geometry_valid")
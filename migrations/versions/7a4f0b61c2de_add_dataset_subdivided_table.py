@@ -0,0 +1,32 @@
+"""add dataset subdivided table
+
+Revision ID: 7a4f0b61c2de
+Revises: 5c1e7d2a9b34
+Create Date: 2026-10-18 11:40:05.913276
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "7a4f0b61c2de"
+down_revision = "5c1e7d2a9b34"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dataset_subdivided = op.create_table(
+        "dataset_subdivided",
+        sa.Column("dataset", sa.Text(), nullable=False),
+        sa.Column("max_vertices", sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint("dataset"),
+    )
+    # flood-risk-zone was subdivided before this table existed, keep searching
+    # it in entity_subdivided until the next rebuild
+    op.bulk_insert(dataset_subdivided, [{"dataset": "flood-risk-zone"}])
+
+
+def downgrade():
+    op.drop_table("dataset_subdivided")
@@ -155,6 +155,25 @@ def test_entity_search_json_contract(client, db_session):
     jsonschema.validate(response.json(), ENTITY_SEARCH_JSON_SCHEMA)
 
 
+def test_entity_search_json_matches_entity_json(client, db_session):
+    """
+    Search results are rendered by the database rather than the entity
+    model, check they're the same as the entity page apart from the WKT
+    formatting of the geometries
+    """
+    for entity in mock_entities:
+        db_session.add(EntityOrm(**entity))
+    db_session.commit()
+
+    response = client.get("/entity.json")
+    assert response.status_code == 200
+    for entity in response.json()["entities"]:
+        expected = client.get(f"/entity/{entity['entity']}.json").json()
+        assert entity.keys() == expected.keys()
+        for field in expected.keys() - {"geometry", "point"}:
+            assert entity[field] == expected[field], field
+
+
 def test_entity_geojson_contract(client, db_session):
     for entity in mock_entities:
         db_session.add(EntityOrm(**entity))
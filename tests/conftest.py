@@ -9,9 +9,9 @@ from fastapi import FastAPI
 from fastapi.testclient import TestClient
 from alembic.config import Config
 from pydantic import PostgresDsn
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import Session, sessionmaker
-from sqlalchemy.engine import make_url
+from sqlalchemy.engine import Engine, make_url
 from testcontainers.postgres import PostgresContainer
 from multiprocessing.context import Process
 import uvicorn
@@ -32,7 +32,13 @@ from application.db.models import (
     AttributionOrm,
     LicenceOrm,
 )
-from application.db.session import get_session, get_redis, SESSION_CACHE
+from application.db.session import (
+    get_async_session,
+    get_session,
+    get_redis,
+    SESSION_CACHE,
+)
+from application.db.statement_counts import StatementCounter
 from application.settings import Settings, get_settings
 from tests.utils.database import (
     add_base_datasets_to_database,
@@ -249,6 +255,22 @@ def app(create_db) -> FastAPI:
     return app
 
 
+class AsyncSessionAdapter:
+    """
+    Gives async routes the test db_session, so they see the data set up in
+    its transaction, through the parts of AsyncSession the routes use.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    async def execute(self, *args, **kwargs):
+        return self.session.execute(*args, **kwargs)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return fn(self.session, *args, **kwargs)
+
+
 @pytest.fixture(scope="function")
 def client(app: FastAPI, db_session: Session) -> TestClient:
     """
@@ -263,6 +285,9 @@ def client(app: FastAPI, db_session: Session) -> TestClient:
         yield db_session
 
     app.dependency_overrides[get_session] = lambda: db_session
+    app.dependency_overrides[get_async_session] = lambda: AsyncSessionAdapter(
+        db_session
+    )
 
     # Disable Redis caching when running integration tests
     # see line 372 in this file for more info
@@ -276,6 +301,40 @@ def client(app: FastAPI, db_session: Session) -> TestClient:
         yield TestClient(app)
 
 
+@pytest.fixture(scope="function")
+def query_budget():
+    """
+    Fails the test if more than max_statements statements are run inside
+    the block, listing the statements run. For catching changes that add
+    queries to a route:
+
+        with query_budget(5):
+            client.get("/entity/1")
+
+    Statements are counted on every engine, as a route may run some on
+    the test session and some on a session of its own.
+    """
+
+    @contextmanager
+    def budget(max_statements: int):
+        counter = StatementCounter()
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            counter.add(statement)
+
+        event.listen(Engine, "before_cursor_execute", count)
+        try:
+            yield counter
+        finally:
+            event.remove(Engine, "before_cursor_execute", count)
+        assert counter.total <= max_statements, (
+            f"ran {counter.total} statements, over the budget of "
+            f"{max_statements}:\n{counter.summary()}"
+        )
+
+    return budget
+
+
 # TODO Can we remove this?
 # This is a hack to fix a bug in starlette https://github.com/encode/starlette/issues/472
 @pytest.fixture
@@ -447,9 +506,17 @@ def run_server():
     # Called in a subprocess by server_url fixture, after acceptance_db has set
     # env vars. Create the app here (not at module level) so get_settings() is
     # only called once the required env vars are available.
-    from application.db.session import _get_session_local
+    from application.db.session import (
+        _get_async_read_replicas,
+        _get_async_session_local,
+        _get_read_replicas,
+        _get_session_local,
+    )
 
+    _get_read_replicas.cache_clear()
     _get_session_local.cache_clear()
+    _get_async_read_replicas.cache_clear()
+    _get_async_session_local.cache_clear()
     app = create_app()
     app.dependency_overrides[get_session] = get_context_session_override
     # Disable Redis caching when running acceptance tests. get_all_datasets()
@@ -1,8 +1,15 @@
+import json
 import logging
 import pytest
 
+from application.core.utils import digital_land_json_dumps
 from application.db.models import EntityOrm
-from application.data_access.entity_queries import get_entity_search
+from application.data_access.entity_queries import (
+    get_entity_search,
+    stream_entities_by_id,
+    stream_entity_search_documents,
+)
+from application.search.enum import SuffixEntity
 from sqlalchemy import text
 from sqlalchemy.orm import Query
 from application.data_access.entity_queries import _apply_location_filters
@@ -233,3 +240,114 @@ def test_get_entity_search_with_point_filter(db_session):
     print(result)
     assert result["count"] == 1
     assert all(e.dataset == "flood-risk-zone" for e in result["entities"])
+
+
+class DictCache:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def setex(self, key, time, value):
+        self.values[key] = value
+
+
+def test_get_entity_search_with_point_filter_uses_cell_cache(db_session):
+    # a large area that covers the point's whole cell and a small one whose
+    # boundary crosses it, so only the second needs checking exactly
+    db_session.add(
+        EntityOrm(
+            entity=1,
+            dataset="conservation-area",
+            geometry="MULTIPOLYGON(((-0.5 52.2, -0.5 52.5, -0.1 52.5, -0.1 52.2, -0.5 52.2)))",
+        )
+    )
+    db_session.add(
+        EntityOrm(
+            entity=2,
+            dataset="conservation-area",
+            geometry="MULTIPOLYGON(((-0.3001 52.3499, -0.3001 52.3502, -0.2999 52.3502, -0.2999 52.3499, -0.3001 52.3499)))",  # noqa E501
+        )
+    )
+    db_session.commit()
+    cache = DictCache()
+    params = {"longitude": -0.30005, "latitude": 52.35005}
+
+    result = get_entity_search(db_session, params, cache=cache)
+    assert sorted(e.entity for e in result["entities"]) == [1, 2]
+
+    (candidates,) = cache.values.values()
+    assert candidates == '{"covered": [1], "straddling": [2]}'
+
+    # a point elsewhere in the cell but outside the small area
+    result = get_entity_search(
+        db_session, {"longitude": -0.30015, "latitude": 52.35005}, cache=cache
+    )
+    assert [e.entity for e in result["entities"]] == [1]
+
+
+def _add_entity_with_json_fields(db_session):
+    db_session.add(
+        EntityOrm(
+            entity=1,
+            dataset="conservation-area",
+            reference="CA1",
+            name="From the column",
+            entry_date="2020-01-01",
+            geometry="MULTIPOLYGON(((0.1 50.98673712345678, 0.3 51, -0.12345678901234567 51.1, 0.1 50.98673712345678)))",  # noqa E501
+            point="POINT(0.1 50.98673712345678)",
+            json={
+                "name": "From the json",
+                "site_category": "garden",
+                "notes": [{"text": None}, None],
+                "documentation-url": None,
+            },
+        )
+    )
+    db_session.commit()
+
+
+def _model_json(entity, exclude):
+    return json.loads(
+        digital_land_json_dumps(entity.model_dump(exclude=exclude, by_alias=True))
+    )
+
+
+def test_stream_entity_search_documents_match_the_models(db_session):
+    _add_entity_with_json_fields(db_session)
+    params = {"dataset": ["conservation-area"]}
+    (entity,) = get_entity_search(db_session, params)["entities"]
+
+    _, documents = stream_entity_search_documents(db_session, params, SuffixEntity.json)
+
+    assert [json.loads(document) for document in documents] == [
+        _model_json(entity, {"geojson"})
+    ]
+
+
+def test_stream_entity_search_geojson_documents_match_the_models(db_session):
+    _add_entity_with_json_fields(db_session)
+    params = {"dataset": ["conservation-area"]}
+    (entity,) = get_entity_search(db_session, params)["entities"]
+
+    _, documents = stream_entity_search_documents(
+        db_session, params, SuffixEntity.geojson
+    )
+
+    (feature,) = [json.loads(document) for document in documents]
+    assert feature["geometry"] == entity.geojson["geometry"]
+    assert feature["properties"] == _model_json(
+        entity, {"geojson", "geometry", "point"}
+    )
+
+
+def test_stream_entities_by_id_match_the_models(db_session):
+    _add_entity_with_json_fields(db_session)
+    (entity,) = get_entity_search(db_session, {})["entities"]
+
+    _, documents = stream_entities_by_id(db_session, [1], exclude={"name"})
+
+    assert [json.loads(document) for document in documents] == [
+        _model_json(entity, {"geojson", "name"})
+    ]
@@ -0,0 +1,32 @@
+from application.data_access.dataset_queries import get_subdivided_datasets
+from application.data_access.entity_queries import get_entity_search
+from application.data_access.subdivision_queries import rebuild_entity_subdivided
+from application.db.models import EntityOrm, EntitySubdividedOrm
+from application.db.session import SESSION_CACHE
+
+square = "MULTIPOLYGON(((-1 51,-1 52,0 52,0 51,-1 51)))"
+outline = "MULTIPOLYGON(((-1 51,-1 52,-0.5 52.1,0 52,0 51,-0.5 50.9,-1 51)))"
+
+
+def test_rebuild_entity_subdivided_routes_large_datasets(db_session):
+    db_session.add(EntityOrm(entity=1, dataset="green-belt", geometry=outline))
+    db_session.add(EntityOrm(entity=2, dataset="green-belt", geometry=square))
+    db_session.add(EntityOrm(entity=3, dataset="conservation-area", geometry=square))
+    db_session.commit()
+
+    datasets = rebuild_entity_subdivided(db_session, vertex_threshold=6)
+    SESSION_CACHE.clear()
+
+    assert datasets == ["green-belt"]
+    assert get_subdivided_datasets(db_session) == ["green-belt"]
+    subdivided = {
+        row.entity for row in db_session.query(EntitySubdividedOrm.entity).all()
+    }
+    # every entity in a routed dataset is needed, not only the large ones
+    assert subdivided == {1, 2}
+
+    result = get_entity_search(
+        db_session,
+        {"longitude": -0.5, "latitude": 51.5, "dataset": ["green-belt"]},
+    )
+    assert sorted(e.entity for e in result["entities"]) == [1, 2]
@@ -1,3 +1,4 @@
+import json
 from copy import deepcopy
 
 import pytest as pytest
@@ -97,6 +98,59 @@ def test_lasso_geo_search_finds_no_results(client):
     assert [] == data["features"]
 
 
+def _coordinates(geometry):
+    coordinates = geometry["coordinates"]
+    while isinstance(coordinates[0], list):
+        coordinates = [c for part in coordinates for c in part]
+    return coordinates
+
+
+def test_entity_geojson_precision_rounds_coordinates(client, test_data):
+    response = client.get("/entity.geojson", params={"precision": 3})
+    assert response.status_code == 200
+    features = response.json()["features"]
+    assert features
+
+    for feature in features:
+        for value in _coordinates(feature["geometry"]):
+            assert value == round(value, 3)
+
+
+def test_entity_geojson_simplify_reduces_coordinates(client, test_data):
+    full = client.get("/entity.geojson", params={"dataset": "greenspace"}).json()
+    simplified = client.get(
+        "/entity.geojson", params={"dataset": "greenspace", "simplify": 0.01}
+    ).json()
+
+    assert len(_coordinates(simplified["features"][0]["geometry"])) < len(
+        _coordinates(full["features"][0]["geometry"])
+    )
+
+
+def test_entity_geojson_simplify_must_be_positive(client):
+    response = client.get("/entity.geojson", params={"simplify": 0})
+    assert response.status_code == 422
+
+
+def test_entity_ndjson_streams_all_matching_entities(client, test_data):
+    response = client.get("/entity.ndjson", params={"limit": 1})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    entities = [json.loads(line) for line in response.text.splitlines()]
+    # the export isn't paged so limit is ignored
+    assert len(entities) == len(test_data["entities"])
+    assert [e["entity"] for e in entities] == sorted(
+        int(e["entity"]) for e in test_data["entities"]
+    )
+    assert all("geojson" not in e for e in entities)
+
+
+def test_entity_ndjson_rejects_unknown_dataset(client, test_data):
+    response = client.get("/entity.ndjson", params={"dataset": "not-exists"})
+    assert response.status_code == 422
+
+
 def test_old_entity_redirects_as_expected(test_data_old_entities, client):
     """
     Test entity endpoint returns a 302 response code when old_entity requested
@@ -464,3 +518,77 @@ def test_dataset_json_has_licence_and_attribution(
     assert data["dataset"] == "greenspace"
     assert data["attribution"] == "crown-copyright"
     assert data["licence"] == "ogl3"
+
+
+def test_dataset_vector_tile(client, test_data):
+    response = client.get("/tiles/greenspace/0/0/0.mvt")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.mapbox-vector-tile"
+    # the layer is named after the dataset
+    assert b"greenspace" in response.content
+
+
+def test_dataset_vector_tile_unknown_dataset(client, test_data):
+    response = client.get("/tiles/not-a-dataset/0/0/0.mvt")
+    assert response.status_code == 404
+
+
+def test_point_lookup_matches_point_search(client, test_data):
+    points = [
+        {"longitude": -1.82398796081543, "latitude": 51.18064775509972},
+        {"longitude": -1.64794921875, "latitude": 50.51342652633956},
+    ]
+    response = client.post("/entity/point-lookup", json={"points": points})
+    assert response.status_code == 200
+
+    results = response.json()["results"]
+    assert len(results) == 2
+    for point, result in zip(points, results):
+        assert result["longitude"] == point["longitude"]
+        search = client.get("/entity.json", params=point).json()
+        assert [e["entity"] for e in result["entities"]] == sorted(
+            e["entity"] for e in search["entities"]
+        )
+    assert "historical-monument" in [e["dataset"] for e in results[0]["entities"]]
+
+
+def test_point_lookup_rejects_too_many_points(client, test_data):
+    points = [{"longitude": -1.8, "latitude": 51.2}] * 1001
+    response = client.post("/entity/point-lookup", json={"points": points})
+    assert response.status_code == 422
+    assert response.headers["content-type"] == "application/json"
+
+
+def test_point_lookup_rejects_an_unknown_dataset_as_json(client, test_data):
+    response = client.post(
+        "/entity/point-lookup",
+        json={
+            "points": [{"longitude": -1.8, "latitude": 51.2}],
+            "dataset": ["not-a-dataset"],
+        },
+    )
+    assert response.status_code == 422
+    assert response.headers["content-type"] == "application/json"
+
+
+@pytest.mark.parametrize("body", [{"entity": ["x"]}, {}])
+def test_entity_batch_rejects_an_invalid_body_as_json(client, test_data, body):
+    response = client.post("/entity/batch", json=body)
+    assert response.status_code == 422
+    assert response.headers["content-type"] == "application/json"
+    assert "detail" in response.json()
+
+
+def test_entity_batch_keeps_order_and_resolves_redirects(client, test_data):
+    response = client.post(
+        "/entity/batch", json={"entity": [3, 999001, 424242, 999002, 2]}
+    )
+    assert response.status_code == 200
+
+    data = response.json()
+    assert [e["entity"] for e in data["entities"]] == [3, 1, 2]
+    assert data["moved"] == {"999001": 1}
+    assert data["gone"] == [999002]
+    assert data["not-found"] == [424242]
+    single = client.get("/entity/3.json").json()
+    assert data["entities"][0]["name"] == single["name"]
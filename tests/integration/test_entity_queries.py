@@ -1,11 +1,18 @@
 from datetime import datetime
 import pytest
-from application.data_access.entity_queries import get_organisations, lookup_entity_link
+from application.data_access.entity_queries import (
+    get_organisation_entity,
+    get_organisations,
+    lookup_entity_link,
+    lookup_entity_links,
+)
 from application.data_access.entity_queries import (
     _apply_period_option_filter,
+    fetch_entities_by_reference,
     get_linked_entities,
+    get_linked_entities_by_dataset,
 )
-from application.db.models import EntityOrm
+from application.db.models import EntityOrm, OldEntityOrm
 from application.db.session import SESSION_CACHE, DbSession
 
 
@@ -64,6 +71,64 @@ def test__lookup_entity_link_returns_entity_without_organisation_entity(db_sessi
     assert linked_entity["dataset"] == lookup_entity["dataset"]
 
 
+def test_lookup_entity_links_looks_up_every_link_at_once(db_session):
+    for entity, dataset, reference, organisation_entity in [
+        (106, "article-4-direction", "a4d", 123),
+        (107, "conservation-area", "ca", 123),
+        (108, "conservation-area", "ca", 456),
+        (109, "listed-building", "lb", 456),
+        (110, "tree-preservation-order", "tpo", 123),
+        (111, "tree-preservation-order", "tpo", 123),
+    ]:
+        db_session.add(
+            EntityOrm(
+                entity=entity,
+                dataset=dataset,
+                reference=reference,
+                organisation_entity=organisation_entity,
+            )
+        )
+    db_session.flush()
+
+    links = lookup_entity_links(
+        db_session,
+        {
+            "article-4-direction": "a4d",
+            "conservation-area": "ca",
+            "listed-building": "lb",
+            "tree-preservation-order": "tpo",
+            "local-plan": "missing",
+        },
+        123,
+    )
+
+    # the listed building is found whatever its organisation, and the
+    # ambiguous tree preservation order isn't shown
+    assert {dataset: link["entity"] for dataset, link in links.items()} == {
+        "article-4-direction": 106,
+        "conservation-area": 107,
+        "listed-building": 109,
+    }
+
+
+def test_get_organisation_entity_ignores_a_replaced_organisation(db_session):
+    db_session.add(EntityOrm(entity=600001, dataset="local-authority"))
+    db_session.add(EntityOrm(entity=600002, dataset="local-authority"))
+    db_session.add(
+        OldEntityOrm(
+            old_entity_id=600002,
+            new_entity_id=600001,
+            status=301,
+            dataset="local-authority",
+        )
+    )
+    db_session.flush()
+
+    assert get_organisation_entity(db_session, 600001).entity == 600001
+    assert get_organisation_entity(db_session, 600002) is None
+    assert get_organisation_entity(db_session, 600003) is None
+
+
 @pytest.mark.parametrize("period", [["current"], ["historical"], ["all"]])
 def test_apply_period_option_filter(db_session, period):
     entities = [
@@ -312,3 +377,55 @@ def test_get_organisations(db_session, organisation_entity):
         ), "Expected no organisations to be returned when name is None"
 
     SESSION_CACHE.clear()
+
+
+def test_get_linked_entities_by_dataset_fetches_every_dataset_at_once(db_session):
+    for entity, dataset, event_date in [
+        (4220001, "local-plan-timetable", "2018-11-20"),
+        (4220002, "local-plan-timetable", "2022-11-20"),
+        (4220003, "local-plan-document", None),
+    ]:
+        db_session.add(
+            EntityOrm(
+                entity=entity,
+                dataset=dataset,
+                reference=str(entity),
+                json={"event-date": event_date, "local-plan": "1481207"},
+            )
+        )
+    db_session.flush()
+
+    linked_entities = get_linked_entities_by_dataset(
+        db_session,
+        ["local-plan-timetable", "local-plan-document", "local-plan-boundary"],
+        "1481207",
+        "local-plan",
+    )
+
+    assert {
+        dataset: [entity.entity for entity in entities]
+        for dataset, entities in linked_entities.items()
+    } == {
+        "local-plan-timetable": [4220002, 4220001],
+        "local-plan-document": [4220003],
+        "local-plan-boundary": [],
+    }
+
+
+def test_fetch_entities_by_reference(db_session):
+    db_session.add(
+        EntityOrm(entity=4230001, dataset="local-plan-event", reference="published")
+    )
+    db_session.add(
+        EntityOrm(entity=4230002, dataset="local-plan-event", reference="adopted")
+    )
+    db_session.flush()
+
+    events = fetch_entities_by_reference(
+        db_session, "local-plan-event", {"published", "adopted", "missing"}
+    )
+
+    assert {reference: event.entity for reference, event in events.items()} == {
+        "published": 4230001,
+        "adopted": 4230002,
+    }
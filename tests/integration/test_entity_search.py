@@ -3,7 +3,7 @@ from datetime import datetime
 
 from application.core.models import EntityModel
 from application.data_access.entity_queries import get_entity_search
-from application.search.enum import PeriodOption, GeometryRelation
+from application.search.enum import CountOption, PeriodOption, GeometryRelation
 from tests.test_data.wkt_data import (
     intersects_with_brownfield_entity as brownfield,
     intersects_with_greenspace_entity as greenspace,
@@ -228,6 +228,17 @@ def test_search_entity_by_point(test_data, params, db_session):
     assert entity.dataset == "historical-monument"
 
 
+def test_search_entity_by_bbox(test_data, params, db_session):
+    params["bbox"] = "-1.8241,51.1805,-1.8239,51.1807"
+
+    result = get_entity_search(db_session, params)
+    assert "historical-monument" in [e.dataset for e in result["entities"]]
+
+    params["bbox_exact"] = True
+    result = get_entity_search(db_session, params)
+    assert "historical-monument" in [e.dataset for e in result["entities"]]
+
+
 def test_search_entity_by_single_polygon_intersects(test_data, params, db_session):
     params["geometry"] = [brownfield]
     params["geometry_relation"] = GeometryRelation.intersects.name
@@ -554,3 +565,54 @@ def test_search_entity_with_exclude_parameter(test_data, params, db_session):
 
 
 # TODO test cases for contains, within
+
+
+def test_search_entity_after_entity_pages_through_all_results(
+    test_data, params, db_session
+):
+    params["limit"] = 10
+    seen = []
+    after_entity = None
+    while True:
+        params["after_entity"] = after_entity
+        result = get_entity_search(db_session, params)
+        if after_entity is None:
+            assert result["count"] == len(test_data["entities"])
+        else:
+            # pages after a cursor aren't counted
+            assert result["count"] is None
+        page = [entity.entity for entity in result["entities"]]
+        if not page:
+            break
+        assert page == sorted(page)
+        seen.extend(page)
+        after_entity = page[-1]
+
+    assert seen == sorted(int(entity["entity"]) for entity in test_data["entities"])
+
+
+@pytest.mark.parametrize(
+    "count_mode", [CountOption.exact, CountOption.estimated, CountOption.none]
+)
+def test_search_entity_count_mode(count_mode, test_data, params, db_session):
+    params["limit"] = 5
+    params["count_mode"] = count_mode
+    result = get_entity_search(db_session, params)
+
+    assert len(result["entities"]) == 5
+    if count_mode == CountOption.exact:
+        assert result["count"] == len(test_data["entities"])
+    elif count_mode == CountOption.estimated:
+        assert result["count"] >= 5
+    else:
+        assert result["count"] is None
+
+
+def test_search_entity_short_page_is_counted_without_count_mode(
+    test_data, params, db_session
+):
+    params["dataset"] = ["greenspace"]
+    params["count_mode"] = CountOption.none
+    result = get_entity_search(db_session, params)
+
+    assert result["count"] == 1
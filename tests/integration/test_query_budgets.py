@@ -0,0 +1,28 @@
+import pytest
+
+# The most statements each route may run for the test data. A change that
+# adds queries to a route, e.g. one per linked entity, fails here; if the
+# queries are needed, raise the budget in the same change.
+QUERY_BUDGETS = [
+    # old entity check, entity, organisation, linked datasets, dataset and
+    # its attribution and licence, entity 101 has no links or local plans
+    ("/entity/101", 7),
+    # old entity check, entity
+    ("/entity/101.json", 2),
+    # dataset names, typology names, the search with its window count
+    ("/entity.json?dataset=local-authority", 3),
+    # datasets, their 4 attributions and 1 licence, entity counts
+    ("/dataset.json", 7),
+]
+
+
+@pytest.mark.parametrize("url, max_statements", QUERY_BUDGETS)
+def test_route_stays_within_its_query_budget(
+    client, test_data, query_budget, url, max_statements
+):
+    with query_budget(max_statements) as statements:
+        response = client.get(url, follow_redirects=True)
+
+    assert response.status_code == 200
+    # a budget only guards a route whose statements are being counted
+    assert statements.total > 0
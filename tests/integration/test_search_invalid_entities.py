@@ -98,3 +98,19 @@ def test_search_by_dataset_and_lasso_excludes_invalid_geometry(
     result = get_entity_search(db_session, params)
     assert 0 == result["count"]
     assert 0 == len(result["entities"])
+
+
+def test_geometry_valid_is_stored_for_each_entity(invalid_test_data, db_session):
+    rows = db_session.query(EntityOrm.name, EntityOrm.geometry_valid).all()
+    for name, geometry_valid in rows:
+        assert geometry_valid is ("invalid" not in name)
+
+
+def test_invalid_geometries_reads_stored_flag(invalid_test_data, client):
+    response = client.get("/invalid-geometries")
+    assert response.status_code == 200
+
+    invalid = [entity["entity"]["name"] for entity in response.json()]
+    assert invalid
+    for name in invalid:
+        assert "invalid" in name
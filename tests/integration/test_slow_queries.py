@@ -0,0 +1,47 @@
+import pytest
+
+from application.db.slow_queries import get_slow_query_capture
+from application.settings import get_settings
+
+
+@pytest.fixture
+def admin_token(app):
+    settings = get_settings().model_copy(update={"ADMIN_TOKEN": "secret"})
+    app.dependency_overrides[get_settings] = lambda: settings
+    yield "secret"
+    app.dependency_overrides.pop(get_settings)
+
+
+def test_slow_queries_is_hidden_without_the_admin_token(client, admin_token):
+    assert client.get("/admin/slow-queries").status_code == 404
+    response = client.get(
+        "/admin/slow-queries", headers={"Authorization": "Bearer wrong"}
+    )
+    assert response.status_code == 404
+
+
+def test_slow_queries_lists_the_latest_plans_first(client, admin_token):
+    records = get_slow_query_capture().records
+    records.clear()
+    records.extend([{"function": "first"}, {"function": "second"}])
+
+    response = client.get(
+        "/admin/slow-queries", headers={"Authorization": f"Bearer {admin_token}"}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "slow_queries": [{"function": "second"}, {"function": "first"}]
+    }
+    records.clear()
+
+
+def test_metrics_needs_the_admin_token(client, admin_token):
+    assert client.get("/metrics").status_code == 404
+
+    response = client.get(
+        "/metrics", headers={"Authorization": f"Bearer {admin_token}"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
@@ -0,0 +1,75 @@
+"""
+Benchmarks entity_factory against building a new extended model for every
+entity with a json column, which is how it worked before the models were
+cached. This doesn't need a database:
+
+    python -m pytest tests/performance/test_entity_factory_benchmark.py
+"""
+
+import logging
+import time
+from typing import Any
+
+import pytest
+from pydantic import create_model
+
+from application.core.models import EntityModel, entity_factory
+from application.core.utils import to_snake
+from application.db.models import EntityOrm
+
+logger = logging.getLogger(__name__)
+
+# a full page of search results
+ROWS = 500
+
+
+def entity_factory_OLD_VERSION(entity_orm: EntityOrm):
+    e = EntityModel.model_validate(entity_orm)
+    if entity_orm.json is not None:
+        field_definitions = {
+            to_snake(key): (Any, None) for key in entity_orm.json.keys()
+        }
+        ExtendedEntityModel = create_model(
+            "ExtendedEntityModel", **field_definitions, __base__=EntityModel
+        )
+        e = ExtendedEntityModel(**e.model_dump(by_alias=False), **entity_orm.json)
+    return e
+
+
+def _time_per_row(factory, entity_orms):
+    start = time.perf_counter()
+    entities = [factory(entity_orm) for entity_orm in entity_orms]
+    return (time.perf_counter() - start) / len(entity_orms), entities
+
+
+@pytest.mark.parametrize("json_key_sets", [1, 5])
+def test_entity_factory_per_row_cost(json_key_sets):
+    entity_orms = [
+        EntityOrm(
+            entity=1000000 + i,
+            dataset="tree-preservation-zone",
+            typology="geography",
+            reference=f"TPZ{i}",
+            point=f"POINT({i % 10} {i % 7})",
+            json={
+                "tree-preservation-order": f"TPO{i}",
+                "notes": "",
+                f"field-{i % json_key_sets}": "value",
+            },
+        )
+        for i in range(ROWS)
+    ]
+
+    old_seconds, old_entities = _time_per_row(entity_factory_OLD_VERSION, entity_orms)
+    new_seconds, new_entities = _time_per_row(entity_factory, entity_orms)
+
+    logger.info(
+        f"entity_factory with {json_key_sets} json key sets: "
+        f"old {old_seconds * 1000000:.1f}us per row, "
+        f"new {new_seconds * 1000000:.1f}us per row"
+    )
+
+    assert [e.model_dump(by_alias=True) for e in new_entities] == [
+        e.model_dump(by_alias=True) for e in old_entities
+    ]
+    assert new_seconds < old_seconds
@@ -0,0 +1,111 @@
+"""
+Benchmarks get_entity_search against get_entity_search_OLD_VERSION, which
+runs a separate count query before fetching the page. These need a database
+so run them alongside the integration tests:
+
+    python -m pytest tests/performance
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from application.data_access.dataset_queries import get_subdivided_datasets
+from application.data_access.entity_queries import (
+    get_entity_search,
+    get_entity_search_OLD_VERSION,
+)
+from application.db.models import EntityOrm
+from application.search.enum import SuffixEntity
+
+logger = logging.getLogger(__name__)
+
+ITERATIONS = 20
+
+POLYGON = (
+    "MULTIPOLYGON(((-0.5 51.0, 0.5 51.0, 0.5 52.0, -0.5 52.0, -0.5 51.0)))"  # noqa E501
+)
+
+
+@pytest.fixture()
+def benchmark_entities(db_session):
+    # a grid of points inside and around POLYGON so spatial filters have
+    # enough rows to do real work
+    for i in range(1000):
+        longitude = -1.0 + (i % 40) * 0.05
+        latitude = 50.5 + (i // 40) * 0.08
+        db_session.add(
+            EntityOrm(
+                entity=5000000 + i,
+                dataset="tree",
+                typology="geography",
+                reference=f"TREE{i}",
+                point=f"POINT({longitude} {latitude})",
+            )
+        )
+    db_session.commit()
+
+
+@contextmanager
+def count_statements(session):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    connection = session.connection()
+    event.listen(connection, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(connection, "before_cursor_execute", before_cursor_execute)
+
+
+def _time_search(search, session, params):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        result = search(session, dict(params), SuffixEntity.json)
+    return (time.perf_counter() - start) / ITERATIONS, result
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"dataset": ["tree"], "limit": 10},
+        {"dataset": ["tree"], "limit": 10, "offset": 500},
+        {"dataset": ["tree"], "geometry": [POLYGON], "limit": 10},
+        {
+            "geometry": [POLYGON],
+            "geometry_relation": "intersects",
+            "limit": 100,
+        },
+    ],
+)
+def test_entity_search_single_round_trip(benchmark_entities, db_session, params):
+    # loads the session cached subdivided datasets up front, so only the
+    # search queries are counted
+    get_subdivided_datasets(db_session)
+
+    with count_statements(db_session) as old_statements:
+        old_seconds, old_result = _time_search(
+            get_entity_search_OLD_VERSION, db_session, params
+        )
+    with count_statements(db_session) as new_statements:
+        new_seconds, new_result = _time_search(get_entity_search, db_session, params)
+
+    logger.info(
+        f"get_entity_search {params}: "
+        f"old {old_seconds * 1000:.2f}ms ({len(old_statements) // ITERATIONS} queries), "
+        f"new {new_seconds * 1000:.2f}ms ({len(new_statements) // ITERATIONS} queries)"
+    )
+
+    # same results from one round-trip instead of two
+    assert new_result["count"] == old_result["count"]
+    assert [e.entity for e in new_result["entities"]] == [
+        e.entity for e in old_result["entities"]
+    ]
+    assert len(old_statements) == 2 * ITERATIONS
+    assert len(new_statements) == ITERATIONS
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+from application.core.metrics import (
+    TimedQueuePool,
+    generate_metrics,
+    observe_request,
+    record_http_latency,
+    timed_request,
+    track_pool_metrics,
+)
+from application.core.timing import RequestTimings
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_observe_request_labels_by_route_template():
+    labels = {"method": "GET", "route": "/entity/{entity}", "status": "200"}
+    before = sample("http_request_duration_seconds_count", **labels)
+    queries_before = sample(
+        "http_request_db_queries_sum", method="GET", route="/entity/{entity}"
+    )
+    timings = RequestTimings()
+    timings.add("db", 0.001)
+    timings.add("db", 0.001)
+    scope = {"method": "GET", "route": SimpleNamespace(path="/entity/{entity}")}
+
+    observe_request(scope, 200, timings)
+
+    assert sample("http_request_duration_seconds_count", **labels) == before + 1
+    assert (
+        sample("http_request_db_queries_sum", method="GET", route="/entity/{entity}")
+        == queries_before + 2
+    )
+
+
+def test_pool_metrics_follow_checkouts(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/pool.db", poolclass=TimedQueuePool)
+    database = "replica-1"
+    track_pool_metrics(engine, database)
+    waits = sample("db_pool_wait_seconds_count", database=database)
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        assert sample("db_pool_checked_out_connections", database=database) == 1
+
+    assert sample("db_pool_checked_out_connections", database=database) == 0
+    assert sample("db_pool_wait_seconds_count", database=database) == waits + 1
+
+
+def test_outbound_requests_are_observed_by_host():
+    before = sample("http_client_request_duration_seconds_count", host="api.os.uk")
+
+    with timed_request("https://api.os.uk/search/places/v1/uprn"):
+        pass
+    response = MagicMock(url="https://api.os.uk/oauth2/token/v1")
+    response.elapsed.total_seconds.return_value = 0.2
+    record_http_latency(response)
+
+    assert (
+        sample("http_client_request_duration_seconds_count", host="api.os.uk")
+        == before + 2
+    )
+
+
+def test_generate_metrics_uses_the_worker_files(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+
+    content, media_type = generate_metrics()
+
+    assert content == b""
+    assert media_type.startswith("text/plain")
@@ -0,0 +1,43 @@
+from application.core.models import (
+    EntityModel,
+    entity_factory,
+    get_extended_entity_model,
+)
+from application.db.models import EntityOrm
+
+
+def test_entity_factory_without_json_returns_entity_model():
+    entity = entity_factory(EntityOrm(entity=1, dataset="tree"))
+
+    assert type(entity) is EntityModel
+    assert entity.dataset == "tree"
+
+
+def test_entity_factory_adds_json_fields():
+    entity = entity_factory(
+        EntityOrm(
+            entity=1,
+            dataset="tree",
+            point="POINT(1 2)",
+            json={"local-planning-authority": "E60000001", "notes": "an oak"},
+        )
+    )
+
+    result = entity.model_dump(by_alias=True)
+    assert result["local-planning-authority"] == "E60000001"
+    assert result["notes"] == "an oak"
+    assert result["point"] == "POINT(1 2)"
+    assert list(result.keys())[-2:] == ["local-planning-authority", "notes"]
+
+
+def test_entity_factory_reuses_extended_model_for_the_same_json_keys():
+    get_extended_entity_model.cache_clear()
+
+    first = entity_factory(EntityOrm(entity=1, json={"notes": "an oak"}))
+    second = entity_factory(EntityOrm(entity=2, json={"notes": "an ash"}))
+    other = entity_factory(EntityOrm(entity=3, json={"species": "elm"}))
+
+    assert type(first) is type(second)
+    assert type(first) is not type(other)
+    assert get_extended_entity_model.cache_info().misses == 2
+    assert second.notes == "an ash"
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+
+from sqlalchemy import create_engine, text
+
+from application.core.timing import (
+    RequestTimings,
+    request_timings,
+    timed,
+    timed_phase,
+    track_db_time,
+)
+from application.factory import ServerTimingMiddleware
+
+
+def test_server_timing_lists_each_phase_and_the_total():
+    timings = RequestTimings()
+    timings.add("db", 0.012)
+    timings.add("db", 0.003)
+    timings.add("templates", 0.004)
+
+    header = timings.server_timing()
+
+    assert header.startswith(
+        'db;dur=15.0;desc="Database (2)", '
+        'templates;dur=4.0;desc="Template rendering (1)", total;dur='
+    )
+    assert timings.as_dict()["db"] == {"ms": 15.0, "count": 2}
+
+
+def test_timed_adds_to_the_current_request():
+    timings = RequestTimings()
+    token = request_timings.set(timings)
+    try:
+
+        @timed_phase("models")
+        def build():
+            return "built"
+
+        assert build() == "built"
+        with timed("http"):
+            pass
+    finally:
+        request_timings.reset(token)
+
+    assert timings.phases["models"][1] == 1
+    assert timings.phases["http"][1] == 1
+
+
+def test_timed_does_nothing_outside_a_request():
+    with timed("http"):
+        pass
+
+    assert request_timings.get() is None
+
+
+def test_track_db_time_times_each_statement():
+    engine = create_engine("sqlite://")
+    track_db_time(engine)
+    timings = RequestTimings()
+    token = request_timings.set(timings)
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT 2"))
+    finally:
+        request_timings.reset(token)
+
+    assert timings.phases["db"][1] == 2
+
+
+def run_middleware(app):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/entity/1"}
+    asyncio.run(ServerTimingMiddleware(app)(scope, receive, send))
+    return sent
+
+
+def test_middleware_sends_server_timing_and_logs_the_request(caplog):
+    async def app(scope, receive, send):
+        request_timings.get().add("db", 0.002)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    with caplog.at_level(logging.INFO, logger="application.access"):
+        sent = run_middleware(app)
+
+    headers = dict(sent[0]["headers"])
+    assert headers[b"server-timing"].startswith(b'db;dur=2.0;desc="Database (1)"')
+
+    [record] = caplog.records
+    assert record.method == "GET"
+    assert record.path == "/entity/1"
+    assert record.status_code == 200
+    assert record.timings["db"] == {"ms": 2.0, "count": 1}
+    assert request_timings.get() is None
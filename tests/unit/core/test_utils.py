@@ -1,11 +1,15 @@
+import json
 import time
 import pytest
 
 from application.core.utils import (
     entity_attribute_sort_key,
     make_pagination_query_str,
+    SlowExecutionTimer,
     log_slow_execution,
     map_entity_quality_to_description,
+    stream_entity_list,
+    stream_feature_collection,
 )
 
 quality_test_data = [
@@ -145,3 +149,101 @@ class TestEntityQualityMapsToDescription:
 
         # Should title case the quality even if description not found
         assert result["quality"] == "Special quality"
+
+
+def test_stream_feature_collection_writes_valid_geojson():
+    features = [
+        {"type": "Feature", "properties": {"entity": 1}},
+        {"type": "Feature", "properties": {"entity": 2}},
+    ]
+    chunks = list(
+        stream_feature_collection(
+            (json.dumps(feature) for feature in features), lambda: {"next": "/entity"}
+        )
+    )
+
+    # each feature is written as it's read
+    assert chunks[1] == json.dumps(features[0])
+    assert json.loads("".join(chunks)) == {
+        "type": "FeatureCollection",
+        "features": features,
+        "links": {"next": "/entity"},
+    }
+
+
+def test_stream_feature_collection_calls_links_after_features():
+    written = []
+
+    def features():
+        for entity in [1, 2]:
+            written.append(entity)
+            yield json.dumps({"type": "Feature", "properties": {"entity": entity}})
+
+    def links():
+        return {"written": len(written)}
+
+    result = json.loads("".join(stream_feature_collection(features(), links)))
+    assert result["links"] == {"written": 2}
+
+
+def test_stream_feature_collection_without_features():
+    result = json.loads("".join(stream_feature_collection(iter([]), lambda: {})))
+    assert result == {"type": "FeatureCollection", "features": [], "links": {}}
+
+
+def test_stream_entity_list_writes_links_and_count_after_entities():
+    entities = ['{"entity": 1}', '{"entity": 2}']
+    result = json.loads(
+        "".join(
+            stream_entity_list(iter(entities), lambda: {"links": {}, "count": None})
+        )
+    )
+    assert result == {
+        "entities": [{"entity": 1}, {"entity": 2}],
+        "links": {},
+        "count": "",
+    }
+
+
+def test_log_slow_execution_explains_slow_calls(mocker):
+    capture = mocker.patch("application.core.utils.capture_slow_queries")
+    statements = []
+
+    @log_slow_execution(threshold_seconds=0.05, explain=True)
+    def slow_search():
+        from application.db.slow_queries import _statements
+
+        statements.append(_statements.get())
+        time.sleep(0.1)
+
+    slow_search()
+
+    function, elapsed, collected = capture.call_args.args
+    assert function == "slow_search"
+    assert elapsed > 0.05
+    assert collected is statements[0]
+
+
+def test_slow_execution_timer_times_a_generator_until_it_is_read(mocker):
+    capture = mocker.patch("application.core.utils.capture_slow_queries")
+    collected = []
+
+    def documents():
+        from application.db.slow_queries import _statements
+
+        for document in ["1", "2"]:
+            collected.append(_statements.get())
+            time.sleep(0.05)
+            yield document
+
+    timer = SlowExecutionTimer("stream_search", threshold_seconds=0.08, explain=True)
+    documents = timer.iterate(documents())
+    assert next(documents) == "1"
+    capture.assert_not_called()
+
+    assert list(documents) == ["2"]
+    function, elapsed, statements = capture.call_args.args
+    assert function == "stream_search"
+    assert elapsed > 0.08
+    # each step collects into the same list
+    assert collected == [statements, statements]
@@ -1,10 +1,14 @@
-from unittest.mock import MagicMock
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
 
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from application.data_access.curie_queries import (
     get_lookup_by_curie,
+    get_lookup_by_curie_async,
     get_entity_by_curie,
+    get_entity_by_curie_async,
 )
 
 
@@ -77,3 +81,38 @@ class TestGetEntityByCurie:
 
         assert result == [789, 101]
         assert len(result) == 2
+
+
+class TestGetByCurieAsync:
+    def _mock_async_session(self, ids):
+        mock_session = MagicMock(spec=AsyncSession)
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = ids
+        mock_session.execute = AsyncMock(return_value=result)
+        return mock_session
+
+    def test_lookup_returns_entity_ids(self):
+        mock_session = self._mock_async_session([123, 456])
+
+        result = asyncio.run(
+            get_lookup_by_curie_async(mock_session, "test-prefix", "test-reference")
+        )
+
+        assert result == [123, 456]
+        statement = mock_session.execute.call_args.args[0]
+        sql = str(statement.compile(compile_kwargs={"literal_binds": True}))
+        assert "FROM lookup" in sql
+        assert "LIMIT 2" in sql
+
+    def test_entity_returns_entity_ids(self):
+        mock_session = self._mock_async_session([789])
+
+        result = asyncio.run(
+            get_entity_by_curie_async(mock_session, "test-prefix", "test-reference")
+        )
+
+        assert result == [789]
+        statement = mock_session.execute.call_args.args[0]
+        sql = str(statement.compile(compile_kwargs={"literal_binds": True}))
+        assert "FROM entity" in sql
+        assert "entity.prefix = 'test-prefix'" in sql
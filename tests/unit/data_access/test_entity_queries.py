@@ -1,11 +1,48 @@
+import asyncio
+import pytest
+
+from geoalchemy2.shape import from_shape
+from shapely.geometry import MultiPolygon, Point, Polygon
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import Query
 
 from application.data_access.entity_queries import (
+    _apply_geojson_expressions,
+    _entity_document,
+    _entity_document_columns,
+    _entity_geojson_document,
+    _entity_json_document,
     _apply_limit_and_pagination_filters,
+    _get_entity,
+    _Explain,
+    _estimate_count,
+    _get_entity_search_count,
+    _get_page_and_count,
     _apply_location_filters,
+    _build_entity_search_query,
     get_entity_query,
+    get_entity_query_async,
+    get_entity_search,
+    get_entity_search_async,
+    get_point_lookup,
+    stream_entities_by_id,
+    stream_entity_search,
+    stream_entity_search_documents,
 )
+from application.data_access.entity_query_helpers import normalised_params
+from application.db.slow_queries import _statements
 from application.db.models import EntityOrm
+from application.search.enum import CountOption, SuffixEntity
+
+
+@pytest.fixture(autouse=True)
+def subdivided_datasets(mocker):
+    return mocker.patch(
+        "application.data_access.entity_queries.get_subdivided_datasets",
+        return_value=["flood-risk-zone"],
+    )
 
 
 def test__apply_limit_and_pagination_filters_with_no_filters_applied():
@@ -14,6 +51,19 @@ def test__apply_limit_and_pagination_filters_with_no_filters_applied():
     assert result._limit_clause is None
 
 
+def test__apply_limit_and_pagination_filters_seeks_after_entity():
+    query = Query(EntityOrm)
+    result = _apply_limit_and_pagination_filters(
+        query, params={"limit": 10, "offset": 20, "after_entity": 1000}
+    )
+    sql_str = str(result.statement.compile(compile_kwargs={"literal_binds": True}))
+
+    assert "entity.entity > 1000" in sql_str
+    assert "ORDER BY entity.entity" in sql_str
+    # the seek predicate replaces the offset rather than adding to it
+    assert result._offset_clause is None
+
+
 def test__apply_location_filters_for_frz_dataset(mocker):
     query = Query(EntityOrm)
     result = _apply_location_filters(
@@ -92,6 +142,37 @@ def test__apply_location_filters_pushes_dataset_into_entity_branch(mocker):
     assert "NOT IN" not in spatial_subquery
 
 
+def test__apply_location_filters_routes_datasets_from_subdivided_table(
+    mocker, subdivided_datasets
+):
+    subdivided_datasets.return_value = ["flood-risk-zone", "green-belt"]
+    query = Query(EntityOrm)
+    result = _apply_location_filters(
+        mocker.MagicMock(),
+        query,
+        params={"longitude": "-0.2", "latitude": "53.38", "dataset": ["green-belt"]},
+    )
+    sql_str = str(result.statement.compile(compile_kwargs={"literal_binds": True}))
+
+    assert "FROM entity_subdivided" in sql_str
+    assert "green-belt" in sql_str.split("FROM entity_subdivided")[1]
+    assert "UNION ALL" not in sql_str
+
+
+def test__apply_location_filters_without_subdivided_datasets(
+    mocker, subdivided_datasets
+):
+    subdivided_datasets.return_value = []
+    query = Query(EntityOrm)
+    result = _apply_location_filters(
+        mocker.MagicMock(), query, params={"longitude": "-0.2", "latitude": "53.38"}
+    )
+    sql_str = str(result.statement.compile(compile_kwargs={"literal_binds": True}))
+
+    assert "entity_subdivided" not in sql_str
+    assert "NOT IN" not in sql_str
+
+
 def test__apply_location_filters_without_dataset(mocker):
     query = Query(EntityOrm)
     params = {
@@ -116,6 +197,136 @@ def test__apply_location_filters_geometry_within(mocker):
     assert any(spatial_func in sql for spatial_func in "ST_Within")
 
 
+def test__apply_location_filters_point_uses_cell_cache(mocker):
+    mocker.patch(
+        "application.data_access.entity_queries.get_data_release",
+        return_value="abc",
+    )
+    cache = mocker.MagicMock()
+    cache.get.return_value = '{"covered": [3, 1], "straddling": [7]}'
+    session = mocker.MagicMock()
+    session.scalars.return_value = [7]
+
+    result = _apply_location_filters(
+        session,
+        Query(EntityOrm),
+        {"longitude": "-0.2", "latitude": "53.38", "dataset": ["conservation-area"]},
+        cache,
+    )
+    sql = str(result.statement.compile(compile_kwargs={"literal_binds": True}))
+
+    assert cache.get.call_args.args[0] == "point-cell:abc:conservation-area:-400/106760"
+    assert "entity.entity IN (1, 3, 7)" in sql
+    # only the entities straddling the cell boundary are checked exactly
+    refinement = str(
+        session.scalars.call_args.args[0].compile(
+            compile_kwargs={"literal_binds": True}
+        )
+    )
+    assert "ST_Contains" in refinement
+    assert "entity.entity IN (7)" in refinement
+
+
+def test__apply_location_filters_point_cell_miss_finds_candidates(mocker):
+    mocker.patch(
+        "application.data_access.entity_queries.get_data_release",
+        return_value="abc",
+    )
+    cache = mocker.MagicMock()
+    cache.get.return_value = None
+    session = mocker.MagicMock()
+    session.execute.return_value.all.return_value = [
+        mocker.MagicMock(entity=1, covered=True),
+        mocker.MagicMock(entity=2, covered=False),
+    ]
+    session.scalars.return_value = []
+
+    result = _apply_location_filters(
+        session, Query(EntityOrm), {"longitude": "-0.2", "latitude": "53.38"}, cache
+    )
+    sql = str(result.statement.compile(compile_kwargs={"literal_binds": True}))
+
+    candidates = str(
+        session.execute.call_args.args[0].compile(
+            compile_kwargs={"literal_binds": True}
+        )
+    )
+    assert "ST_ContainsProperly(entity.geometry, ST_MakeEnvelope(" in candidates
+    assert "entity_subdivided" in candidates
+    assert "entity.entity IN (1)" in sql
+    assert cache.setex.call_args.args[2] == '{"covered": [1], "straddling": [2]}'
+
+
+def test__apply_location_filters_uses_stored_geometry_validity(mocker):
+    query = Query(EntityOrm)
+    params = {
+        "longitude": "-0.2",
+        "latitude": "53.38",
+        "geometry": ["MULTIPOLYGON((-0.1 52.5, -0.5 52.3, 0.0 52.1, -0.1 52.5))"],
+    }
+
+    result = _apply_location_filters(mocker.MagicMock(), query, params)
+    sql = str(result.statement.compile(compile_kwargs={"literal_binds": True}))
+
+    assert "ST_IsValid" not in sql
+    assert "entity_subdivided_1.geometry_valid" in sql
+    assert "entity.geometry_valid" in sql
+
+
+@pytest.mark.parametrize(
+    "params, query_type",
+    [
+        ({"dataset": ["conservation-area"]}, None),
+        ({"bbox": "-0.2,51.4,0.1,51.6"}, "spatial"),
+        ({"geometry_entity": [1]}, "spatial"),
+    ],
+)
+def test__build_entity_search_query_routes_spatial_searches(mocker, params, query_type):
+    session = mocker.MagicMock()
+    session.info = {}
+
+    _build_entity_search_query(session, params)
+
+    assert session.info.get("query_type") == query_type
+
+
+def test__apply_location_filters_bbox_uses_envelope_overlap(mocker):
+    query = Query(EntityOrm)
+    params = {"bbox": "-0.2,51.4,0.1,51.6", "dataset": ["conservation-area"]}
+
+    result = _apply_location_filters(mocker.MagicMock(), query, params)
+    sql = str(
+        result.statement.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+    envelope = "ST_MakeEnvelope(-0.2, 51.4, 0.1, 51.6, 4326)"
+    assert f"entity.geometry && {envelope}" in sql
+    assert f"entity.point && {envelope}" in sql
+    assert "ST_Intersects" not in sql
+    assert "ST_GeomFromText" not in sql
+    assert "entity_subdivided" not in sql
+
+
+def test__apply_location_filters_bbox_covers_entity_subdivided(mocker):
+    query = Query(EntityOrm)
+    params = {"bbox": "-0.2,51.4,0.1,51.6", "bbox_exact": True}
+
+    result = _apply_location_filters(mocker.MagicMock(), query, params)
+    sql = str(
+        result.statement.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+    subdivided_branch, entity_branch = sql.split("UNION ALL")
+
+    assert "geometry_subdivided && ST_MakeEnvelope" in subdivided_branch
+    assert "ST_Intersects(entity_subdivided_1.geometry_subdivided" in subdivided_branch
+    assert "ST_Intersects(entity.geometry" in entity_branch
+    assert "ST_Intersects(entity.point" in entity_branch
+
+
 def test_get_entity_query_closes_session(mocker):
     """
     Test that `get_entity_query()` properly closes its session after use.
@@ -193,3 +404,653 @@ def test_get_entity_query_no_pool_exhaustion(mocker):
         f"Expected {num_calls} sessions closed, got {len(sessions_closed)}. "
         "Sessions not being closed will cause QueuePool exhaustion."
     )
+
+
+def test_get_entity_simplifies_the_wkt_with_the_geojson(mocker):
+    session = mocker.MagicMock()
+    old_entities = session.query.return_value.filter.return_value
+    old_entities.one_or_none.return_value = None
+    entities = session.query.return_value.options.return_value.filter.return_value
+    entities.one_or_none.return_value = mocker.MagicMock(
+        EntityOrm=EntityOrm(entity=1, dataset="tree"),
+        geometry=None,
+        point="POINT(-0.12 51.5)",
+    )
+
+    entity, _, _ = _get_entity(session, 1, {"simplify": 0.01, "precision": 2})
+
+    assert entity.point == "POINT(-0.12 51.5)"
+    session.get.assert_not_called()
+    columns = session.query.call_args.args
+    compiled = [
+        str(column.compile(dialect=postgresql.dialect())) for column in columns[1:]
+    ]
+    assert all(
+        sql.startswith("ST_AsText(ST_SimplifyPreserveTopology") for sql in compiled
+    )
+
+
+def test_get_entity_query_async_runs_on_the_given_session(mocker):
+    sync_session = mocker.MagicMock()
+    sync_session.query.return_value.filter.return_value.one_or_none.return_value = (
+        mocker.MagicMock(status=301, new_entity_id=2)
+    )
+
+    async def run_sync(fn, *args, **kwargs):
+        return fn(sync_session, *args, **kwargs)
+
+    session = mocker.MagicMock()
+    session.run_sync = run_sync
+
+    assert asyncio.run(get_entity_query_async(session, 1)) == (None, 301, 2)
+    sync_session.get.assert_not_called()
+    assert sync_session.info.__setitem__.call_args.args == (
+        "statement_timeout",
+        "entity",
+    )
+
+
+def test_get_entity_search_async_runs_the_sync_search(mocker):
+    session = mocker.MagicMock()
+    session.run_sync = mocker.AsyncMock(return_value={"count": 0})
+    params = {"limit": 10}
+
+    result = asyncio.run(get_entity_search_async(session, params, SuffixEntity.json))
+
+    assert result == {"count": 0}
+    session.run_sync.assert_awaited_once_with(
+        get_entity_search, params, SuffixEntity.json, None
+    )
+
+
+@pytest.mark.parametrize(
+    "dialect, placeholder",
+    [
+        (postgresql.psycopg2.dialect(), "%(entity_1)s"),
+        (postgresql.asyncpg.dialect(), "$1"),
+    ],
+)
+def test__estimate_count_explain_binds_for_the_driver(dialect, placeholder):
+    query = Query(EntityOrm.entity).filter(
+        EntityOrm.entity > 5, EntityOrm.dataset.in_(["tree", "tree-preservation-order"])
+    )
+
+    compiled = _Explain(query.statement).compile(dialect=dialect)
+
+    assert str(compiled).startswith("EXPLAIN (FORMAT JSON) SELECT entity.entity")
+    assert placeholder in str(compiled)
+    assert compiled.params["entity_1"] == 5
+    assert compiled.params["dataset_1"] == ["tree", "tree-preservation-order"]
+
+
+def test__estimate_count_reads_planned_rows(mocker):
+    session = mocker.MagicMock()
+    session.execute.return_value.scalar.return_value = [{"Plan": {"Plan Rows": 812}}]
+
+    assert _estimate_count(session, Query(EntityOrm.entity)) == 812
+    assert isinstance(session.execute.call_args.args[0], _Explain)
+
+
+def test__get_entity_search_count_uses_short_first_page(mocker):
+    session = mocker.MagicMock()
+    count = _get_entity_search_count(
+        session, Query(EntityOrm), {"limit": 10, "offset": 0}, 4
+    )
+
+    assert count == 4
+    session.query.assert_not_called()
+
+
+def test__get_entity_search_count_uses_short_last_page(mocker):
+    session = mocker.MagicMock()
+    count = _get_entity_search_count(
+        session, Query(EntityOrm), {"limit": 10, "offset": 30}, 4
+    )
+
+    assert count == 34
+    session.query.assert_not_called()
+
+
+def test__get_entity_search_count_runs_exact_count_for_full_page(mocker):
+    session = mocker.MagicMock()
+    session.query.return_value.select_from.return_value.scalar.return_value = 123
+    count = _get_entity_search_count(session, Query(EntityOrm), {"limit": 10}, 10)
+
+    assert count == 123
+
+
+def test__get_entity_search_count_none_skips_count(mocker):
+    session = mocker.MagicMock()
+    count = _get_entity_search_count(
+        session, Query(EntityOrm), {"limit": 10, "count_mode": CountOption.none}, 10
+    )
+
+    assert count is None
+    session.query.assert_not_called()
+
+
+def test__get_entity_search_count_skips_count_after_cursor(mocker):
+    session = mocker.MagicMock()
+    count = _get_entity_search_count(
+        session, Query(EntityOrm), {"limit": 10, "after_entity": 500}, 10
+    )
+
+    assert count is None
+    session.query.assert_not_called()
+
+
+def test__get_entity_search_count_uses_short_first_cursor_page(mocker):
+    session = mocker.MagicMock()
+    count = _get_entity_search_count(
+        session, Query(EntityOrm), {"limit": 10, "after_entity": 0}, 4
+    )
+
+    assert count == 4
+    session.query.assert_not_called()
+
+
+def test__get_entity_search_count_estimated_reads_plan(mocker):
+    session = mocker.MagicMock()
+    estimate = mocker.patch(
+        "application.data_access.entity_queries._estimate_count", return_value=5000
+    )
+    count = _get_entity_search_count(
+        session,
+        Query(EntityOrm),
+        {"limit": 10, "count_mode": CountOption.estimated},
+        10,
+    )
+
+    assert count == 5000
+    estimate.assert_called_once()
+    session.query.assert_not_called()
+
+
+def test__get_entity_search_count_estimate_is_not_below_rows_seen(mocker):
+    mocker.patch(
+        "application.data_access.entity_queries._estimate_count", return_value=5
+    )
+    count = _get_entity_search_count(
+        mocker.MagicMock(),
+        Query(EntityOrm),
+        {"limit": 10, "offset": 20, "count_mode": CountOption.estimated},
+        10,
+    )
+
+    assert count == 30
+
+
+def test__get_page_and_count_adds_window_count(mocker):
+    entity_orm = EntityOrm(entity=1)
+    row = mocker.MagicMock(search_count=42)
+    row.__getitem__.return_value = entity_orm
+    query = mocker.MagicMock()
+    query.add_columns.return_value.all.return_value = [row]
+
+    entity_orms, count = _get_page_and_count(query, {"limit": 10})
+
+    assert entity_orms == [entity_orm]
+    assert count == 42
+    window = query.add_columns.call_args.args[0]
+    assert "count(*) OVER ()" in str(window)
+
+
+def test__get_page_and_count_no_window_after_cursor(mocker):
+    query = mocker.MagicMock()
+    query.all.return_value = []
+
+    entity_orms, count = _get_page_and_count(query, {"limit": 10, "after_entity": 5})
+
+    assert count is None
+    query.add_columns.assert_not_called()
+
+
+def test__get_page_and_count_no_window_when_not_exact(mocker):
+    query = mocker.MagicMock()
+    query.all.return_value = []
+
+    _, count = _get_page_and_count(
+        query, {"limit": 10, "count_mode": CountOption.estimated}
+    )
+
+    assert count is None
+    query.add_columns.assert_not_called()
+
+
+def test_stream_entity_search_reads_through_server_side_cursor(mocker):
+    session = mocker.MagicMock()
+    query = session.query.return_value
+    query.filter.return_value = query
+    query.order_by.return_value = query
+    query.with_entities.return_value = query
+    query.yield_per.return_value = iter([EntityOrm(entity=1), EntityOrm(entity=2)])
+
+    entities = list(
+        stream_entity_search(
+            session, {"dataset": ["tree"], "limit": 10, "offset": 20}, yield_per=50
+        )
+    )
+
+    assert [e.entity for e in entities] == [1, 2]
+    query.yield_per.assert_called_once_with(50)
+    # the export isn't paged so limit and offset are dropped
+    query.limit.assert_not_called()
+    query.offset.assert_not_called()
+
+
+def test_stream_entity_search_documents_fills_summary_once_read(mocker):
+    session = mocker.MagicMock()
+    query = session.query.return_value
+    query.filter.return_value = query
+    query.order_by.return_value = query
+    query.limit.return_value = query
+    query.with_entities.return_value = query
+    query.add_columns.return_value = query
+    rows = [
+        _document_row(mocker, '{"entity": 1}', entity=1, search_count=7),
+        # an entity without a geometry has no feature
+        _document_row(mocker, None, entity=2, search_count=7),
+    ]
+    query.yield_per.return_value = iter(rows)
+
+    summary, documents = stream_entity_search_documents(
+        session, {"dataset": ["tree"], "limit": 2}, SuffixEntity.geojson, yield_per=25
+    )
+
+    # the query runs straight away, the rest is filled in as it's read
+    query.yield_per.assert_called_once_with(25)
+    assert summary["count"] is None
+
+    assert list(documents) == ['{"entity": 1}']
+    assert summary["count"] == 7
+    assert summary["page_size"] == 2
+    assert summary["last_entity"] == 2
+
+
+def test_stream_entity_search_documents_does_not_count_after_cursor(mocker):
+    session = mocker.MagicMock()
+    query = session.query.return_value
+    query.filter.return_value = query
+    query.order_by.return_value = query
+    query.limit.return_value = query
+    query.with_entities.return_value = query
+    query.yield_per.return_value = iter(
+        [
+            _document_row(mocker, '{"entity": 11}', entity=11),
+            _document_row(mocker, '{"entity": 12}', entity=12),
+        ]
+    )
+
+    summary, documents = stream_entity_search_documents(
+        session, {"limit": 2, "after_entity": 10}, SuffixEntity.json
+    )
+
+    assert len(list(documents)) == 2
+    assert summary["count"] is None
+    assert summary["last_entity"] == 12
+    query.add_columns.assert_not_called()
+    # only the search itself was queried
+    session.query.assert_called_once()
+
+
+def test_stream_entity_search_documents_raises_query_errors_straight_away(mocker):
+    session = mocker.MagicMock()
+    query = session.query.return_value
+    query.filter.return_value = query
+    query.order_by.return_value = query
+    query.limit.return_value = query
+    query.with_entities.return_value = query
+    query.add_columns.return_value = query
+    query.yield_per.side_effect = OperationalError(
+        "SELECT", {}, Exception("canceling statement due to statement timeout")
+    )
+
+    with pytest.raises(OperationalError):
+        stream_entity_search_documents(session, {"limit": 10}, SuffixEntity.json)
+
+
+def test_stream_entity_search_documents_explains_slow_searches(mocker):
+    session = mocker.MagicMock()
+    query = session.query.return_value
+    query.filter.return_value = query
+    query.order_by.return_value = query
+    query.limit.return_value = query
+    query.with_entities.return_value = query
+    query.add_columns.return_value = query
+    collecting = []
+
+    def run_query(yield_per):
+        collecting.append(_statements.get())
+        return iter([_document_row(mocker, '{"entity": 1}', entity=1, search_count=1)])
+
+    query.yield_per.side_effect = run_query
+    clock = mocker.patch("application.core.utils.time.time")
+    clock.side_effect = [0.0, 2.0]
+    capture = mocker.patch("application.core.utils.capture_slow_queries")
+
+    _, documents = stream_entity_search_documents(
+        session, {"limit": 10}, SuffixEntity.json
+    )
+    capture.assert_not_called()
+    list(documents)
+
+    function, elapsed, statements = capture.call_args.args
+    assert function == "stream_entity_search_documents"
+    assert elapsed == 2.0
+    # the search's statements were collected for explaining
+    assert collecting == [statements]
+
+
+def test_stream_entity_search_documents_counts_short_page_without_window(mocker):
+    session = mocker.MagicMock()
+    query = session.query.return_value
+    query.filter.return_value = query
+    query.order_by.return_value = query
+    query.limit.return_value = query
+    query.with_entities.return_value = query
+    query.yield_per.return_value = iter(
+        [_document_row(mocker, '{"entity": 5}', entity=5)]
+    )
+
+    summary, documents = stream_entity_search_documents(
+        session, {"limit": 10, "count_mode": CountOption.none}, SuffixEntity.json
+    )
+    list(documents)
+
+    query.add_columns.assert_not_called()
+    assert summary["count"] == 1
+    assert summary["last_entity"] == 5
+
+
+def _compile(expression):
+    return str(
+        Query([EntityOrm.entity, expression.label("document")]).statement.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def test_entity_json_document_writes_every_field_by_alias():
+    sql = _compile(_entity_json_document({}))
+
+    assert "jsonb_build_object('entry-date'" in sql
+    assert "'organisation-entity', coalesce(to_jsonb(entity.organisation_entity)" in sql
+    # the geometries are written as WKT by _entity_document
+    assert "entity.geometry" not in sql
+    # json fields are written in kebab case and replace the columns
+    assert ") || coalesce((SELECT jsonb_object_agg(replace(anon_1.key, '_', '-')" in sql
+    assert "jsonb_each(entity.json)" in sql
+    assert "'geojson'" not in sql
+    assert "WHERE" not in sql
+
+
+def test_entity_json_document_only_writes_included_fields():
+    sql = _compile(_entity_json_document({}, include={"name"}))
+
+    assert "jsonb_build_object('entity', coalesce(to_jsonb(entity.entity)" in sql
+    assert "'name', coalesce(to_jsonb(entity.name)" in sql
+    assert "'dataset'" not in sql
+    # fields from the json column are only kept when asked for
+    assert "replace(anon_1.key, '_', '-') IN ('entity', 'name')" in sql
+
+
+def test_entity_json_document_leaves_out_excluded_fields():
+    sql = _compile(_entity_json_document({}, exclude={"organisation_entity", "prefix"}))
+
+    assert "'organisation-entity', coalesce" not in sql
+    assert "'prefix', coalesce" not in sql
+    assert "NOT IN ('organisation-entity', 'prefix')" in sql
+
+
+def test_entity_geojson_document_keeps_geometry_out_of_properties():
+    sql = _compile(_entity_geojson_document({}, exclude={"notes"}))
+
+    assert (
+        "jsonb_build_object('geometry', CAST(coalesce(ST_AsGeoJSON(entity.geometry)"
+        in sql
+    )
+    assert "'type', 'Feature', 'properties'" in sql
+    assert "ST_AsText" not in sql
+    assert "NOT IN ('geometry', 'notes', 'point')" in sql
+
+
+def test_entity_geojson_document_simplifies_and_rounds_geometry():
+    sql = _compile(_entity_geojson_document({"simplify": 0.0001, "precision": 6}))
+
+    assert (
+        "ST_AsGeoJSON(ST_SimplifyPreserveTopology(entity.geometry, 0.0001), 6)" in sql
+    )
+    assert "ST_AsGeoJSON(ST_SimplifyPreserveTopology(entity.point, 0.0001), 6)" in sql
+
+
+def _compile_columns(columns):
+    return str(
+        Query([EntityOrm.entity, *columns]).statement.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def test_entity_document_columns_select_the_geometries_asked_for():
+    columns, geometry_fields = _entity_document_columns(
+        {"simplify": 0.0001}, SuffixEntity.json, exclude={"point"}
+    )
+    sql = _compile_columns(columns)
+
+    assert geometry_fields == ["geometry"]
+    assert "ST_SimplifyPreserveTopology(entity.geometry, 0.0001)) AS geometry" in sql
+    assert "coalesce(entity.json ? 'geometry', false) AS json_geometry" in sql
+    assert "entity.point" not in sql
+    assert (
+        "jsonb_path_exists(entity.json, '$.*.**{1 to last} ? (@ == null)'::jsonpath)"
+        " AS nested_nulls" in sql
+    )
+
+
+def test_entity_document_columns_leave_geometries_to_geojson_document():
+    columns, geometry_fields = _entity_document_columns({}, SuffixEntity.geojson)
+
+    assert geometry_fields == []
+    assert " AS geometry," not in _compile_columns(columns)
+
+
+def _document_row(mocker, document, **columns):
+    values = {
+        "nested_nulls": False,
+        "geometry": None,
+        "json_geometry": False,
+        "point": None,
+        "json_point": False,
+    }
+    return mocker.MagicMock(document=document, **{**values, **columns})
+
+
+def test_entity_document_writes_geometries_as_entity_model_wkt(mocker):
+    polygon = Polygon([(0.1, 50.98673712345678), (0.3, 51), (0.2, 51.1)])
+    row = _document_row(
+        mocker,
+        '{"entity": 1}',
+        geometry=from_shape(MultiPolygon([polygon]), srid=4326),
+    )
+
+    assert _entity_document(row, ["geometry", "point"]) == (
+        '{"entity": 1, "geometry": "MULTIPOLYGON (((0.1 50.98673712345678, '
+        '0.3 51, 0.2 51.1, 0.1 50.98673712345678)))", "point": ""}'
+    )
+
+
+def test_entity_document_rounds_wkt_to_precision(mocker):
+    row = _document_row(
+        mocker, '{"entity": 1}', point=from_shape(Point(-0.123456789, 51.5))
+    )
+
+    assert _entity_document(row, ["point"], 5) == (
+        '{"entity": 1, "point": "POINT (-0.12346 51.5)"}'
+    )
+
+
+def test_entity_document_keeps_geometry_from_json(mocker):
+    row = _document_row(
+        mocker,
+        '{"entity": 1, "geometry": "POINT (1 2)"}',
+        geometry=from_shape(Point(3, 4)),
+        json_geometry=True,
+    )
+
+    assert _entity_document(row, ["geometry"]) == (
+        '{"entity": 1, "geometry": "POINT (1 2)"}'
+    )
+
+
+def test_entity_document_writes_nested_nulls_as_empty_strings(mocker):
+    row = _document_row(
+        mocker, '{"entity": 1, "notes": [{"a": null}, null]}', nested_nulls=True
+    )
+
+    assert _entity_document(row, []) == '{"entity": 1, "notes": [{"a": ""}, ""]}'
+
+
+def test_entity_document_leaves_missing_features(mocker):
+    assert _entity_document(_document_row(mocker, None), []) is None
+
+
+def test_entity_documents_are_built_once_for_each_shape():
+    assert _entity_json_document({"limit": 10}, include={"name"}) is (
+        _entity_json_document({"limit": 50}, include={"name"})
+    )
+    assert _entity_json_document({}, include={"name"}) is not (
+        _entity_json_document({}, include={"reference"})
+    )
+    assert _entity_geojson_document({"precision": 6}) is not (
+        _entity_geojson_document({"precision": 5})
+    )
+
+
+@pytest.mark.parametrize(
+    "params, other_params",
+    [
+        (
+            {"dataset": ["tree"], "limit": 10},
+            {"dataset": ["conservation-area", "tree"], "limit": 100},
+        ),
+        (
+            {"longitude": -0.1, "latitude": 51.5, "limit": 10},
+            {"longitude": -1.2, "latitude": 52.1, "limit": 10},
+        ),
+        ({"bbox": "-0.2,51.4,0.1,51.6"}, {"bbox": "-1,50,1,52"}),
+        ({"geometry_curie": ["a:1"]}, {"geometry_curie": ["b:2"]}),
+        (
+            {"curie": ["a:1"], "entries_before": "2020-01-01"},
+            {"curie": ["b:2"], "entries_before": "2024-06-01"},
+        ),
+    ],
+)
+def test_searches_of_the_same_shape_share_a_compiled_statement(
+    mocker, params, other_params
+):
+    session = mocker.MagicMock()
+    session.query.side_effect = Query
+    session.info = {}
+
+    def cache_key(params):
+        params = normalised_params(params)
+        query = _build_entity_search_query(session, params)
+        query = _apply_limit_and_pagination_filters(query, params)
+        document = _entity_json_document(params)
+        query = query.with_entities(EntityOrm.entity, document.label("document"))
+        # SQLAlchemy compiles a statement once for each cache key and binds
+        # the values it extracts on every execution
+        return query.statement._generate_cache_key().key
+
+    assert cache_key(params) == cache_key(other_params)
+
+
+def test_apply_geojson_expressions_replaces_entity_geojson():
+    query = _apply_geojson_expressions(Query(EntityOrm), {"precision": 6})
+    sql = str(query.statement.compile(dialect=postgresql.dialect()))
+
+    assert "ST_AsGeoJSON(entity.geometry, %(ST_AsGeoJSON_2)s)" in sql
+
+
+def test_apply_geojson_expressions_ignores_column_queries():
+    query = Query(EntityOrm).with_entities(*EntityOrm.__table__.columns)
+
+    assert _apply_geojson_expressions(query, {"precision": 6}) is query
+
+
+def test_get_point_lookup_joins_points_in_one_statement(mocker):
+    session = mocker.MagicMock()
+    orm = EntityOrm(entity=5, dataset="conservation-area")
+    session.execute.return_value.all.return_value = [(1, orm)]
+
+    results = get_point_lookup(session, [(-0.1, 51.5), (-0.2, 51.6)])
+
+    assert [[e.entity for e in point] for point in results] == [[], [5]]
+    session.execute.assert_called_once()
+    sql = str(
+        session.execute.call_args.args[0].compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+    assert "(VALUES (0, -0.1, 51.5), (1, -0.2, 51.6)) AS points" in sql
+    assert (
+        "ST_Intersects(entity_subdivided_1.geometry_subdivided, "
+        "ST_SetSRID(ST_MakePoint(points.longitude, points.latitude), 4326))" in sql
+    )
+    assert "ST_Intersects(entity.geometry, ST_SetSRID(" in sql
+    assert " UNION " in sql
+    assert "ORDER BY anon_1.point, entity.entity" in sql
+
+
+def test_get_point_lookup_only_searches_requested_datasets(mocker):
+    session = mocker.MagicMock()
+    session.execute.return_value.all.return_value = []
+
+    get_point_lookup(session, [(-0.1, 51.5)], ["conservation-area"])
+
+    sql = str(
+        session.execute.call_args.args[0].compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+    assert "entity_subdivided" not in sql
+    assert "entity.dataset IN ('conservation-area')" in sql
+    assert "SELECT DISTINCT" in sql
+
+
+def test_stream_entities_by_id_resolves_moves_and_keeps_order(mocker):
+    session = mocker.MagicMock()
+    session.query.return_value.filter.return_value.all.return_value = [
+        mocker.MagicMock(old_entity_id=9, status=301, new_entity_id=1),
+        mocker.MagicMock(old_entity_id=8, status=410, new_entity_id=None),
+    ]
+    session.query.side_effect = [session.query.return_value, Query(EntityOrm.entity)]
+    yield_per = mocker.patch.object(
+        Query,
+        "yield_per",
+        autospec=True,
+        return_value=iter(
+            [
+                _document_row(mocker, '{"entity": 3}', entity=3),
+                _document_row(mocker, '{"entity": 1}', entity=1),
+            ]
+        ),
+    )
+
+    summary, documents = stream_entities_by_id(session, [3, 9, 8, 7], include={"point"})
+
+    assert list(documents) == [
+        '{"entity": 3, "point": ""}',
+        '{"entity": 1, "point": ""}',
+    ]
+    assert summary == {"moved": {9: 1}, "gone": [8], "not_found": [7]}
+    sql = str(
+        yield_per.call_args.args[0].statement.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+    assert (
+        "JOIN unnest(ARRAY[3, 1, 7]) WITH ORDINALITY AS requested(entity, position)"
+        in sql
+    )
+    assert "ORDER BY requested.position" in sql
@@ -0,0 +1,72 @@
+import json
+from unittest.mock import MagicMock
+
+import redis
+from sqlalchemy.dialects import postgresql
+
+from application.data_access.point_cell_cache import (
+    get_cached_point_cell,
+    get_point_cell,
+    get_point_cell_envelope,
+    get_point_cell_key,
+)
+
+
+def test_get_point_cell_is_shared_by_nearby_points():
+    assert get_point_cell(-0.12771, 51.50741) == get_point_cell(-0.12769, 51.50749)
+    assert get_point_cell(-0.12771, 51.50741) != get_point_cell(-0.12649, 51.50741)
+
+
+def test_get_point_cell_envelope_holds_the_point():
+    cell = get_point_cell("-0.2", "53.38")
+    sql = str(
+        get_point_cell_envelope(cell).compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+    minx, miny, maxx, maxy, srid = [
+        float(v) for v in sql[len("ST_MakeEnvelope(") : -1].split(",")
+    ]
+    assert minx <= -0.2 < maxx
+    assert miny <= 53.38 < maxy
+    assert srid == 4326
+
+
+def test_get_point_cell_key_is_versioned_by_release_and_datasets():
+    assert get_point_cell_key("abc", [], (1, 2)) == "point-cell:abc:all:1/2"
+    assert (
+        get_point_cell_key("def", ["green-belt", "tree"], (1, 2))
+        == "point-cell:def:green-belt,tree:1/2"
+    )
+
+
+def test_get_cached_point_cell_builds_and_caches_on_miss():
+    cache = MagicMock()
+    cache.get.return_value = None
+    candidates = {"covered": [1], "straddling": [2]}
+
+    assert get_cached_point_cell(cache, "key", lambda: candidates) == candidates
+    assert cache.setex.call_args.args[0] == "key"
+    assert json.loads(cache.setex.call_args.args[2]) == candidates
+
+
+def test_get_cached_point_cell_uses_cached_candidates():
+    cache = MagicMock()
+    cache.get.return_value = '{"covered": [1], "straddling": []}'
+    build = MagicMock()
+
+    assert get_cached_point_cell(cache, "key", build) == {
+        "covered": [1],
+        "straddling": [],
+    }
+    build.assert_not_called()
+
+
+def test_get_cached_point_cell_without_redis():
+    cache = MagicMock()
+    cache.get.side_effect = redis.exceptions.ConnectionError()
+    cache.setex.side_effect = redis.exceptions.ConnectionError()
+
+    assert get_cached_point_cell(cache, "key", lambda: {"covered": []}) == {
+        "covered": []
+    }
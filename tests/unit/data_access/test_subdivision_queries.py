@@ -0,0 +1,49 @@
+from unittest.mock import MagicMock
+
+from sqlalchemy.dialects import postgresql
+
+from application.data_access.subdivision_queries import rebuild_entity_subdivided
+
+
+def _compile(statement):
+    return str(
+        statement.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def test_rebuild_entity_subdivided_subdivides_large_datasets():
+    session = MagicMock()
+    session.scalars.return_value = ["green-belt"]
+
+    datasets = rebuild_entity_subdivided(
+        session, vertex_threshold=5000, max_vertices=64
+    )
+
+    assert datasets == ["green-belt"]
+    selected = _compile(session.scalars.call_args.args[0])
+    assert "ST_NPoints(entity.geometry) > 5000" in selected
+
+    statements = [call.args[0] for call in session.execute.call_args_list]
+    assert _compile(statements[0]) == "DELETE FROM entity_subdivided"
+    assert _compile(statements[1]) == "DELETE FROM dataset_subdivided"
+    pieces = _compile(statements[2])
+    assert "INSERT INTO entity_subdivided (entity, dataset, geometry_subdivided)" in (
+        pieces
+    )
+    assert "ST_Multi(ST_Subdivide(entity.geometry, 64))" in pieces
+    assert "entity.dataset IN ('green-belt')" in pieces
+    assert session.execute.call_args_list[3].args[1] == [
+        {"dataset": "green-belt", "max_vertices": 64}
+    ]
+    session.commit.assert_called_once()
+
+
+def test_rebuild_entity_subdivided_clears_routing_when_nothing_is_large():
+    session = MagicMock()
+    session.scalars.return_value = []
+
+    assert rebuild_entity_subdivided(session) == []
+    assert session.execute.call_count == 2
+    session.commit.assert_called_once()
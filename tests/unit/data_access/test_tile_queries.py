@@ -0,0 +1,77 @@
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from application.data_access.tile_queries import (
+    get_dataset_data_versions,
+    get_entity_tile,
+    get_tile_dataset_names,
+)
+
+
+@pytest.fixture(autouse=True)
+def subdivided_datasets(mocker):
+    return mocker.patch(
+        "application.data_access.tile_queries.get_subdivided_datasets",
+        return_value=["flood-risk-zone"],
+    )
+
+
+def _tile_sql(dataset):
+    session = MagicMock()
+    session.execute.return_value.scalar.return_value = b"tile"
+    assert get_entity_tile(session, dataset, 10, 511, 340) == b"tile"
+    statement = session.execute.call_args.args[0]
+    return str(
+        statement.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def test_get_entity_tile_draws_entity_geometries():
+    sql = _tile_sql("tree")
+
+    assert "ST_AsMVT(features, 'tree', 4096, 'geometry')" in sql
+    assert (
+        "ST_AsMVTGeom(ST_Transform(coalesce(entity.geometry, entity.point), 3857)"
+        in sql
+    )
+    assert "entity.point && ST_Transform(ST_TileEnvelope(10, 511, 340), 4326)" in sql
+    assert "entity_subdivided" not in sql
+    assert "LIMIT 20000" in sql
+
+
+def test_get_entity_tile_draws_complex_datasets_from_subdivided_geometries():
+    sql = _tile_sql("flood-risk-zone")
+
+    assert "ST_Transform(entity_subdivided.geometry_subdivided, 3857)" in sql
+    assert "JOIN entity_subdivided ON entity_subdivided.entity = entity.entity" in sql
+
+
+def test_get_entity_tile_returns_empty_tile_without_features():
+    session = MagicMock()
+    session.execute.return_value.scalar.return_value = None
+    assert get_entity_tile(session, "tree", 0, 0, 0) == b""
+
+
+def test_get_dataset_data_versions_is_cached():
+    session = MagicMock()
+    session.query.return_value.all.return_value = [("tree", "abc123")]
+
+    assert get_dataset_data_versions(session) == {"tree": "abc123"}
+    assert get_dataset_data_versions(session) == {"tree": "abc123"}
+    session.query.assert_called_once()
+
+
+def test_get_tile_dataset_names_is_cached(mocker):
+    get_dataset_names = mocker.patch(
+        "application.data_access.tile_queries.get_dataset_names",
+        return_value=["tree"],
+    )
+    session = MagicMock()
+
+    assert get_tile_dataset_names(session) == ["tree"]
+    assert get_tile_dataset_names(session) == ["tree"]
+    get_dataset_names.assert_called_once_with(session)
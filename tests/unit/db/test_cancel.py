@@ -0,0 +1,122 @@
+import asyncio
+
+from unittest.mock import MagicMock
+
+from application.db import cancel
+from application.db.cancel import cancel_backends, request_backends
+from application.factory import CancelQueriesOnDisconnectMiddleware
+
+
+def run_middleware(mocker, app, messages, method="GET", readers=None):
+    cancelled = []
+    mocker.patch(
+        "application.factory.cancel_backends",
+        lambda backends: cancelled.append(backends),
+    )
+    sent = []
+    readers = readers if readers is not None else {"now": 0, "most": 0}
+
+    async def receive():
+        readers["now"] += 1
+        readers["most"] = max(readers["most"], readers["now"])
+        try:
+            await asyncio.sleep(0.01)
+            if messages:
+                return messages.pop(0)
+            await asyncio.sleep(60)
+        finally:
+            readers["now"] -= 1
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method}
+    asyncio.run(CancelQueriesOnDisconnectMiddleware(app)(scope, receive, send))
+    return cancelled, sent
+
+
+def test_cancels_the_request_backends_when_the_client_disconnects(mocker):
+    async def app(scope, receive, send):
+        request_backends.get().add(("postgresql://db", 1234))
+        await asyncio.sleep(0.05)
+
+    cancelled, _ = run_middleware(
+        mocker,
+        app,
+        [{"type": "http.request", "body": b""}, {"type": "http.disconnect"}],
+    )
+
+    assert cancelled == [{("postgresql://db", 1234)}]
+
+
+def test_does_not_cancel_once_the_response_is_sent(mocker):
+    async def app(scope, receive, send):
+        request_backends.get().add(("postgresql://db", 1234))
+        await send({"type": "http.response.body", "body": b""})
+        await asyncio.sleep(0.05)
+
+    cancelled, sent = run_middleware(
+        mocker,
+        app,
+        [{"type": "http.request", "body": b""}, {"type": "http.disconnect"}],
+    )
+
+    assert cancelled == []
+    assert sent == [{"type": "http.response.body", "body": b""}]
+
+
+def test_leaves_the_request_body_to_the_app(mocker):
+    bodies = []
+
+    async def app(scope, receive, send):
+        bodies.append(await receive())
+        await asyncio.sleep(0.05)
+
+    cancelled, _ = run_middleware(
+        mocker,
+        app,
+        [{"type": "http.request", "body": b"{}"}, {"type": "http.disconnect"}],
+        method="POST",
+    )
+
+    assert bodies == [{"type": "http.request", "body": b"{}"}]
+    assert cancelled == []
+
+
+def test_only_one_reader_waits_on_the_server(mocker):
+    received = []
+
+    async def app(scope, receive, send):
+        request_backends.get().add(("postgresql://db", 1234))
+        received.append(await receive())
+        # listens for the disconnect after the body, as a streamed response does
+        received.append(await receive())
+        received.append(await receive())
+
+    readers = {"now": 0, "most": 0}
+    cancelled, _ = run_middleware(
+        mocker,
+        app,
+        [{"type": "http.request", "body": b"{}"}, {"type": "http.disconnect"}],
+        method="POST",
+        readers=readers,
+    )
+
+    assert received == [
+        {"type": "http.request", "body": b"{}"},
+        {"type": "http.disconnect"},
+        {"type": "http.disconnect"},
+    ]
+    assert readers["most"] == 1
+    assert cancelled == [{("postgresql://db", 1234)}]
+
+
+def test_cancel_backends_calls_pg_cancel_backend(mocker):
+    engine = MagicMock()
+    mocker.patch.object(cancel, "_get_cancel_engine", return_value=engine)
+
+    cancel_backends({("postgresql://db", 1234)})
+
+    statement = engine.connect.return_value.__enter__.return_value.execute.call_args
+    sql = str(statement.args[0].compile(compile_kwargs={"literal_binds": True}))
+    assert sql == "SELECT pg_cancel_backend(1234) AS pg_cancel_backend_1"
@@ -0,0 +1,163 @@
+import pytest
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from application.db.replicas import (
+    ReadReplica,
+    ReadReplicaRouter,
+    ReadSession,
+    create_read_replica_router,
+    set_query_type,
+)
+from application.settings import Settings
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def first_choice(population, weights):
+    return [population[0]]
+
+
+def make_replica(url="sqlite://", weight=1):
+    return ReadReplica(url=url, weight=weight, engine=create_engine(url))
+
+
+def test_choose_weights_the_healthy_replicas():
+    replicas = [make_replica(weight=3), make_replica(weight=1)]
+    calls = []
+
+    def choices(population, weights):
+        calls.append((population, weights))
+        return [population[-1]]
+
+    router = ReadReplicaRouter(replicas, choices=choices)
+
+    assert router.choose() is replicas[1]
+    assert calls == [(replicas, [3, 1])]
+
+
+def test_choose_skips_a_failed_replica_until_it_is_retried():
+    clock = Clock()
+    replicas = [make_replica(), make_replica()]
+    router = ReadReplicaRouter(
+        replicas, retry_seconds=30, clock=clock, choices=first_choice
+    )
+
+    router.mark_failed(replicas[0])
+    assert router.choose() is replicas[1]
+
+    clock.now += 30
+    assert router.choose() is replicas[0]
+
+
+def test_choose_uses_every_replica_when_all_have_failed():
+    replicas = [make_replica(), make_replica()]
+    router = ReadReplicaRouter(replicas, choices=first_choice)
+
+    for replica in replicas:
+        router.mark_failed(replica)
+
+    assert router.choose() is replicas[0]
+
+
+def test_choose_sticks_a_query_type_to_its_healthy_replica():
+    replicas = [make_replica(), make_replica()]
+    router = ReadReplicaRouter(
+        replicas, routes={"spatial": replicas[1]}, choices=first_choice
+    )
+
+    assert router.choose("spatial") is replicas[1]
+    assert router.choose("other") is replicas[0]
+
+    router.mark_failed(replicas[1])
+    assert router.choose("spatial") is replicas[0]
+
+
+def test_connecting_marks_a_replica_healthy():
+    replica = make_replica()
+    router = ReadReplicaRouter([replica])
+    router.mark_failed(replica)
+
+    with replica.engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+    assert replica.failed_at is None
+
+
+def test_failing_to_connect_marks_a_replica_failed(tmp_path):
+    replica = make_replica(f"sqlite:///{tmp_path}/missing/db.sqlite")
+    router = ReadReplicaRouter([replica])
+
+    with pytest.raises(OperationalError):
+        replica.engine.connect()
+
+    assert replica.failed_at is not None
+    assert router.healthy() == []
+
+
+def test_read_session_keeps_one_replica_per_query_type():
+    replicas = [make_replica(), make_replica()]
+    routes = {"spatial": replicas[1]}
+    router = ReadReplicaRouter(replicas, routes=routes, choices=first_choice)
+    session = ReadSession(read_replicas=router)
+
+    assert session.get_bind() is replicas[0].engine
+    set_query_type(session, "spatial")
+    assert session.get_bind() is replicas[1].engine
+
+    router.mark_failed(replicas[1])
+    assert session.get_bind() is replicas[1].engine
+
+
+def settings(**kwargs):
+    return Settings(
+        READ_DATABASE_URL="sqlite://",
+        WRITE_DATABASE_URL="sqlite://",
+        ENVIRONMENT="test",
+        DATASETTE_URL="http://localhost",
+        DATA_FILE_URL="http://localhost",
+        **kwargs,
+    )
+
+
+def test_create_read_replica_router_lists_read_database_first():
+    labels = []
+
+    def create(url, label):
+        labels.append(label)
+        return create_engine(url)
+
+    router = create_read_replica_router(
+        settings(
+            READ_REPLICA_URLS=["sqlite:///replica.db"],
+            READ_DATABASE_WEIGHTS=[1, 4],
+            READ_DATABASE_ROUTES={"spatial": 1},
+        ),
+        create,
+    )
+
+    assert [r.url for r in router.replicas] == ["sqlite://", "sqlite:///replica.db"]
+    assert [r.weight for r in router.replicas] == [1, 4]
+    assert router.routes == {"spatial": router.replicas[1]}
+    # metrics are labelled without the hosts
+    assert labels == ["read", "replica-1"]
+
+
+@pytest.mark.parametrize(
+    "read_databases",
+    [
+        {"READ_DATABASE_WEIGHTS": [1, 1]},
+        {"READ_DATABASE_WEIGHTS": [0]},
+        {"READ_DATABASE_ROUTES": {"spatial": 1}},
+    ],
+)
+def test_settings_reject_read_databases_that_do_not_match(read_databases):
+    with pytest.raises(ValueError):
+        settings(**read_databases)
@@ -24,3 +24,34 @@ def test__session_cache():
 
     assert cached_fn("B") == 2
     assert len(cache) == 1
+
+
+def test__apply_statement_timeout_sets_the_session_budget(mocker):
+    db_session = mocker.MagicMock()
+    db_session.info = {"statement_timeouts": {"search": 30000, "entity": 10000}}
+    connection = mocker.MagicMock()
+
+    session.set_statement_timeout(db_session, "search")
+    session._apply_statement_timeout(db_session, None, connection)
+
+    statement = connection.execute.call_args.args[0]
+    sql = str(statement.compile(compile_kwargs={"literal_binds": True}))
+    assert "set_config('statement_timeout', '30000', true)" in sql
+
+
+def test__apply_statement_timeout_without_a_budget(mocker):
+    db_session = mocker.MagicMock()
+    db_session.info = {"statement_timeouts": {"search": 30000}}
+    connection = mocker.MagicMock()
+
+    session._apply_statement_timeout(db_session, None, connection)
+
+    connection.execute.assert_not_called()
+
+
+def test_get_timed_session_sets_the_budget(mocker):
+    db_session = mocker.MagicMock()
+    db_session.info = {}
+
+    assert session.get_search_session(db_session) is db_session
+    assert db_session.info["statement_timeout"] == "search"
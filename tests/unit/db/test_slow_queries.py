@@ -0,0 +1,96 @@
+from sqlalchemy import create_engine, text
+
+from application.db import slow_queries
+from application.db.slow_queries import (
+    ExecutedStatement,
+    SlowQueryCapture,
+    collect_statements,
+    track_statement_times,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_track_statement_times_only_while_collecting():
+    engine = create_engine("sqlite://")
+    track_statement_times(engine)
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        with collect_statements() as statements:
+            connection.execute(text("SELECT :value"), {"value": 2})
+        connection.execute(text("SELECT 3"))
+
+    assert [s.statement for s in statements] == ["SELECT ?"]
+    assert statements[0].parameters == (2,)
+    assert statements[0].engine is engine
+    assert statements[0].seconds >= 0
+
+
+def test_should_capture_samples_and_rate_limits():
+    clock = Clock()
+    samples = iter([0.9, 0.1, 0.1, 0.1])
+    capture = SlowQueryCapture(
+        sample_rate=0.5, interval_seconds=60, clock=clock, sample=lambda: next(samples)
+    )
+
+    assert not capture.should_capture()
+    assert capture.should_capture()
+    assert not capture.should_capture()
+    clock.now += 60
+    assert capture.should_capture()
+
+
+def test_should_capture_is_off_by_default():
+    assert not SlowQueryCapture().should_capture()
+
+
+def test_capture_keeps_the_slowest_statement_in_a_ring_buffer(mocker):
+    mocker.patch.object(slow_queries, "_explain", return_value=[{"Plan": {}}])
+    capture = SlowQueryCapture(size=2)
+    engine = mocker.MagicMock()
+
+    for function in ["first", "second", "third"]:
+        capture.capture(
+            function,
+            2.5,
+            [
+                ExecutedStatement(engine, "SELECT 1", {}, 0.1),
+                ExecutedStatement(
+                    engine,
+                    "SELECT %(entity)s",
+                    {"entity": 1},
+                    2.0,
+                    query="SELECT 1",
+                ),
+            ],
+        )
+
+    assert [r["function"] for r in capture.records] == ["second", "third"]
+    record = capture.records[-1]
+    assert record["sql"] == "SELECT 1"
+    assert record["parameters"] == {"entity": 1}
+    assert record["statement_seconds"] == 2.0
+    assert record["statements"] == 2
+    assert record["plan"] == [{"Plan": {}}]
+
+
+def test_explain_runs_the_statement_with_its_parameters(mocker):
+    engine = mocker.MagicMock()
+    connection = engine.connect.return_value.__enter__.return_value
+    connection.exec_driver_sql.return_value.scalar.return_value = [{"Plan": {}}]
+
+    plan = slow_queries._explain(
+        ExecutedStatement(engine, "SELECT %(entity)s", {"entity": 1}, 2.0)
+    )
+
+    assert plan == [{"Plan": {}}]
+    connection.exec_driver_sql.assert_called_once_with(
+        "EXPLAIN (FORMAT JSON) SELECT %(entity)s", {"entity": 1}
+    )
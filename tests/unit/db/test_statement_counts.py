@@ -0,0 +1,63 @@
+import asyncio
+import logging
+
+from sqlalchemy import create_engine, text
+
+from application.db.statement_counts import (
+    StatementCounter,
+    count_statements,
+    counting_statements,
+    warn_repeated_statements,
+)
+from application.factory import StatementCountMiddleware
+
+
+def test_statements_are_counted_by_shape_within_a_request():
+    engine = create_engine("sqlite://")
+    count_statements(engine)
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 0"))
+        with counting_statements() as counter:
+            for entity in range(3):
+                connection.execute(text("SELECT :entity"), {"entity": entity})
+            connection.execute(text("SELECT 'dataset'"))
+
+    assert counter.total == 4
+    assert counter.statements["SELECT ?"] == 3
+    assert counter.repeated(2) == {"SELECT ?": 3}
+
+
+def test_warns_about_statements_repeated_more_than_the_threshold(caplog):
+    counter = StatementCounter()
+    for _ in range(6):
+        counter.add("SELECT * FROM entity WHERE entity = %(entity)s")
+    counter.add("SELECT * FROM dataset")
+
+    with caplog.at_level(logging.WARNING):
+        warn_repeated_statements(counter, 5, "/entity/1")
+        warn_repeated_statements(counter, 6, "/entity/1")
+
+    [record] = caplog.records
+    assert record.path == "/entity/1"
+    assert record.statements == 7
+    assert record.repeated_statements == [
+        {"statement": "SELECT * FROM entity WHERE entity = %(entity)s", "count": 6}
+    ]
+
+
+def test_middleware_warns_about_a_request_repeating_a_statement(caplog):
+    engine = create_engine("sqlite://")
+    count_statements(engine)
+
+    async def app(scope, receive, send):
+        with engine.connect() as connection:
+            for entity in range(3):
+                connection.execute(text("SELECT :entity"), {"entity": entity})
+
+    middleware = StatementCountMiddleware(app, threshold=2)
+    with caplog.at_level(logging.WARNING):
+        asyncio.run(middleware({"type": "http", "path": "/entity/1"}, None, None))
+
+    [record] = caplog.records
+    assert record.repeated_statements == [{"statement": "SELECT ?", "count": 3}]
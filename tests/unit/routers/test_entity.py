@@ -1,3 +1,5 @@
+import asyncio
+import json
 import logging
 import pytest
 from application.data_access.entity_query_helpers import normalised_params
@@ -6,14 +8,19 @@ from bs4 import BeautifulSoup
 from urllib.parse import parse_qsl
 
 from application.routers.entity import (
+    export_entities,
     _get_entity_json,
     _get_geojson,
     get_entity,
+    get_entity_data,
+    get_entities_batch,
     get_entity_lat_lng,
+    point_lookup,
+    router,
     search_entities,
 )
 
-from fastapi.exceptions import HTTPException
+from fastapi.exceptions import HTTPException, RequestValidationError
 
 from unittest.mock import MagicMock
 
@@ -24,10 +31,20 @@ from application.core.models import (
     OrganisationModel,
     TypologyModel,
 )
-from application.search.filters import QueryFilters
+from application.search.enum import SuffixEntity
+from application.search.filters import (
+    EntityBatchRequest,
+    PointLookupRequest,
+    QueryFilters,
+)
+
 
+from fastapi import FastAPI
+from fastapi.responses import RedirectResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
 
-from fastapi.responses import RedirectResponse
+from application.db.session import get_redis, get_search_session, get_session
 
 
 @pytest.fixture
@@ -534,6 +551,80 @@ def test_get_entity_entity_returned_geojson(
     assert isinstance(result, GeoJSON), f"{type(result)} is expected to be a GeoJSON"
 
 
+def test_get_entity_data_reads_on_the_async_session(mocker, single_entity_model):
+    get_entity_query_async = mocker.patch(
+        "application.routers.entity.get_entity_query_async",
+        return_value=(single_entity_model, None, None),
+    )
+    session = MagicMock()
+    result = asyncio.run(
+        get_entity_data(
+            request=MagicMock(),
+            entity=11000000,
+            extension=SuffixEntity.json,
+            session=session,
+            simplify=0.001,
+            precision=None,
+        )
+    )
+
+    assert result["entity"] == 11000000
+    get_entity_query_async.assert_awaited_once_with(
+        session, 11000000, {"simplify": 0.001, "precision": None}
+    )
+
+
+def test_get_entity_data_redirects_moved_entity(mocker):
+    mocker.patch(
+        "application.routers.entity.get_entity_query_async",
+        return_value=(None, 301, 1100000),
+    )
+    result = asyncio.run(
+        get_entity_data(
+            request=MagicMock(),
+            entity=11000000,
+            extension=SuffixEntity.geojson,
+            session=MagicMock(),
+        )
+    )
+
+    assert isinstance(result, RedirectResponse)
+    assert result.headers["location"] == "/entity/1100000.geojson"
+
+
+def test_get_entity_with_html_extension_renders_the_page(
+    mocker, single_entity_model, multiple_dataset_models, ancient_woodland_dataset
+):
+    get_entity_query = mocker.patch(
+        "application.routers.entity.get_entity_query",
+        return_value=(single_entity_model, None, None),
+    )
+    get_entity_query_async = mocker.patch(
+        "application.routers.entity.get_entity_query_async"
+    )
+    mocker.patch(
+        "application.routers.entity.get_datasets", return_value=multiple_dataset_models
+    )
+    mocker.patch(
+        "application.routers.entity.get_dataset_query",
+        return_value=ancient_woodland_dataset,
+    )
+    mocker.patch("application.routers.entity.lookup_entity_links", return_value={})
+    app = FastAPI()
+    app.include_router(router, prefix="/entity")
+    app.dependency_overrides[get_session] = lambda: MagicMock()
+
+    response = TestClient(app, raise_server_exceptions=False).get(
+        "/entity/11000000.html"
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+    assert "Abbotswood Shaw" in response.text
+    get_entity_query.assert_called_once()
+    get_entity_query_async.assert_not_called()
+
+
 # @pytest.fixture
 # def query_params():
 #     QueryFilters(
@@ -724,8 +815,16 @@ def test_search_entities_no_entities_returned_no_query_params_html(
 def test_search_entities_no_entities_returned_no_query_params_json(mocker):
     normalised_query_params = normalised_params(asdict(QueryFilters()))
     mocker.patch(
-        "application.routers.entity.get_entity_search",
-        return_value={"params": normalised_query_params, "count": 0, "entities": []},
+        "application.routers.entity.stream_entity_search_documents",
+        return_value=(
+            {
+                "params": normalised_query_params,
+                "count": 0,
+                "page_size": 0,
+                "last_entity": None,
+            },
+            iter([]),
+        ),
     )
     mocker.patch(
         "application.routers.entity.get_dataset_names",
@@ -735,8 +834,7 @@ def test_search_entities_no_entities_returned_no_query_params_json(mocker):
         "application.routers.entity.get_typology_names", return_value=["geography"]
     )
 
-    request = MagicMock()
-    request.query_params.get.return_value = None
+    request = _make_search_request("")
     extension = MagicMock()
     extension.value = "json"
     result = search_entities(
@@ -745,18 +843,54 @@ def test_search_entities_no_entities_returned_no_query_params_json(mocker):
         query_filters=QueryFilters(),
         extension=extension,
     )
-    assert isinstance(
-        result, dict
-    ), f"{type(result)} is expected to be a python dictionary"
+    assert isinstance(result, StreamingResponse)
+    result = json.loads(_read_streaming_response(result))
     for key in ["entities", "links", "count"]:
         assert key in result.keys(), f"{key} missing from result"
+    assert result["entities"] == []
+    assert result["count"] == 0
+
+
+@pytest.mark.parametrize("extension", ["json", "geojson"])
+def test_search_entities_failed_stream_gets_an_error_status(mocker, extension):
+    mocker.patch(
+        "application.routers.entity.stream_entity_search_documents",
+        side_effect=OperationalError(
+            "SELECT", {}, Exception("canceling statement due to statement timeout")
+        ),
+    )
+    mocker.patch(
+        "application.routers.entity.get_dataset_names",
+        return_value=["ancient-woodland"],
+    )
+    mocker.patch(
+        "application.routers.entity.get_typology_names", return_value=["geography"]
+    )
+    app = FastAPI()
+    app.include_router(router, prefix="/entity")
+    app.dependency_overrides[get_search_session] = lambda: MagicMock()
+    app.dependency_overrides[get_redis] = lambda: None
+
+    response = TestClient(app, raise_server_exceptions=False).get(
+        f"/entity.{extension}"
+    )
+
+    assert response.status_code == 500
 
 
 def test_search_entities_no_entities_returned_no_query_params_geojson(mocker):
     normalised_query_params = normalised_params(asdict(QueryFilters()))
     mocker.patch(
-        "application.routers.entity.get_entity_search",
-        return_value={"params": normalised_query_params, "count": 0, "entities": []},
+        "application.routers.entity.stream_entity_search_documents",
+        return_value=(
+            {
+                "params": normalised_query_params,
+                "count": 0,
+                "page_size": 0,
+                "last_entity": None,
+            },
+            iter([]),
+        ),
     )
     mocker.patch(
         "application.routers.entity.get_dataset_names",
@@ -765,8 +899,7 @@ def test_search_entities_no_entities_returned_no_query_params_geojson(mocker):
     mocker.patch(
         "application.routers.entity.get_typology_names", return_value=["geography"]
     )
-    request = MagicMock()
-    request.query_params.get.return_value = None
+    request = _make_search_request("")
     extension = MagicMock()
     extension.value = "geojson"
     result = search_entities(
@@ -775,12 +908,12 @@ def test_search_entities_no_entities_returned_no_query_params_geojson(mocker):
         query_filters=QueryFilters(),
         extension=extension,
     )
-    assert isinstance(
-        result, dict
-    ), f"{type(result)} is expected to be a python dictionary"
+    assert isinstance(result, StreamingResponse)
+    result = json.loads(_read_streaming_response(result))
     assert "type" in result, "expecting geojson structure to have type attribute"
     assert result["type"] == "FeatureCollection"
-    assert "features" in result, "expected features attribute"
+    assert result["features"] == []
+    assert result["links"] == {}
 
 
 def test_search_entities_multiple_entities_returned_no_query_params_html(
@@ -849,13 +982,21 @@ def test_search_entities_multiple_entities_returned_no_query_params_json(
     mocker, multiple_entity_models
 ):
     normalised_query_params = normalised_params(asdict(QueryFilters()))
-    mocker.patch(
-        "application.routers.entity.get_entity_search",
-        return_value={
-            "params": normalised_query_params,
-            "count": 0,
-            "entities": multiple_entity_models,
-        },
+    documents = [
+        json.dumps({"entity": entity.entity, "dataset": entity.dataset})
+        for entity in multiple_entity_models
+    ]
+    stream = mocker.patch(
+        "application.routers.entity.stream_entity_search_documents",
+        return_value=(
+            {
+                "params": normalised_query_params,
+                "count": 2,
+                "page_size": 2,
+                "last_entity": 11000000,
+            },
+            iter(documents),
+        ),
     )
     mocker.patch(
         "application.routers.entity.get_dataset_names",
@@ -864,34 +1005,54 @@ def test_search_entities_multiple_entities_returned_no_query_params_json(
     mocker.patch(
         "application.routers.entity.get_typology_names", return_value=["geography"]
     )
-    request = MagicMock()
-    request.query_params.get.return_value = None
+    request = _make_search_request("")
     extension = MagicMock()
     extension.value = "json"
     result = search_entities(
         request=request,
         search_query="",
-        query_filters=QueryFilters(),
+        query_filters=QueryFilters(exclude_field=["prefix,organisation-entity"]),
         extension=extension,
     )
-    assert isinstance(
-        result, dict
-    ), f"{type(result)} is expected to be a python dictionary"
+    assert isinstance(result, StreamingResponse)
+    result = json.loads(_read_streaming_response(result))
     for key in ["entities", "links", "count"]:
         assert key in result.keys(), f"{key} missing from result"
+    assert result["entities"] == [
+        {"entity": 11000000, "dataset": "ancient-woodland"},
+        {"entity": 11000000, "dataset": "ancient-woodland"},
+    ]
+    assert result["count"] == 2
+    # the fields to leave out are passed on to be left out by the database
+    include, exclude = stream.call_args.args[3:5]
+    assert include is None
+    assert exclude == {"prefix", "organisation_entity"}
 
 
 def test_search_entities_multiple_entities_returned_no_query_params_geojson(
     mocker, multiple_entity_models
 ):
     normalised_query_params = normalised_params(asdict(QueryFilters()))
-    mocker.patch(
-        "application.routers.entity.get_entity_search",
-        return_value={
-            "params": normalised_query_params,
-            "count": 0,
-            "entities": multiple_entity_models,
-        },
+    features = [
+        json.dumps(
+            {
+                **entity.geojson.model_dump(exclude={"properties"}),
+                "properties": {"entity": entity.entity, "dataset": entity.dataset},
+            }
+        )
+        for entity in multiple_entity_models
+    ]
+    mocker.patch(
+        "application.routers.entity.stream_entity_search_documents",
+        return_value=(
+            {
+                "params": normalised_query_params,
+                "count": 2,
+                "page_size": 2,
+                "last_entity": 11000000,
+            },
+            iter(features),
+        ),
     )
     mocker.patch(
         "application.routers.entity.get_dataset_names",
@@ -900,8 +1061,7 @@ def test_search_entities_multiple_entities_returned_no_query_params_geojson(
     mocker.patch(
         "application.routers.entity.get_typology_names", return_value=["geography"]
     )
-    request = MagicMock()
-    request.query_params.get.return_value = None
+    request = _make_search_request("")
     extension = MagicMock()
     extension.value = "geojson"
     result = search_entities(
@@ -910,12 +1070,15 @@ def test_search_entities_multiple_entities_returned_no_query_params_geojson(
         query_filters=QueryFilters(),
         extension=extension,
     )
-    assert isinstance(
-        result, dict
-    ), f"{type(result)} is expected to be a python dictionary"
+    assert isinstance(result, StreamingResponse)
+    result = json.loads(_read_streaming_response(result))
     assert "type" in result, "expecting geojson structure to have type attribute"
     assert result["type"] == "FeatureCollection"
-    assert "features" in result, "expected features attribute"
+    assert len(result["features"]) == 2
+    for feature in result["features"]:
+        assert feature["type"] == "Feature"
+        assert feature["properties"]["dataset"] == "ancient-woodland"
+        assert "geometry" not in feature["properties"]
 
 
 @pytest.mark.parametrize("extension_value", [("json"), ("geojson"), (None)])
@@ -1133,3 +1296,127 @@ def test_get_entity_with_linked_local_plans(
         else:
             logging.warning("result has no context")
         assert False, "template unable to render, missing variable(s) from context"
+
+
+def _read_streaming_response(response):
+    async def read():
+        return "".join([chunk async for chunk in response.body_iterator])
+
+    return asyncio.run(read())
+
+
+def test_export_entities_streams_one_entity_per_line(mocker, multiple_entity_models):
+    mocker.patch(
+        "application.routers.entity.get_dataset_names",
+        return_value=["ancient-woodland"],
+    )
+    mocker.patch(
+        "application.routers.entity.get_typology_names", return_value=["geography"]
+    )
+    stream = mocker.patch(
+        "application.routers.entity.stream_entity_search",
+        return_value=iter(multiple_entity_models),
+    )
+
+    query_filters = QueryFilters(dataset=["ancient-woodland"])
+    response = export_entities(query_filters=query_filters, session=MagicMock())
+
+    assert response.media_type == "application/x-ndjson"
+    lines = _read_streaming_response(response).splitlines()
+    assert len(lines) == 2
+    for line in lines:
+        entity = json.loads(line)
+        assert entity["entity"] == 11000000
+        assert entity["dataset"] == "ancient-woodland"
+        assert "geojson" not in entity
+    assert stream.call_args.args[1]["dataset"] == ["ancient-woodland"]
+
+
+def test_export_entities_applies_field_param(mocker, multiple_entity_models):
+    mocker.patch(
+        "application.routers.entity.get_dataset_names",
+        return_value=["ancient-woodland"],
+    )
+    mocker.patch(
+        "application.routers.entity.get_typology_names", return_value=["geography"]
+    )
+    mocker.patch(
+        "application.routers.entity.stream_entity_search",
+        return_value=iter(multiple_entity_models),
+    )
+
+    query_filters = QueryFilters(field=["name"])
+    response = export_entities(query_filters=query_filters, session=MagicMock())
+
+    lines = _read_streaming_response(response).splitlines()
+    assert json.loads(lines[0]) == {"entity": 11000000, "name": "Abbotswood Shaw"}
+
+
+def test_point_lookup_groups_entities_by_point(mocker, multiple_entity_models):
+    mocker.patch(
+        "application.routers.entity.get_dataset_names",
+        return_value=["ancient-woodland"],
+    )
+    lookup_query = mocker.patch(
+        "application.routers.entity.get_point_lookup",
+        return_value=[multiple_entity_models, []],
+    )
+    lookup = PointLookupRequest(
+        points=[
+            {"longitude": -0.1, "latitude": 51.5},
+            {"longitude": -1.2, "latitude": 52.1},
+        ],
+        dataset=["ancient-woodland"],
+        field=["name"],
+    )
+
+    response = point_lookup(lookup, session=MagicMock())
+
+    assert lookup_query.call_args.args[1:] == (
+        [(-0.1, 51.5), (-1.2, 52.1)],
+        ["ancient-woodland"],
+    )
+    first, second = response["results"]
+    assert (first["longitude"], first["latitude"]) == (-0.1, 51.5)
+    assert first["entities"][0] == {"entity": 11000000, "name": "Abbotswood Shaw"}
+    assert len(first["entities"]) == 2
+    assert second["entities"] == []
+
+
+def test_point_lookup_rejects_unknown_dataset(mocker):
+    mocker.patch(
+        "application.routers.entity.get_dataset_names",
+        return_value=["ancient-woodland"],
+    )
+    lookup = PointLookupRequest(
+        points=[{"longitude": -0.1, "latitude": 51.5}], dataset=["not-a-dataset"]
+    )
+
+    with pytest.raises(RequestValidationError):
+        point_lookup(lookup, session=MagicMock())
+
+
+def test_get_entities_batch_streams_entities_then_unresolved_ids(mocker):
+    summary = {"moved": {}, "gone": [], "not_found": []}
+
+    def documents():
+        yield '{"entity": 3}'
+        yield '{"entity": 1}'
+        summary.update({"moved": {9: 1}, "gone": [8], "not_found": [7]})
+
+    stream = mocker.patch(
+        "application.routers.entity.stream_entities_by_id",
+        return_value=(summary, documents()),
+    )
+    batch = EntityBatchRequest(entity=[3, 9, 8, 7], field=["name"])
+
+    response = get_entities_batch(batch, session=MagicMock())
+
+    assert isinstance(response, StreamingResponse)
+    assert json.loads(_read_streaming_response(response)) == {
+        "entities": [{"entity": 3}, {"entity": 1}],
+        "moved": {"9": 1},
+        "gone": [8],
+        "not-found": [7],
+    }
+    assert stream.call_args.args[1:] == ([3, 9, 8, 7], {"name"}, None)
@@ -98,14 +98,18 @@ def test_fetch_linked_local_plans_json_returned(
     )
 
     mocker.patch(
-        "application.routers.entity.get_linked_entities",
-        side_effect=lambda session, dataset, reference, linked_dataset=None: {
-            "local-plan-timetable": local_plan_timetable_model,
-            "local-plan-document": local_plan_document_model,
-            "local-plan-boundary": local_plan_boundary_model,
-        }[
-            dataset
-        ],  # Return the appropriate model for the dataset
+        "application.routers.entity.get_linked_entities_by_dataset",
+        side_effect=lambda session, datasets, reference, linked_dataset=None: {
+            dataset: {
+                "local-plan-timetable": local_plan_timetable_model,
+                "local-plan-document": local_plan_document_model,
+                "local-plan-boundary": local_plan_boundary_model,
+            }[dataset]
+            for dataset in datasets
+        },  # Return the appropriate model for each dataset
+    )
+    mocker.patch(
+        "application.routers.entity.fetch_entities_by_reference", return_value={}
     )
 
     e_dict_sorted = {}
@@ -126,6 +130,56 @@ def test_fetch_linked_local_plans_json_returned(
     ), "Expected 1 entity in 'local-plan-document'"
 
 
+def test_fetch_linked_local_plans_fetches_timetable_events_together(mocker):
+    timetable = [
+        EntityModel(
+            entity=4220000 + i,
+            entry_date="2022-03-23",
+            reference=f"timetable-{i}",
+            dataset="local-plan-timetable",
+            local_plan_event=event,
+        )
+        for i, event in enumerate(
+            ["plan-published", "examination", "plan-published", "estimated-adoption"]
+        )
+    ]
+    events = {
+        "plan-published": EntityModel(
+            entity=4230001,
+            entry_date="2022-03-23",
+            reference="plan-published",
+            dataset="local-plan-event",
+        )
+    }
+    mocker.patch(
+        "application.routers.entity.linked_datasets",
+        {"local-plan": ["local-plan-timetable"]},
+    )
+    mocker.patch(
+        "application.routers.entity.get_linked_entities_by_dataset",
+        return_value={"local-plan-timetable": timetable},
+    )
+    fetch_events = mocker.patch(
+        "application.routers.entity.fetch_entities_by_reference", return_value=events
+    )
+
+    results, _boundary = fetch_linked_local_plans(
+        mocker.MagicMock(), {"dataset": "local-plan", "reference": "1481207"}
+    )
+
+    fetch_events.assert_called_once()
+    assert fetch_events.call_args.args[1:] == (
+        "local-plan-event",
+        {"plan-published", "examination"},
+    )
+    assert [entity.local_plan_event for entity in timetable] == [
+        events["plan-published"],
+        None,
+        events["plan-published"],
+        None,
+    ]
+
+
 @pytest.mark.parametrize(
     "query_filters, expected_count",
     [
@@ -0,0 +1,82 @@
+import pytest
+import redis
+from unittest.mock import MagicMock
+
+from fastapi.exceptions import HTTPException
+
+from application.routers.tiles import get_cached_tile, get_tile
+
+
+@pytest.fixture
+def tile_dependencies(mocker):
+    mocker.patch(
+        "application.routers.tiles.get_tile_dataset_names",
+        return_value=["tree", "uncollected", "not-collected-yet"],
+    )
+    mocker.patch(
+        "application.routers.tiles.get_dataset_data_versions",
+        return_value={"tree": "abc123", "uncollected": None},
+    )
+    return mocker.patch(
+        "application.routers.tiles.get_entity_tile", return_value=b"tile"
+    )
+
+
+def test_get_tile_returns_vector_tile(tile_dependencies):
+    response = get_tile("tree", z=10, x=511, y=340, session=MagicMock(), cache=None)
+
+    assert response.body == b"tile"
+    assert response.media_type == "application/vnd.mapbox-vector-tile"
+    assert tile_dependencies.call_args.args[1:] == ("tree", 10, 511, 340)
+
+
+def test_get_tile_is_cached_by_dataset_and_data_version(tile_dependencies):
+    cache = MagicMock()
+    cache.get.return_value = None
+
+    get_tile("tree", z=10, x=511, y=340, session=MagicMock(), cache=cache)
+
+    cache.get.assert_called_once_with("tile:tree:abc123:10/511/340")
+    assert cache.setex.call_args.args[0] == "tile:tree:abc123:10/511/340"
+    assert cache.setex.call_args.kwargs["value"] == b"tile"
+
+
+def test_get_tile_uses_cached_tile(tile_dependencies):
+    cache = MagicMock()
+    cache.get.return_value = b"cached"
+
+    response = get_tile("tree", z=10, x=511, y=340, session=MagicMock(), cache=cache)
+
+    assert response.body == b"cached"
+    tile_dependencies.assert_not_called()
+
+
+@pytest.mark.parametrize("dataset", ["uncollected", "not-collected-yet"])
+def test_get_tile_without_data_version_is_not_cached(tile_dependencies, dataset):
+    cache = MagicMock()
+
+    response = get_tile(dataset, z=10, x=511, y=340, session=MagicMock(), cache=cache)
+
+    assert response.body == b"tile"
+    cache.get.assert_not_called()
+    cache.setex.assert_not_called()
+
+
+def test_get_tile_unknown_dataset_not_found(tile_dependencies):
+    with pytest.raises(HTTPException) as e:
+        get_tile("not-a-dataset", z=1, x=0, y=0, session=MagicMock(), cache=None)
+    assert e.value.status_code == 404
+
+
+def test_get_tile_outside_zoom_level_not_found(tile_dependencies):
+    with pytest.raises(HTTPException) as e:
+        get_tile("tree", z=1, x=2, y=0, session=MagicMock(), cache=None)
+    assert e.value.status_code == 404
+
+
+def test_get_cached_tile_builds_tile_when_redis_is_down():
+    cache = MagicMock()
+    cache.get.side_effect = redis.exceptions.ConnectionError()
+    cache.setex.side_effect = redis.exceptions.ConnectionError()
+
+    assert get_cached_tile(cache, "tile:tree", lambda: b"tile") == b"tile"
@@ -6,6 +6,7 @@ from application.search.validators import (
     validate_month_integer,
     validate_year_integer,
     validate_curies,
+    validate_bbox,
 )
 
 from application.exceptions import DigitalLandValidationError, DatasetValueNotFound
@@ -157,3 +158,15 @@ def test_validate_curies_rejects_all_if_any_invalid():
     ]
     with pytest.raises(DigitalLandValidationError):
         validate_curies(curies)
+
+
+def test_validate_bbox_valid_value_provided():
+    assert validate_bbox("-0.2,51.4,0.1,51.6") == "-0.2,51.4,0.1,51.6"
+
+
+@pytest.mark.parametrize(
+    "bbox", ["-0.2,51.4,0.1", "a,b,c,d", "0.1,51.4,-0.2,51.6", "nan,51.4,0.1,51.6"]
+)
+def test_validate_bbox_invalid_value_provided(bbox):
+    with pytest.raises(DigitalLandValidationError):
+        validate_bbox(bbox)
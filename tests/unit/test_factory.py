@@ -0,0 +1,43 @@
+import pytest
+
+from starlette.requests import Request
+
+from application.factory import _is_api_request
+from application.routers import about_, entity
+
+
+def _request(router, path, methods=None, path_params=None):
+    (route,) = [
+        route
+        for route in router.routes
+        if route.path == path and (methods is None or route.methods == methods)
+    ]
+    return Request(
+        {
+            "type": "http",
+            "path": path,
+            "query_string": b"",
+            "headers": [],
+            "route": route,
+            "path_params": path_params or {},
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "router, path, methods, path_params, expected",
+    [
+        (entity.router, ".{extension}", None, {"extension": "json"}, True),
+        (entity.router, "/{entity}.{extension}", None, {"extension": "geojson"}, True),
+        (entity.router, "/{entity}.{extension}", None, {"extension": "xml"}, False),
+        (entity.router, "/point-lookup", {"POST"}, None, True),
+        (entity.router, "/batch", {"POST"}, None, True),
+        (entity.router, "/{entity}", None, None, False),
+        # catch all pages are left with the default response class
+        (about_.router, "/{url_path:path}", None, None, False),
+    ],
+)
+def test_is_api_request(router, path, methods, path_params, expected):
+    request = _request(router, path, methods, path_params)
+
+    assert _is_api_request(request) is expected
@@ -1,4 +1,5 @@
 from application.core.utils import make_links
+from application.core.models import EntityModel
 
 scheme = "http"
 netloc = "localhost"
@@ -89,3 +90,78 @@ def test_pagination_if_limit_zero_then_no_links():
     params = {}
     links = make_links(scheme, netloc, path, params, data)
     assert links == {}
+
+
+def test_cursor_pagination_next_link_seeks_after_last_entity():
+    entities = [EntityModel(entity=e) for e in range(101, 111)]
+    data = {
+        "count": 45,
+        "params": {"limit": 10, "after_entity": 100},
+        "entities": entities,
+    }
+    links = make_links(scheme, netloc, path, "after_entity=100&limit=10", data)
+
+    assert links["first"] == "http://localhost/entity.json?after_entity=0&limit=10"
+    assert links["next"] == "http://localhost/entity.json?after_entity=110&limit=10"
+    assert links.get("prev") is None
+    assert links.get("last") is None
+
+
+def test_cursor_pagination_drops_offset_from_links():
+    entities = [EntityModel(entity=e) for e in range(1, 11)]
+    data = {
+        "count": 45,
+        "params": {"limit": 10, "offset": 20, "after_entity": 0},
+        "entities": entities,
+    }
+    links = make_links(scheme, netloc, path, "offset=20&after_entity=0", data)
+
+    assert links["next"] == "http://localhost/entity.json?after_entity=10&limit=10"
+
+
+def test_cursor_pagination_no_next_link_on_short_page():
+    entities = [EntityModel(entity=e) for e in range(41, 46)]
+    data = {
+        "count": 45,
+        "params": {"limit": 10, "after_entity": 40},
+        "entities": entities,
+    }
+    links = make_links(scheme, netloc, path, "after_entity=40", data)
+
+    assert links["first"] == "http://localhost/entity.json?after_entity=0&limit=10"
+    assert links.get("next") is None
+
+
+def test_uncounted_pagination_has_next_link_for_full_page():
+    entities = [EntityModel(entity=e) for e in range(11, 21)]
+    data = {
+        "count": None,
+        "params": {"limit": 10, "offset": 10, "count_mode": "none"},
+        "entities": entities,
+    }
+    links = make_links(scheme, netloc, path, "count_mode=none&offset=10", data)
+
+    assert links["first"] == "http://localhost/entity.json?count_mode=none&limit=10"
+    assert (
+        links["next"]
+        == "http://localhost/entity.json?count_mode=none&offset=20&limit=10"
+    )
+    assert links["prev"] == "http://localhost/entity.json?count_mode=none&limit=10"
+    assert links.get("last") is None
+
+
+def test_estimated_pagination_has_no_next_link_for_short_page():
+    entities = [EntityModel(entity=e) for e in range(21, 25)]
+    data = {
+        "count": 500,
+        "params": {"limit": 10, "offset": 20, "count_mode": "estimated"},
+        "entities": entities,
+    }
+    links = make_links(scheme, netloc, path, "count_mode=estimated&offset=20", data)
+
+    assert links.get("next") is None
+    assert links.get("last") is None
+    assert (
+        links["prev"]
+        == "http://localhost/entity.json?count_mode=estimated&offset=10&limit=10"
+    )
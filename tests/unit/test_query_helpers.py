@@ -76,3 +76,11 @@ def test_get_operator(expected, params):
     from application.data_access.entity_query_helpers import get_operator
 
     assert expected == get_operator(params)
+
+
+def test_normalised_params_keeps_first_page_cursor():
+    from application.data_access.entity_query_helpers import normalised_params
+
+    params = normalised_params({"after_entity": 0, "offset": 0, "dataset": []})
+
+    assert params == {"after_entity": 0}